@@ -4,13 +4,14 @@ from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 import os
-import requests
 from dotenv import load_dotenv
 from langchain.tools import Tool
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
-import pandas as pd
+from testcase_conversion import generate_pytest_file
+from testcase_store import TestCaseStore
+from jira_client import JiraClient, partition_issue_keys, story_text
 
 # Load environment variables
 load_dotenv()
@@ -18,46 +19,49 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 JIRA_URL = os.getenv("JIRA_URL") 
 JIRA_EMAIL = os.getenv("JIRA_EMAIL")
 JIRA_API_TOKEN = os.getenv("JIRA_API_TOKEN")
+TESTGEN_MAX_CONCURRENCY = int(os.getenv("TESTGEN_MAX_CONCURRENCY", "8"))
 
 llm = ChatOpenAI(model="gpt-4", temperature=0)
+# Keep-alive session, bulk JQL lookups and a local issue cache (set JIRA_CACHE_PATH to persist it)
+jira = JiraClient(JIRA_URL, token=JIRA_API_TOKEN, cachePath=os.getenv("JIRA_CACHE_PATH"))
+
+_test_case_stores = {}
+
+def read_test_cases(excel_path, jira_ids):
+    """Returns {jira_id: [row text, ...]} for the given Jira IDs, in sheet order, or an error message."""
+    # The workbook is parsed once into an indexed sidecar (rebuilt when the file changes),
+    # so each call is an index lookup instead of a full read_excel.
+    key = os.path.abspath(excel_path)
+    store = _test_case_stores.get(key)
+    if store is None:
+        store = _test_case_stores[key] = TestCaseStore(excel_path)
+    try:
+        return store.lookup(jira_ids)
+    except ValueError as e:
+        return str(e)
+
 
 def generate_pytest_file_from_excel(jira_id: str, excel_path: str = "testcases.xlsx") -> str:
     """
-    Reads all test cases for the given Jira ID from the Excel file and generates a single pytest file.
+    Reads all test cases for the given Jira ID (or comma-separated Jira IDs) from the Excel file
+    and generates a single pytest file. Rows are converted concurrently, up to
+    TESTGEN_MAX_CONCURRENCY LLM calls at a time.
     """
-    # Make sure pandas is installed: pip install pandas
-    df = pd.read_excel(excel_path)
-    test_cases = []
-    # Find all rows matching the Jira ID
-    jira_col = None
-    for col in df.columns:
-        if str(col).strip().lower() in ["jira id", "jiraid"]:
-            jira_col = col
-            break
-    if jira_col is None:
-        return "No Jira ID column found in Excel file."
-    filtered = df[df[jira_col].astype(str).str.strip().str.upper() == jira_id.strip().upper()]
-    for _, row in filtered.iterrows():
-        row_text = "\n".join([f"{col}: {row[col]}" for col in df.columns if pd.notnull(row[col])])
-        test_cases.append(row_text)
+    jira_ids = [part.strip().upper() for part in jira_id.split(",") if part.strip()]
+    test_cases = read_test_cases(excel_path, jira_ids)
+    if isinstance(test_cases, str):
+        return test_cases
+    missing = [jira_id for jira_id in jira_ids if not test_cases[jira_id]]
+    test_cases = {jira_id: rows for jira_id, rows in test_cases.items() if rows}
     if not test_cases:
-        return f"No test cases found for Jira ID {jira_id} in {excel_path}"
-    py_filename = f"{jira_id}_test.py"
-    with open(py_filename, "w", encoding="utf-8") as pyfile:
-        pyfile.write("import pytest\n\n")
-        for tc in test_cases:
-            prompt = (
-                "You are a senior QA engineer. Convert the following test case information into a complete pytest-style test function in Python. "
-                "Only output valid Python code as plain text. Do NOT include any markdown, code block markers (such as ```python or ```), explanations, notes, or comments about assumptions. "
-                "Only include necessary imports once at the top. If 'LoginPage' and 'HomePage' are needed, import them from 'app' at the top. Do not repeat imports. "
-                f"Test Case Information:\n{tc}\n"
-            )
-            response = llm.invoke(prompt)
-            pytest_code = response.content
-            pytest_code = pytest_code.strip()
-            pytest_code = pytest_code.removeprefix("```python").removeprefix("```").removesuffix("```").strip()
-            pyfile.write(pytest_code + "\n\n")
-    return f"Pytest file generated: {py_filename}"
+        return f"No test cases found for Jira ID {', '.join(jira_ids)} in {excel_path}"
+    py_filename = f"{jira_ids[0]}_test.py" if len(jira_ids) == 1 else f"{jira_ids[0]}_and_{len(jira_ids) - 1}_more_test.py"
+    _, failed = generate_pytest_file(llm, test_cases, py_filename, maxConcurrency=TESTGEN_MAX_CONCURRENCY)
+    result = f"Pytest file generated: {py_filename} ({sum(map(len, test_cases.values()))} test cases"
+    result += f", {failed} could not be converted and are only comments in the file)" if failed else ")"
+    if missing:
+        result += f". No test cases found for {', '.join(missing)}"
+    return result
 
 def test_case_to_pytest_code_tool(test_case_text: str) -> str:
     prompt = (
@@ -98,24 +102,25 @@ def story_to_test_case(user_story: str) -> str:
     return response.content
 
 def fetch_jira_story(jira_id: str) -> str:
-    url = f"{JIRA_URL}/rest/api/2/issue/{jira_id}"
-    headers = {
-        "Accept": "application/json",
-        "Authorization": f"Bearer {JIRA_API_TOKEN}"
-    }
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        raise Exception(f"Failed to fetch Jira issue: {response.text}")
-    data = response.json()
-    story = data['fields'].get('description') or data['fields'].get('summary')
-    if not story:
-        raise Exception("No user story or description found in Jira issue.")
-    return story
+    """Fetches the user story for a Jira ID, or for comma-separated Jira IDs in one bulk request."""
+    jira_ids, invalid_ids = partition_issue_keys(part for part in jira_id.split(",") if part.strip())
+    if invalid_ids:
+        raise Exception(f"Invalid Jira issue ID(s): {', '.join(invalid_ids)} (expected e.g. PROJ-123)")
+    issues = jira.get_issues(jira_ids)
+    stories = []
+    for key in jira_ids:
+        if key not in issues:
+            raise Exception(f"Failed to fetch Jira issue: {key} not found")
+        story = story_text(issues[key])
+        if not story:
+            raise Exception(f"No user story or description found in Jira issue {key}.")
+        stories.append(story if len(jira_ids) == 1 else f"{key}:\n{story}")
+    return "\n\n".join(stories)
 
 tools = [
     Tool(
         name="JiraStoryFetcher",
-        description="Fetches user story from Jira using issue ID",
+        description="Fetches user story from Jira using issue ID (or comma-separated issue IDs)",
         func=fetch_jira_story
     ),
     Tool(
@@ -125,7 +130,7 @@ tools = [
     ),
     Tool(
         name="ExcelToPytestFileGenerator",
-        description="Reads all test cases for a Jira ID from Excel and generates a single pytest file.",
+        description="Reads all test cases for a Jira ID (or comma-separated Jira IDs) from Excel and generates a single pytest file.",
         func=generate_pytest_file_from_excel
     ),
 
@@ -141,7 +146,7 @@ agent = create_tool_calling_agent(llm=llm, tools=tools, prompt=prompt)
 agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
 
 if __name__ == "__main__":
-    jira_id = input("Enter Jira issue ID: ").strip()
+    jira_id = input("Enter Jira issue ID(s), comma-separated: ").strip()
     os.environ["CURRENT_JIRA_ID"] = jira_id
     result = agent_executor.invoke({"input": f"Generate test cases and pytest code for Jira ID {jira_id}"})
     pytest_code = result["output"]
@@ -3,11 +3,11 @@ This script implements an autonomous Resume RAG (Retrieval-Augmented Generation)
 
 Functionalities:
 - Loads a resume from a PDF file and splits it into manageable text chunks.
-- Embeds and indexes the resume chunks using OpenAI embeddings and FAISS for semantic search.
+- Embeds and indexes the resume chunks using OpenAI embeddings and FAISS for semantic search; the index is cached on disk so restarts skip re-embedding.
 - Defines a resume search tool that retrieves answers from the resume; if the answer is not found, it returns a fallback phrase.
 - Defines a Twilio SMS tool that sends a notification to the user if the agent cannot answer a question based on the resume.
 - Creates a conversational agent using LangChain's tool-calling agent and a custom prompt template.
-- Runs an interactive loop where users can input interview questions, and the agent responds as if it were the candidate, using the resume as context.
+- Runs an interactive loop where users can input interview questions, and the agent responds as if it were the candidate, using the resume as context. The answer is streamed token by token and the time to first token is printed per turn.
 
 Environment variables required:
 - OPENAI_API_KEY: OpenAI API key for embeddings and LLM.
@@ -28,6 +28,7 @@ Run the script and input interview questions. If the answer is not found in the
 from twilio.rest import Client
 from langchain.tools import Tool
 from langchain.agents import create_tool_calling_agent, AgentExecutor
+import asyncio
 import logging
 import os
 from dotenv import load_dotenv
@@ -38,6 +39,15 @@ from langchain_openai import OpenAIEmbeddings
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+import sys
+
+# Shared RAG helpers (index cache etc.) live next to the LangGraph RAG script
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "langgraph"))
+from index_store import load_or_build_vectorstore
+from embedding_cache import CachedEmbeddings
+from fast_splitter import FastRecursiveCharacterTextSplitter
+from token_streaming import format_timings, stream_turn
+from outbox import Outbox
 
 # Load environment variables from .env file
 load_dotenv()
@@ -54,15 +64,30 @@ twilio_to = os.getenv("TWILIO_TO_NUMBER")
 # Create twilio client
 twilio_client = Client(twilio_sid, twilio_token)
 
+async def send_sms(text):
+    # The Twilio client is synchronous; run it off the outbox's event loop
+    print(f"[DEBUG] Sending SMS: {text}")
+    await asyncio.to_thread(twilio_client.messages.create, body=text, from_=twilio_from, to=twilio_to)
+
+def sms_digest(questions):
+    if len(questions) == 1:
+        return questions[0]
+    return f"{len(questions)} unanswered interview questions:\n" + "\n".join(
+        f"{number}. {question}" for number, question in enumerate(questions, start=1))
+
+# SMS go out from a background outbox: the tool returns at once, a repeated question is
+# sent once per 10 minutes, questions within 30 s are rolled into one digest SMS
+# (Twilio allows 1600 characters), and unsent questions are kept in sms_outbox.sqlite
+# and sent on the next start. Swap send_sms for a local fake to load-test the agent.
+sms_outbox = Outbox(send_sms, coalesceSeconds=30.0, maxChars=1500, combine=sms_digest, dedupeSeconds=600,
+                    storePath=os.getenv("SMS_OUTBOX_PATH", "sms_outbox.sqlite"), name="sms-outbox")
+
 # Twilio SMS tool
 def send_sms_tool(message: str) -> str:
-    print(f"[DEBUG] Sending SMS: {message}")
-    twilio_client.messages.create(
-        body=message,
-        from_=twilio_from,
-        to=twilio_to
-    )
-    return "SMS sent to your phone."
+    print(f"[DEBUG] Queueing SMS: {message}")
+    if not sms_outbox.post(message):
+        return "SMS queue is full; notification not sent."
+    return "SMS notification queued for your phone."
 
 twilio_tool = Tool(
     name="twilio_tool",
@@ -90,19 +115,22 @@ resume_tool = Tool(
 
 
 pdf_path = "my_resume.pdf"
-loader = PyPDFLoader(pdf_path)
-docs = loader.load()
-
-# Split resume into smaller chunks
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-split_docs = text_splitter.split_documents(docs)
 
-# Create vector store from split documents
-embeddings = OpenAIEmbeddings()
-vectorstore = FAISS.from_documents(split_docs, embeddings)
+# Load the resume and split it into smaller chunks (only runs when the index is not cached yet)
+def load_and_split_resume(pdf_path, chunk_size, chunk_overlap):
+    loader = PyPDFLoader(pdf_path)
+    docs = loader.load()
+    text_splitter = FastRecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return text_splitter.split_documents(docs)
+
+# Load the vector store from the on-disk cache, or build and save it on the first run.
+# Embeddings go through the shared embedding cache, so chunks seen by any script are never re-embedded.
+embeddings = CachedEmbeddings(OpenAIEmbeddings())
+vectorstore = load_or_build_vectorstore(pdf_path, embeddings, loadDocs=load_and_split_resume)
 retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
 
-llm = ChatOpenAI(model="gpt-4", temperature=0, api_key=openai_api_key)
+# streaming=True so the agent's final answer is printed token by token
+llm = ChatOpenAI(model="gpt-4", temperature=0, api_key=openai_api_key, streaming=True)
 
 # Conversational prompt template for RAG chatbot
 prompt_template = """
@@ -127,8 +155,9 @@ print("Resume RAG Chatbot (Autonomous Agent). Type your interview question (or '
 while True:
     question = input("You: ")
     if question.lower() == "exit":
+        sms_outbox.close()
         break
     print(f"[DEBUG] Agent received question: {question}")
-    response = executor.invoke({"input": question})
-    # Print output from agent
-    print("Bot:", response.get("output", response))
\ No newline at end of file
+    # Stream the agent's final answer (tokens of the resume_search tool's own LLM call are not printed)
+    response, timings = stream_turn(executor, {"input": question}, answerKey="output")
+    print(f"[DEBUG] Latency: {format_timings(timings)}")
\ No newline at end of file
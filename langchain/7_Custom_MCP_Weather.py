@@ -1,27 +1,252 @@
+import argparse
 import asyncio
-from fastmcp import FastMCP, Client
-from langchain_openai import ChatOpenAI
+import logging
 import os
+import re
+import time
+
+import httpx
+from fastmcp import FastMCP, Client
 from dotenv import load_dotenv
-import requests
+
+from request_cache import RequestCache
 
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 mcp = FastMCP("custom-weather-mcp")
 
+OPENWEATHER_URL = os.getenv("OPENWEATHER_URL", "http://api.openweathermap.org/data/2.5/weather")
+WEATHER_TTL_SECONDS = 600  # OpenWeatherMap refreshes current weather about every 10 minutes
+MAX_CONNECTIONS = 50
+
+
+class WeatherClient:
+    """
+    Async OpenWeatherMap client: one pooled keep-alive httpx.AsyncClient, a TTL cache,
+    and in-flight coalescing, so a burst of "Paris" requests is one upstream call.
+    """
+
+    def __init__(self, url=OPENWEATHER_URL, api_key=None, ttl=WEATHER_TTL_SECONDS,
+                 max_connections=MAX_CONNECTIONS, transport=None):
+        self.url = url
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.transport = transport
+        self.cache = RequestCache(defaultTtl=ttl)
+        self.upstream_calls = 0
+        self._client = None
+        self._client_loop = None
+
+    async def _http(self):
+        # httpx connections belong to the event loop that opened them
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            stale, stale_loop = self._client, self._client_loop
+            limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            # Swap before awaiting, so concurrent callers on this loop share the new client.
+            self._client = httpx.AsyncClient(timeout=10, limits=limits, transport=self.transport)
+            self._client_loop = loop
+            if stale is not None:
+                await self._close_stale_client(stale, stale_loop)
+        return self._client
+
+    @staticmethod
+    async def _close_stale_client(client, loop):
+        """Close a client opened on another event loop, on that loop while it still runs."""
+        try:
+            if loop.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop))
+            else:
+                await client.aclose()
+        except Exception as e:
+            # Its loop is closed: the sockets can no longer be shut down cleanly, only dropped.
+            logger.debug("Could not close the weather client of a previous event loop: %s", e)
+
+    async def _fetch(self, city):
+        self.upstream_calls += 1
+        api_key = self.api_key or os.getenv("OPENWEATHER_API_KEY")
+        client = await self._http()
+        response = await client.get(self.url, params={"q": city, "appid": api_key, "units": "metric"})
+        if response.status_code == 404:
+            raise LookupError(f"Could not fetch weather for {city}.")
+        if response.status_code != 200:
+            raise LookupError(f"Could not fetch weather for {city}: HTTP {response.status_code}")
+        try:
+            data = response.json()
+        except ValueError:
+            raise LookupError(f"Could not fetch weather for {city}: the response was not JSON")
+        if "weather" in data and "main" in data:
+            return f"{city.title()} weather: {data['weather'][0]['description']}, {data['main']['temp']}°C"
+        raise LookupError(f"Could not fetch weather for {city}.")
+
+    async def get(self, city):
+        city = re.sub(r"\s+", " ", city).strip()
+        try:
+            return await self.cache.aget_or_fetch(city.lower(), lambda: self._fetch(city))
+        except LookupError as e:
+            return str(e)
+        except httpx.HTTPError as e:
+            return f"Could not fetch weather for {city}: {e}"
+
+    async def get_many(self, cities):
+        return list(await asyncio.gather(*(self.get(city) for city in cities)))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+weather = WeatherClient()
+
+
 @mcp.tool
-def get_weather(city: str) -> str:
+async def get_weather(city: str) -> str:
     """Fetch weather information for a given city."""
-    api_key = os.getenv("OPENWEATHER_API_KEY")
-    url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric"
-    response = requests.get(url)
-    data = response.json()
-    if "weather" in data and "main" in data:
-        return f"{city.title()} weather: {data['weather'][0]['description']}, {data['main']['temp']}°C"
-    else:
-        return f"Could not fetch weather for {city}."
+    return await weather.get(city)
 
-if __name__ == "__main__":
-    # This will start the MCP server and listen for HTTP requests on port 8002
-    mcp.run(transport="http", port=8002)
 
+@mcp.tool
+async def get_weather_many(cities: list[str]) -> list[str]:
+    """Fetch weather information for several cities at once, in the order given."""
+    return await weather.get_many(cities)
+
+
+def openweather_stub_app(delay_seconds=0.05):
+    """Local stand-in for the OpenWeatherMap current-weather endpoint."""
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, PlainTextResponse
+    from starlette.routing import Route
+
+    async def current_weather(request):
+        await asyncio.sleep(delay_seconds)
+        city = request.query_params.get("q", "")
+        if city.lower() == "atlantis":
+            return JSONResponse({"cod": "404", "message": "city not found"}, status_code=404)
+        if city.lower() == "gateway":
+            return PlainTextResponse("<html>502 Bad Gateway</html>", status_code=502)
+        if city.lower() == "teapot":
+            return PlainTextResponse("not json")
+        return JSONResponse({"weather": [{"description": "clear sky"}], "main": {"temp": 21.0}, "name": city})
+
+    return Starlette(routes=[Route("/data/2.5/weather", current_weather)])
+
+
+async def load_test(requests=2000, concurrency=50, city_count=20, delay_seconds=0.05, port=8003):
+    """Call the MCP tools against a stub OpenWeatherMap on localhost; return (mode, requests/s, upstream calls) rows."""
+    import requests as blocking_requests
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(openweather_stub_app(delay_seconds), port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    url = f"http://127.0.0.1:{port}/data/2.5/weather"
+    rows = []
+    try:
+        # Before: one blocking requests.get per call, no connection reuse, no cache.
+        blocking_count = max(1, requests // 20)
+        start_time = time.perf_counter()
+        for number in range(blocking_count):
+            await asyncio.to_thread(blocking_requests.get, url, params={"q": f"city{number % city_count}"}, timeout=10)
+        rows.append(("blocking requests.get", blocking_count / (time.perf_counter() - start_time), blocking_count))
+
+        global weather
+        previous = weather
+        try:
+            async with Client(mcp) as client:
+                semaphore = asyncio.Semaphore(concurrency)
+
+                async def call(arguments, tool="get_weather"):
+                    async with semaphore:
+                        await client.call_tool(tool, arguments)
+
+                for mode, ttl, city_names in (
+                    ("async pooled, cache off", 0, [f"city{n}" for n in range(requests)]),
+                    ("async pooled + cache/coalescing", WEATHER_TTL_SECONDS,
+                     [f"city{n % city_count}" for n in range(requests)]),
+                ):
+                    weather = WeatherClient(url=url, api_key="stub", ttl=ttl)
+                    start_time = time.perf_counter()
+                    await asyncio.gather(*(call({"city": city}) for city in city_names))
+                    rows.append((mode, requests / (time.perf_counter() - start_time), weather.upstream_calls))
+                    await weather.aclose()
+
+                # Same number of upstream requests in flight as above: concurrency // city_count batch calls.
+                semaphore = asyncio.Semaphore(max(1, concurrency // city_count))
+                weather = WeatherClient(url=url, api_key="stub", ttl=0)
+                batches = [[f"city{n}" for n in range(start, start + city_count)] for start in range(0, requests, city_count)]
+                start_time = time.perf_counter()
+                await asyncio.gather(*(call({"cities": batch}, tool="get_weather_many") for batch in batches))
+                rows.append((f"get_weather_many ({city_count} cities/call)", requests / (time.perf_counter() - start_time),
+                             weather.upstream_calls))
+                await weather.aclose()
+        finally:
+            weather = previous
+    finally:
+        server.should_exit = True
+        await serving
+    return rows
+
+
+def _stub_weather_client(delay_seconds=0.1, ttl=WEATHER_TTL_SECONDS):
+    transport = httpx.ASGITransport(app=openweather_stub_app(delay_seconds))
+    return WeatherClient(url="http://openweather/data/2.5/weather", api_key="stub", ttl=ttl, transport=transport)
+
+
+def test_burst_for_one_city_is_one_upstream_call():
+    client = _stub_weather_client()
+
+    async def burst():
+        return await asyncio.gather(*(client.get(city) for city in ["Paris", "paris ", " PARIS"] * 20))
+
+    answers = asyncio.run(burst())
+    assert set(answers) == {"Paris weather: clear sky, 21.0°C"}
+    assert client.upstream_calls == 1
+    assert asyncio.run(client.get("Atlantis")) == "Could not fetch weather for Atlantis."
+
+
+def test_error_statuses_and_non_json_bodies_are_reported():
+    client = _stub_weather_client(delay_seconds=0)
+    assert asyncio.run(client.get("Gateway")) == "Could not fetch weather for Gateway: HTTP 502"
+    assert asyncio.run(client.get("Teapot")) == "Could not fetch weather for Teapot: the response was not JSON"
+
+
+def test_client_of_a_previous_event_loop_is_closed():
+    client = _stub_weather_client(delay_seconds=0)
+    asyncio.run(client.get("Paris"))
+    first = client._client
+    asyncio.run(client.get("Delhi"))
+    assert first.is_closed and client._client is not first and not client._client.is_closed
+
+
+def test_get_weather_many_fetches_cities_concurrently_in_order():
+    global weather
+    previous, weather = weather, _stub_weather_client(delay_seconds=0.1, ttl=0)
+
+    async def scenario():
+        async with Client(mcp) as client:
+            start_time = time.perf_counter()
+            result = await client.call_tool("get_weather_many", {"cities": ["Paris", "Delhi", "Oslo", "Lima", "Rome"]})
+            return result.data, time.perf_counter() - start_time
+
+    try:
+        answers, elapsed = asyncio.run(scenario())
+    finally:
+        weather = previous
+    assert [answer.split(" ")[0] for answer in answers] == ["Paris", "Delhi", "Oslo", "Lima", "Rome"]
+    assert elapsed < 0.3
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Custom weather MCP server.")
+    parser.add_argument("--load-test", action="store_true", help="benchmark the tools against a local OpenWeatherMap stub")
+    args = parser.parse_args()
+    if args.load_test:
+        print(f"{'mode':<40} {'requests/s':>11} {'upstream calls':>15}")
+        for mode, throughput, upstream_calls in asyncio.run(load_test()):
+            print(f"{mode:<40} {throughput:>11.0f} {upstream_calls:>15}")
+    else:
+        # This will start the MCP server and listen for HTTP requests on port 8002
+        mcp.run(transport="http", port=8002)
@@ -1,13 +1,12 @@
-import asyncio
 import os
 from dotenv import load_dotenv
-from fastmcp import Client
 from langchain.tools import tool
 from langchain_openai import ChatOpenAI
 from langchain.agents import initialize_agent, AgentType
-from fastmcp.client.transports import StdioTransport  # or NpxStdioTransport
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain.prompts import PromptTemplate
+from mcp_session_pool import McpSessionPool, stdio_server
+from parallel_tool_executor import ParallelAgentExecutor
 
 
 # Load environment variables from .env file
@@ -15,36 +14,37 @@ load_dotenv()
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 os.environ["GOOGLE_MAPS_API_KEY"] = os.getenv("GOOGLE_MAPS_API_KEY")
 
-# Launch the MCP server as a subprocess via stdio
-transport = StdioTransport(
+# Launch the MCP server once, as a subprocess via stdio, and keep the sessions open.
+# Two sessions, so the parallel get_coordinates and get_directions calls don't wait on each other.
+mcp_pool = McpSessionPool().register(
+    "google-maps",
+    stdio_server(
         command="npx",
         args=["-y", "@modelcontextprotocol/server-google-maps"],
         env={"GOOGLE_MAPS_API_KEY": os.getenv("GOOGLE_MAPS_API_KEY")},
+    ),
+    size=2,
+)
+
+# ---------- Step 1: call the MCP server over a pooled session ----------
+def call_directions(origin: str, destination: str, mode: str = "driving", tool_name: str = "maps_directions"):
+    return mcp_pool.call_text(
+        "google-maps",
+        tool_name,
+        {"origin": origin, "destination": destination, "mode": mode},
     )
 
-client = Client(transport)
-
-# ---------- Step 1: async call to MCP server ----------
-async def call_directions(origin: str, destination: str, mode: str = "driving", tool_name: str = "maps_directions"):
-
-     async with client:
-        result = await client.call_tool(
-            tool_name,
-            {"origin": origin, "destination": destination, "mode": mode},
-        )
-        return result
-
 
 # ---------- Step 2: Wrap in LangChain tool ----------
 @tool
 def get_directions(origin: str, destination: str, mode: str = "driving") -> str:
     """Get Google Maps directions using MCP server."""
-    return asyncio.run(call_directions(origin, destination, mode, tool_name="maps_directions"))
+    return call_directions(origin, destination, mode, tool_name="maps_directions")
 
 @tool
 def get_coordinates(origin: str, destination: str, mode: str = "driving") -> str:
     """Get Google Maps coordinates using MCP server."""
-    return asyncio.run(call_directions(origin, destination, mode, tool_name="maps_geocode"))
+    return call_directions(origin, destination, mode, tool_name="maps_geocode")
 
 
 # ---------- Step 3: Build LangChain agent ----------
@@ -59,7 +59,8 @@ def main():
     """
 
     agent = create_tool_calling_agent(llm, [get_directions,get_coordinates], PromptTemplate.from_template(prompt_template))
-    executor = AgentExecutor(agent=agent, tools=[get_directions,get_coordinates],verbose=True)
+    # Tool calls from the same model turn (coordinates + directions) run concurrently
+    executor = ParallelAgentExecutor(agent=agent, tools=[get_directions,get_coordinates],verbose=True, toolTimeout=60)
 
 
     # Example query
@@ -1,13 +1,11 @@
-import asyncio
 import os
 from dotenv import load_dotenv
-from fastmcp import Client
 from langchain.tools import tool
 from langchain_openai import ChatOpenAI
 from langchain.agents import initialize_agent, AgentType
-from fastmcp.client.transports import StdioTransport  # or NpxStdioTransport
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain.prompts import PromptTemplate
+from mcp_session_pool import McpSessionPool, http_server
 
 
 # Load environment variables from .env file
@@ -16,23 +14,20 @@ os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 os.environ["GOOGLE_MAPS_API_KEY"] = os.getenv("GOOGLE_MAPS_API_KEY")
 
 
-# ---------- Step 1: async call to MCP server ----------
-async def weather_tool(city: str):
-     client = Client("http://localhost:8002/mcp")
+# One long-lived HTTP session to the weather MCP server, shared by every tool call
+mcp_pool = McpSessionPool().register("weather", http_server("http://localhost:8002/mcp"))
 
-     async with client:
-        result = await client.call_tool(
-            "get_weather",
-            {"city": city},
-        )
-        return result
+
+# ---------- Step 1: call the MCP server over the pooled session ----------
+def weather_tool(city: str):
+    return mcp_pool.call_text("weather", "get_weather", {"city": city})
 
 
 # ---------- Step 2: Wrap in LangChain tool ----------
 @tool
 def get_weather_tool(city: str) -> str:
     """Get weather information using MCP server."""
-    return asyncio.run(weather_tool(city))
+    return weather_tool(city)
 
 
 # ---------- Step 3: Build LangChain agent ----------
@@ -15,7 +15,12 @@ Demonstrate practical agent workflows, including prompt handling, tool invocatio
 """
 
 # Required Libraries
+import argparse
+import asyncio
+import logging
 import os
+import time
+import httpx
 import requests
 from dotenv import load_dotenv
 from langchain.agents import create_tool_calling_agent
@@ -23,20 +28,22 @@ from langchain.tools import Tool
 from langchain_openai import ChatOpenAI
 from langchain.agents import AgentExecutor
 from langchain.prompts import PromptTemplate
+from outbox import Outbox, RetryLater
 
 # Load environment variables from .env
 load_dotenv()
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")
+OPENWEATHER_URL = "http://api.openweathermap.org/data/2.5/weather"
+WEATHER_CONCURRENCY = 50
 
-# Define function to call OpenWeatherMap API
-def get_weather(city: str) -> str:
-    url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={OPENWEATHER_API_KEY}&units=metric"
-    response = requests.get(url)
-    if response.status_code != 200:
-        return f"Failed to retrieve weather data: {response.text}"
+logger = logging.getLogger(__name__)
 
-    data = response.json()
+# One keep-alive session for single-city lookups
+weather_session = requests.Session()
+
+
+def format_weather(city, data):
     weather_main = data["weather"][0]["main"]
     weather_desc = data["weather"][0]["description"]
     temp = data["main"]["temp"]
@@ -53,14 +60,92 @@ def get_weather(city: str) -> str:
     )
     return formatted
 
-def send_slack_message(message: str) -> None:
-    slack_payload = {
-        "text": message
-    }
-    response = requests.post(SLACK_WEBHOOK_URL, json=slack_payload)
+
+def format_weather_line(city, data):
+    """One digest line per city, so a 300-city digest fits in one Slack message."""
+    return (f"*{city.title()}*: {data['weather'][0]['main']} ({data['weather'][0]['description']}), "
+            f"{data['main']['temp']}°C, humidity {data['main']['humidity']}%, wind {data['wind']['speed']} m/s")
+
+
+# Define function to call OpenWeatherMap API
+def get_weather(city: str) -> str:
+    params = {"q": city, "appid": OPENWEATHER_API_KEY, "units": "metric"}
+    response = weather_session.get(OPENWEATHER_URL, params=params, timeout=10)
+    if response.status_code != 200:
+        return f"Failed to retrieve weather data: {response.text}"
+    return format_weather(city, response.json())
+
+
+async def fetch_weather_many(cities, concurrency=WEATHER_CONCURRENCY):
+    """
+    Weather digest lines for all cities, fetched concurrently over one pooled client, in input order.
+    Returns (lines, failed cities).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=10, limits=limits) as client:
+        async def one(city):
+            async with semaphore:
+                try:
+                    response = await client.get(OPENWEATHER_URL, params={"q": city, "appid": OPENWEATHER_API_KEY,
+                                                                         "units": "metric"})
+                except httpx.HTTPError as e:
+                    return f"*{city.title()}*: failed to retrieve weather data ({e})", False
+                if response.status_code != 200:
+                    return f"*{city.title()}*: failed to retrieve weather data ({response.status_code})", False
+                return format_weather_line(city, response.json()), True
+
+        results = await asyncio.gather(*(one(city) for city in cities))
+    failed = [city for city, (_, ok) in zip(cities, results) if not ok]
+    return [line for line, _ in results], failed
+
+
+async def apost_weather_digest(cities: str) -> str:
+    """Fetch weather for comma-separated cities concurrently and queue one Slack digest."""
+    city_list = [city.strip() for city in cities.split(",") if city.strip()]
+    start_time = time.perf_counter()
+    lines, failed = await fetch_weather_many(city_list)
+    digest = f"Weather digest ({len(city_list)} cities)\n" + "\n".join(lines)
+    logger.info("Fetched weather for %d cities in %.1fs", len(city_list), time.perf_counter() - start_time)
+    if not await slack_outbox.apost(digest):
+        return "Slack outbox is full; digest not sent."
+    # Only a summary goes back to the agent: the digest itself can be tens of thousands of characters.
+    result = f"Digest for {len(city_list)} {'city' if len(city_list) == 1 else 'cities'} queued for Slack ({len(failed)} failed)"
+    if failed:
+        result += f": {', '.join(failed[:10])}{', ...' if len(failed) > 10 else ''}"
+    return result + "."
+
+
+def post_weather_digest(cities: str) -> str:
+    return asyncio.run(apost_weather_digest(cities))
+
+
+slack_client = None
+
+
+async def post_to_slack(text):
+    # Runs on the outbox's event loop; the client (and its connection pool) lives there too.
+    global slack_client
+    if slack_client is None:
+        slack_client = httpx.AsyncClient(timeout=10)
+    response = await slack_client.post(SLACK_WEBHOOK_URL, json={"text": text})
+    if response.status_code == 429:
+        raise RetryLater(float(response.headers.get("Retry-After", 1)))
     if response.status_code != 200:
         raise ValueError(f"Request to Slack returned an error {response.status_code}, the response is:\n{response.text}")
 
+
+# Updates posted within 2 seconds of each other go out as one Slack message
+slack_outbox = Outbox(post_to_slack, coalesceSeconds=2.0, name="slack-outbox")
+
+
+def send_slack_message(message: str) -> str:
+    """Queue the message for Slack and return immediately; delivery and retries happen in the background."""
+    if not slack_outbox.post(message):
+        return "Slack outbox is full; message not sent."
+    return "Message queued for Slack."
+
 # Define tool for LangChain
 weather_tool = Tool(
     name="WeatherAPI",
@@ -74,18 +159,36 @@ slack_tool = Tool(
     func=send_slack_message
 )
 
+digest_tool = Tool(
+    name="WeatherDigest",
+    description="Fetches current weather for several comma-separated cities at once and posts one digest to Slack",
+    func=post_weather_digest,
+    coroutine=apost_weather_digest
+)
+
 prompt_template="""You are a weather assistant. When asked about the weather, 
   you will fetch the current weather information using the WeatherAPI tool and 
-  then post the update to Slack using the SlackPoster tool.
+  then post the update to Slack using the SlackPoster tool. For several cities,
+  use the WeatherDigest tool once instead.
   Question: {input}
   {agent_scratchpad}
     """
 
 # Setup LLM and Agent
 llm = ChatOpenAI(model="gpt-4", temperature=0)
-agent = create_tool_calling_agent(llm, [weather_tool, slack_tool],
+agent = create_tool_calling_agent(llm, [weather_tool, slack_tool, digest_tool],
     PromptTemplate.from_template(prompt_template))
-agent_executor = AgentExecutor(agent=agent, tools=[weather_tool, slack_tool], verbose=True)
-
-
-response = agent_executor.invoke({"input": f"What is the weather in London?"})
+agent_executor = AgentExecutor(agent=agent, tools=[weather_tool, slack_tool, digest_tool], verbose=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weather to Slack agent.")
+    parser.add_argument("--digest", help="comma-separated cities: post one weather digest without the agent")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.digest:
+        print(post_weather_digest(args.digest))
+    else:
+        response = agent_executor.invoke({"input": f"What is the weather in London?"})
+    # Deliver anything still queued before exiting
+    slack_outbox.close()
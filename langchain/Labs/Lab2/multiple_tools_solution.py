@@ -1,5 +1,6 @@
 import os
 import re
+import sys
 import googlemaps
 from langchain.tools import tool
 from langchain.agents import initialize_agent, AgentType
@@ -10,6 +11,11 @@ from langchain.prompts import PromptTemplate
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 import requests
 
+# ParallelAgentExecutor and the Maps cache live in the langchain folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from maps_cache import create_cached_directions
+from parallel_tool_executor import ParallelAgentExecutor
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -20,6 +26,8 @@ print(f"Google Maps API Key: {google_map_key}")
 
 # ✅ Initialize Google Maps client (replace with your API key or env var)
 gmaps = googlemaps.Client(key=google_map_key)
+# Repeated origin/destination pairs are answered from cache instead of a new billed Maps request
+maps = create_cached_directions(gmaps)
 
 
 @tool
@@ -27,7 +35,7 @@ def weather_tool(origin_city: str) -> str:
     """Get current weather for a city using OpenWeatherMap API."""
     api_key = os.getenv("OPENWEATHER_API_KEY")
     url = f"http://api.openweathermap.org/data/2.5/weather?q={origin_city}&appid={api_key}&units=metric"
-    response = requests.get(url)
+    response = requests.get(url, timeout=10)
     data = response.json()
     if "weather" in data and "main" in data:
         return f"{origin_city.title()} weather: {data['weather'][0]['description']}, {data['main']['temp']}°C"
@@ -37,7 +45,7 @@ def weather_tool(origin_city: str) -> str:
 @tool
 def get_travel_time(origin: str, destination: str, mode: str = "driving") -> str:
     """Get travel time between two places using Google Maps (modes: driving, walking, bicycling, transit)."""
-    directions = gmaps.directions(
+    directions = maps.directions(
         origin=origin,
         destination=destination,
         mode=mode,
@@ -52,7 +60,7 @@ def get_travel_time(origin: str, destination: str, mode: str = "driving") -> str
 def directions_tool(origin: str, destination: str, mode: str = "driving") -> str:
     """Get directions between two places using Google Maps (modes: driving, walking, bicycling, transit)."""
     try:
-       directions = gmaps.directions(origin, destination, mode)
+       directions = maps.directions(origin, destination, mode)
        instructions = []
        for step in directions[0]["legs"][0]["steps"]:
             instructions.append(step["html_instructions"])
@@ -85,6 +93,8 @@ agent = create_tool_calling_agent(
 
 
 
-executor = AgentExecutor(agent=agent, tools=[directions_tool,weather_tool,get_travel_time], verbose=True)
+# Weather, travel time and directions for one question are independent: run them concurrently
+executor = ParallelAgentExecutor(agent=agent, tools=[directions_tool,weather_tool,get_travel_time], verbose=True,
+                                 toolTimeout=30)
 
 response = executor.invoke({"input": "I am travelling from newyork to boston by car, Based on travel time, should i do WFH?"})
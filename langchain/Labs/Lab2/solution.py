@@ -1,5 +1,6 @@
 import os
 import re
+import sys
 import googlemaps
 from langchain.tools import tool
 from langchain.agents import initialize_agent, AgentType
@@ -10,6 +11,10 @@ from langchain.prompts import PromptTemplate
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 import requests
 
+# The Maps cache lives in the langchain folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from maps_cache import create_cached_directions
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -20,6 +25,8 @@ print(f"Google Maps API Key: {google_map_key}")
 
 # ✅ Initialize Google Maps client (replace with your API key or env var)
 gmaps = googlemaps.Client(key=google_map_key)
+# Repeated origin/destination pairs are answered from cache instead of a new billed Maps request
+maps = create_cached_directions(gmaps)
 
 
 # 🛠️ Define the custom tool
@@ -27,7 +34,7 @@ gmaps = googlemaps.Client(key=google_map_key)
 def directions_tool(origin: str, destination: str, mode: str = "driving") -> str:
     """Get directions between two places using Google Maps (modes: driving, walking, bicycling, transit)."""
     try:
-       directions = gmaps.directions(origin, destination, mode)
+       directions = maps.directions(origin, destination, mode)
        print(directions)
        instructions = []
        for step in directions[0]["legs"][0]["steps"]:
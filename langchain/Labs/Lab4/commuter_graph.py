@@ -0,0 +1,276 @@
+"""
+Commuter Assistant as a LangGraph graph (Lab4 solution, graph version).
+
+The agent in solution.ipynb answers "Can I WFH if I am travelling from Noida to Gurgaon?"
+in sequential agent turns: an LLM round-trip to decide on retriever_search, another
+inside RetrievalQA, another to decide on get_travel_time, and a final one to apply the
+rule, with the Google Maps call waiting behind the policy lookup. This graph does:
+
+    extract_trip  (1 LLM call: origin, destination, mode, what is needed)
+        |-- retrieve_policy   (vector/keyword search, no LLM)   } run in parallel
+        |-- travel_time       (Google Maps)                      }
+    decide        (1 LLM call: apply the policy to the travel time)
+
+Policy-only and travel-only questions take just the branch they need. If the model's
+routing reply is not JSON, the question falls back to policy retrieval only.
+
+Run: python commuter_graph.py   (needs OPENAI_API_KEY and GOOGLE_MAPS_API_KEY)
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import TypedDict
+
+from dotenv import load_dotenv
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import END, StateGraph
+
+# Shared RAG helpers (index cache, hybrid retrieval, context packing) from the LangGraph folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "langgraph"))
+# and the Google Maps cache from the langchain folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from context_packing import pack_context
+
+logger = logging.getLogger(__name__)
+
+extract_template = """
+You route questions for the Commuter Assistant Agent of TechNova Solutions Pvt. Ltd.
+Read the question and reply with JSON only, using exactly these keys:
+  "origin": start location or null
+  "destination": end location or null
+  "mode": one of "driving", "walking", "bicycling", "transit" (default "driving")
+  "needs_policy": true if the answer depends on company policy
+  "needs_travel_time": true if the answer depends on travel time between two places
+Question: {question}
+"""
+
+decide_template = """
+You are a Commuter Assistant Agent for TechNova Solutions Pvt. Ltd.
+Company policy context:
+{policy}
+
+Travel time: {travel_time}
+
+Question: {question}
+
+If the question is conditional, APPLY the policy rule to the travel time and give a clear
+YES/NO decision with reasoning. If the policy context does not contain the answer, reply
+only: "I don't know based on the company document."
+Answer as if you are the Assistant Agent:
+"""
+
+
+class CommuterState(TypedDict, total=False):
+    question: str
+    origin: str
+    destination: str
+    mode: str
+    needs_policy: bool
+    needs_travel_time: bool
+    policy: str
+    travel_time: str
+    answer: str
+
+
+def build_commuter_graph(llm, retriever, travel_time_lookup, context_token_budget=1500):
+    """
+    llm: chat model or LLM; retriever: any retriever over the policy document;
+    travel_time_lookup(origin, destination, mode) -> str (sync, may block on the network).
+    """
+    extract_chain = PromptTemplate.from_template(extract_template) | llm | JsonOutputParser()
+    decide_chain = PromptTemplate.from_template(decide_template) | llm | StrOutputParser()
+
+    def trip_update(trip):
+        if not isinstance(trip, dict):
+            logger.warning("Trip extraction returned %r, not an object; answering from the policy only", trip)
+            trip = {}
+        origin, destination = trip.get("origin"), trip.get("destination")
+        return {
+            "origin": origin or "",
+            "destination": destination or "",
+            "mode": trip.get("mode") or "driving",
+            "needs_policy": bool(trip.get("needs_policy", True)),
+            "needs_travel_time": bool(trip.get("needs_travel_time")) and bool(origin and destination),
+        }
+
+    def not_json(error):
+        logger.warning("Trip extraction was not JSON (%s); answering from the policy only", error)
+        return trip_update({})
+
+    def extract_trip(state):
+        try:
+            return trip_update(extract_chain.invoke({"question": state["question"]}))
+        except OutputParserException as e:
+            return not_json(e)
+
+    async def aextract_trip(state):
+        try:
+            return trip_update(await extract_chain.ainvoke({"question": state["question"]}))
+        except OutputParserException as e:
+            return not_json(e)
+
+    def retrieve_policy(state):
+        return {"policy": pack_context(retriever.invoke(state["question"]), tokenBudget=context_token_budget)[0]}
+
+    async def aretrieve_policy(state):
+        docs = await retriever.ainvoke(state["question"])
+        return {"policy": pack_context(docs, tokenBudget=context_token_budget)[0]}
+
+    def travel_time(state):
+        try:
+            return {"travel_time": travel_time_lookup(state["origin"], state["destination"], state["mode"])}
+        except Exception as e:
+            return {"travel_time": f"Could not fetch travel time: {e}"}
+
+    async def atravel_time(state):
+        # The Google Maps client is blocking; keep it off the event loop.
+        return await asyncio.to_thread(travel_time, state)
+
+    def route(state):
+        branches = []
+        if state["needs_policy"]:
+            branches.append("retrieve_policy")
+        if state["needs_travel_time"]:
+            branches.append("travel_time")
+        # Both selected branches run in the same step, i.e. concurrently.
+        return branches or ["retrieve_policy"]
+
+    def decide_inputs(state):
+        return {
+            "question": state["question"],
+            "policy": state.get("policy") or "(not needed for this question)",
+            "travel_time": state.get("travel_time") or "(not needed for this question)",
+        }
+
+    def decide(state):
+        return {"answer": decide_chain.invoke(decide_inputs(state))}
+
+    async def adecide(state):
+        return {"answer": await decide_chain.ainvoke(decide_inputs(state))}
+
+    workflow = StateGraph(CommuterState)
+    workflow.add_node("extract_trip", RunnableLambda(extract_trip, afunc=aextract_trip))
+    workflow.add_node("retrieve_policy", RunnableLambda(retrieve_policy, afunc=aretrieve_policy))
+    workflow.add_node("travel_time", RunnableLambda(travel_time, afunc=atravel_time))
+    workflow.add_node("decide", RunnableLambda(decide, afunc=adecide))
+    workflow.set_entry_point("extract_trip")
+    workflow.add_conditional_edges("extract_trip", route, ["retrieve_policy", "travel_time"])
+    # decide is the join: it runs once, after every branch scheduled in the previous step has finished.
+    workflow.add_edge("retrieve_policy", "decide")
+    workflow.add_edge("travel_time", "decide")
+    workflow.add_edge("decide", END)
+    return workflow.compile()
+
+
+def gmaps_travel_time_lookup(google_map_key):
+    import googlemaps
+    from maps_cache import create_cached_directions, travel_time_text
+
+    # Repeated trips within the same 15-minute departure window reuse one Maps request
+    maps = create_cached_directions(googlemaps.Client(key=google_map_key))
+
+    def lookup(origin, destination, mode="driving"):
+        directions = maps.directions(origin=origin, destination=destination, mode=mode,
+                                     departure_time="now")  # Use live traffic data
+        return travel_time_text(directions)
+
+    return lookup
+
+
+def main():
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+    from embedding_cache import CachedEmbeddings
+    from hybrid_retriever import create_hybrid_retriever
+    from index_store import load_or_build_vectorstore
+
+    load_dotenv()
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    pdf_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "company_policy.pdf")
+
+    vectorstore = load_or_build_vectorstore(pdf_path, CachedEmbeddings(OpenAIEmbeddings()))
+    retriever = create_hybrid_retriever(vectorstore, k=8)
+    llm = ChatOpenAI(model="gpt-4", temperature=0, api_key=openai_api_key)
+    graph = build_commuter_graph(llm, retriever, gmaps_travel_time_lookup(os.getenv("GOOGLE_MAPS_API_KEY")))
+
+    print("Commuter Assistant (LangGraph). Type your question (or 'exit' to quit):")
+    while True:
+        question = input("You: ")
+        if question.lower() == "exit":
+            break
+        start_time = time.perf_counter()
+        result = graph.invoke({"question": question})
+        print("Bot:", result["answer"])
+        print(f"[DEBUG] {time.perf_counter() - start_time:.1f}s, travel time: {result.get('travel_time', '-')}")
+
+
+if __name__ == "__main__":
+    main()
+
+
+def test_policy_and_travel_branches_run_in_parallel():
+    """A conditional question costs two LLM calls and max(), not sum(), of the two lookups."""
+    from langchain_core.documents import Document
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    llm = FakeListChatModel(responses=[
+        '{"origin": "Noida", "destination": "Gurgaon", "mode": "driving", "needs_policy": true, "needs_travel_time": true}',
+        "YES - your commute is over 90 minutes, so WFH is allowed.",
+    ])
+
+    def slow_retrieve(question):
+        time.sleep(0.3)
+        return [Document(page_content="WFH is allowed when the commute is longer than 90 minutes.")]
+
+    def slow_travel_time(origin, destination, mode):
+        time.sleep(0.3)
+        return f"Estimated travel time: 1 hour 45 mins ({origin} -> {destination}, {mode})"
+
+    graph = build_commuter_graph(llm, RunnableLambda(slow_retrieve), slow_travel_time)
+    for run in (graph.invoke, lambda state: asyncio.run(graph.ainvoke(state))):
+        llm.i = 0
+        start_time = time.perf_counter()
+        result = run({"question": "Can I WFH if I am travelling from Noida to Gurgaon?"})
+        elapsed = time.perf_counter() - start_time
+        assert result["answer"].startswith("YES")
+        assert "Noida -> Gurgaon" in result["travel_time"] and "90 minutes" in result["policy"]
+        assert elapsed < 0.5
+
+
+def test_policy_only_question_skips_google_maps():
+    from langchain_core.documents import Document
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    llm = FakeListChatModel(responses=[
+        '{"origin": null, "destination": null, "needs_policy": true, "needs_travel_time": false}',
+        "Leave policy: 20 days of annual leave.",
+    ])
+
+    def no_maps(*args):
+        raise AssertionError("Google Maps should not be called")
+
+    graph = build_commuter_graph(llm, RunnableLambda(lambda q: [Document(page_content="20 days of annual leave.")]), no_maps)
+    result = graph.invoke({"question": "What is the leave policy?"})
+    assert "travel_time" not in result and result["answer"].startswith("Leave policy")
+
+
+def test_non_json_trip_falls_back_to_policy_retrieval():
+    from langchain_core.documents import Document
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    def no_maps(*args):
+        raise AssertionError("Google Maps should not be called")
+
+    graph = build_commuter_graph(
+        FakeListChatModel(responses=["Sure! You are going from Noida to Gurgaon.", "WFH needs a 90+ minute commute."]),
+        RunnableLambda(lambda q: [Document(page_content="WFH is allowed when the commute is longer than 90 minutes.")]),
+        no_maps)
+    for run in (graph.invoke, lambda state: asyncio.run(graph.ainvoke(state))):
+        result = run({"question": "Can I WFH if I am travelling from Noida to Gurgaon?"})
+        assert result["needs_policy"] and not result["needs_travel_time"] and "travel_time" not in result
+        assert "90 minutes" in result["policy"] and result["answer"] == "WFH needs a 90+ minute commute."
@@ -0,0 +1,288 @@
+"""
+Pooled, bulk Jira client with a local issue cache for the test-generation agent.
+
+fetch_jira_story did a fresh requests.get per issue: a new connection, no cache and no
+way to resolve many issues at once, which is what release runs need. JiraClient:
+
+- one requests.Session with a keep-alive connection pool (maxConnections)
+- get_issues(ids) resolves many issues with JQL "key in (...)" searches, pageSize keys
+  per page, pages fetched concurrently (maxConcurrency)
+- issues are cached locally (SQLite, in memory unless cachePath is given) and
+  revalidated by their `updated` timestamp: a cheap fields=updated search over the
+  cached keys, then a full fetch of only the issues that changed
+
+Issue keys are validated (PROJ-123 form) before they go into JQL; partition_issue_keys
+separates the invalid ones so callers can report them, and valid keys are quoted.
+
+Works against Jira Server/Data Center (Bearer token as in docker-compose.yaml, or
+username + password/token as basic auth) through GET /rest/api/2/search. Jira Cloud has
+retired that endpoint in favour of /rest/api/3/search/jql and is not supported.
+"""
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIELDS = ("summary", "description", "updated")
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_CONNECTIONS = 10
+DEFAULT_TIMEOUT = 30
+ISSUE_KEY = re.compile(r"^[A-Z][A-Z0-9_]*-\d+$")
+
+
+class JiraError(Exception):
+    pass
+
+
+class IssueCache:
+    """issue key -> (updated, issue JSON) in SQLite."""
+
+    def __init__(self, path=None):
+        self._connection = sqlite3.connect(path or ":memory:", check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS issues "
+                                     "(key TEXT PRIMARY KEY, updated TEXT NOT NULL, issue TEXT NOT NULL)")
+
+    def get_many(self, keys):
+        """{key: (updated, issue)} for the cached keys among `keys`."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                row = self._connection.execute("SELECT updated, issue FROM issues WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    found[key] = (row[0], json.loads(row[1]))
+        return found
+
+    def put_many(self, issues):
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO issues VALUES (?, ?, ?)",
+                                         [(issue["key"], issue["fields"].get("updated") or "", json.dumps(issue))
+                                          for issue in issues])
+
+
+def normalize_issue_key(key):
+    return key.strip().upper()
+
+
+def partition_issue_keys(keys):
+    """(valid, invalid) normalized keys, each without repeats, in input order."""
+    keys = list(dict.fromkeys(normalize_issue_key(key) for key in keys))
+    return [key for key in keys if ISSUE_KEY.match(key)], [key for key in keys if not ISSUE_KEY.match(key)]
+
+
+def story_text(issue):
+    """The user story of an issue: its description, else its summary."""
+    fields = issue["fields"]
+    return fields.get("description") or fields.get("summary")
+
+
+class JiraClient:
+    """Jira REST client with connection pooling, concurrent bulk search and an updated-revalidated cache."""
+
+    def __init__(self, baseUrl, token=None, email=None, cachePath=None, fields=DEFAULT_FIELDS,
+                 pageSize=DEFAULT_PAGE_SIZE, maxConcurrency=DEFAULT_MAX_CONCURRENCY,
+                 maxConnections=DEFAULT_MAX_CONNECTIONS, timeout=DEFAULT_TIMEOUT):
+        self.baseUrl = (baseUrl or "").rstrip("/")
+        self.fields = list(fields)
+        self.pageSize = pageSize
+        self.maxConcurrency = maxConcurrency
+        self.timeout = timeout
+        self.cache = IssueCache(cachePath)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=maxConnections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept"] = "application/json"
+        if email:
+            self.session.auth = (email, token)
+        elif token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        self.requestCount = 0
+
+    def _get(self, path, params=None):
+        self.requestCount += 1
+        response = self.session.get(f"{self.baseUrl}{path}", params=params, timeout=self.timeout)
+        if response.status_code != 200:
+            raise JiraError(f"Jira request {path} failed ({response.status_code}): {response.text}")
+        return response.json()
+
+    def search_page(self, jql, fields, startAt=0, maxResults=None):
+        return self._get("/rest/api/2/search", {
+            "jql": jql, "fields": ",".join(fields), "startAt": startAt,
+            "maxResults": maxResults or self.pageSize, "validateQuery": "warn",
+        })
+
+    def search(self, jql, fields=None):
+        """All issues matching jql: the first page, then the remaining pages concurrently."""
+        fields = fields or self.fields
+        first = self.search_page(jql, fields)
+        issues = list(first["issues"])
+        starts = range(len(issues), first.get("total", 0), self.pageSize) if issues else []
+        with ThreadPoolExecutor(self.maxConcurrency) as pool:
+            for page in pool.map(lambda startAt: self.search_page(jql, fields, startAt), starts):
+                issues.extend(page["issues"])
+        return issues
+
+    def _search_keys(self, keys, fields):
+        """Issues for `keys`, one `key in (...)` page per pageSize keys, pages fetched concurrently."""
+        chunks = [keys[start:start + self.pageSize] for start in range(0, len(keys), self.pageSize)]
+
+        def fetch(chunk):
+            quoted = ", ".join(f'"{key}"' for key in chunk)
+            return self.search_page(f"key in ({quoted})", fields, maxResults=len(chunk))["issues"]
+
+        with ThreadPoolExecutor(self.maxConcurrency) as pool:
+            return [issue for page in pool.map(fetch, chunks) for issue in page]
+
+    def get_issues(self, keys):
+        """{key: issue} for every key that exists, from cache where `updated` is unchanged. Invalid keys are skipped."""
+        keys, invalid = partition_issue_keys(keys)
+        if invalid:
+            logger.warning("Jira: skipping invalid issue keys %s", ", ".join(invalid))
+        cached = self.cache.get_many(keys)
+        stale = [key for key in keys if key not in cached]
+        if cached:
+            current = {issue["key"]: issue["fields"].get("updated") or ""
+                       for issue in self._search_keys(list(cached), ["updated"])}
+            stale += [key for key, (updated, _) in cached.items() if current.get(key) != updated]
+            cached = {key: entry for key, entry in cached.items() if current.get(key) == entry[0]}
+        fetched = self._search_keys(stale, self.fields) if stale else []
+        self.cache.put_many(fetched)
+        logger.info("Jira: %d issues requested, %d from cache, %d fetched", len(keys), len(cached), len(fetched))
+
+        issues = {key: issue for key, (_, issue) in cached.items()}
+        issues.update((issue["key"], issue) for issue in fetched)
+        return {key: issues[key] for key in keys if key in issues}
+
+    def get_issue(self, key):
+        key = normalize_issue_key(key)
+        if not ISSUE_KEY.match(key):
+            raise JiraError(f"Invalid Jira issue key {key!r}")
+        issue = self.get_issues([key]).get(key)
+        if issue is None:
+            raise JiraError(f"Jira issue {key} not found")
+        return issue
+
+    def close(self):
+        self.session.close()
+
+
+def _stand_in_jira(issues):
+    """Local Jira stand-in (issue + search endpoints) on a free port; returns (server, stats)."""
+    import http.server
+    import re
+    from urllib.parse import parse_qs, urlparse
+
+    stats = {"requests": 0, "connections": set(), "searches": []}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, body):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            stats["requests"] += 1
+            stats["connections"].add(self.client_address)
+            url = urlparse(self.path)
+            query = {name: values[0] for name, values in parse_qs(url.query).items()}
+            fields = query.get("fields", "").split(",")
+
+            def project(issue):
+                return {"key": issue["key"], "fields": {name: issue["fields"].get(name) for name in fields}}
+
+            if url.path == "/rest/api/2/search":
+                stats["searches"].append((query["jql"], fields))
+                keys = re.findall(r"[A-Z]+-\d+", query["jql"])
+                matches = [issues[key] for key in keys if key in issues]
+                startAt, maxResults = int(query.get("startAt", 0)), int(query.get("maxResults", 50))
+                self._json(200, {"startAt": startAt, "total": len(matches),
+                                 "issues": [project(issue) for issue in matches[startAt:startAt + maxResults]]})
+            else:
+                self._json(404, {"errorMessages": ["Not found"]})
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def _issue(key, updated="2025-01-01T10:00:00.000+0000"):
+    return {"key": key, "fields": {"summary": f"Story {key}", "description": f"As a user I want {key}",
+                                   "updated": updated}}
+
+
+def test_bulk_fetch_pages_concurrently_over_pooled_connections():
+    issues = {f"PROJ-{n}": _issue(f"PROJ-{n}") for n in range(1, 121)}
+    server, stats = _stand_in_jira(issues)
+    try:
+        client = JiraClient(f"http://127.0.0.1:{server.server_address[1]}", token="t", pageSize=25, maxConcurrency=4)
+        wanted = [f"proj-{n}" for n in range(1, 121)] + ["PROJ-999"]
+        found = client.get_issues(wanted)
+        assert list(found) == [f"PROJ-{n}" for n in range(1, 121)]
+        assert story_text(found["PROJ-42"]) == "As a user I want PROJ-42"
+        assert stats["requests"] == 5  # 121 keys / 25 per page
+        assert len(stats["connections"]) <= 4
+        client.close()
+    finally:
+        server.shutdown()
+
+
+def test_cached_issues_are_revalidated_by_updated():
+    issues = {key: _issue(key) for key in ("PROJ-1", "PROJ-2", "PROJ-3")}
+    server, stats = _stand_in_jira(issues)
+    try:
+        client = JiraClient(f"http://127.0.0.1:{server.server_address[1]}", token="t")
+        client.get_issues(["PROJ-1", "PROJ-2"])
+        issues["PROJ-2"] = dict(_issue("PROJ-2", updated="2025-02-01T09:00:00.000+0000"),
+                                fields={"summary": "Story PROJ-2", "description": "Changed story",
+                                        "updated": "2025-02-01T09:00:00.000+0000"})
+        stats["searches"].clear()
+
+        found = client.get_issues(["PROJ-1", "PROJ-2", "PROJ-3"])
+        assert story_text(found["PROJ-2"]) == "Changed story" and story_text(found["PROJ-1"]) == "As a user I want PROJ-1"
+        revalidate, fetch = stats["searches"]
+        assert revalidate[1] == ["updated"] and "PROJ-1" in revalidate[0] and "PROJ-3" not in revalidate[0]
+        assert "PROJ-1" not in fetch[0] and "PROJ-2" in fetch[0] and "PROJ-3" in fetch[0]
+        try:
+            client.get_issue("PROJ-404")
+            raise AssertionError("JiraError expected")
+        except JiraError:
+            pass
+    finally:
+        server.shutdown()
+
+
+def test_invalid_keys_are_reported_and_never_reach_jql():
+    assert partition_issue_keys([" proj-1", "PROJ-1", "1PROJ-2", "PROJ-3) OR project = SECRET", "A_B2-7", ""]) == \
+        (["PROJ-1", "A_B2-7"], ["1PROJ-2", "PROJ-3) OR PROJECT = SECRET", ""])
+    server, stats = _stand_in_jira({"PROJ-1": _issue("PROJ-1")})
+    try:
+        client = JiraClient(f"http://127.0.0.1:{server.server_address[1]}", token="t")
+        assert list(client.get_issues(["PROJ-1", "PROJ-3) OR project = SECRET"])) == ["PROJ-1"]
+        assert [jql for jql, _ in stats["searches"]] == ['key in ("PROJ-1")']
+        assert list(client.get_issues(["not a key"])) == [] and len(stats["searches"]) == 1  # no request at all
+        try:
+            client.get_issue("PROJ 1")
+            raise AssertionError("JiraError expected")
+        except JiraError as e:
+            assert "Invalid" in str(e)
+    finally:
+        server.shutdown()
@@ -0,0 +1,144 @@
+"""
+Caching layer for Google Maps directions used by the travel-time and directions tools.
+
+The commuter and navigation agents call gmaps.directions on every tool invocation,
+and they ask for the same origin/destination pair repeatedly, within one conversation
+and across users. Each of those calls costs latency and a billed Maps request.
+CachedDirections.directions() has the same arguments and return value as
+gmaps.directions(), plus:
+
+- a key of normalized (origin, destination, mode) ("Noida " == "noida"), plus the
+  departure time bucketed to bucketSeconds for traffic-dependent requests
+  (departure_time given, or transit), so "now" is reused for a few minutes
+- liveTtl for traffic-dependent results, staticTtl for the rest
+- single-flight: concurrent identical requests make one Maps call
+- an optional persistent store (request_cache.SqliteStore) shared across restarts
+
+Usage:
+    maps = create_cached_directions(googlemaps.Client(key=google_map_key))  # MAPS_CACHE_PATH to persist
+    directions = maps.directions(origin, destination, mode=mode, departure_time="now")
+"""
+
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+from request_cache import RequestCache, SqliteStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIVE_TTL = 5 * 60
+DEFAULT_STATIC_TTL = 24 * 60 * 60
+DEFAULT_BUCKET_SECONDS = 15 * 60
+TRAFFIC_DEPENDENT_MODES = ("transit",)
+
+
+def normalize_place(place):
+    """Case-, whitespace- and punctuation-spacing-insensitive form of a place name."""
+    place = re.sub(r"\s*,\s*", ", ", place.strip().lower())
+    return re.sub(r"\s+", " ", place).rstrip(".,")
+
+
+def departure_bucket(departureTime, bucketSeconds=DEFAULT_BUCKET_SECONDS, now=None):
+    """Index of the bucketSeconds-wide window containing departureTime ("now", epoch seconds or datetime)."""
+    if departureTime is None or departureTime == "now":
+        departureTime = time.time() if now is None else now
+    elif isinstance(departureTime, datetime):
+        departureTime = departureTime.timestamp()
+    return int(departureTime // bucketSeconds)
+
+
+class CachedDirections:
+    """gmaps.directions() behind a TTL cache with single-flight and optional persistence."""
+
+    def __init__(self, gmaps, liveTtl=DEFAULT_LIVE_TTL, staticTtl=DEFAULT_STATIC_TTL,
+                 bucketSeconds=DEFAULT_BUCKET_SECONDS, store=None, clock=time.time):
+        self.gmaps = gmaps
+        self.liveTtl = liveTtl
+        self.staticTtl = staticTtl
+        self.bucketSeconds = bucketSeconds
+        self.clock = clock
+        self.cache = RequestCache(defaultTtl=staticTtl, store=store, clock=clock)
+        self.mapsCalls = 0
+
+    def cache_key(self, origin, destination, mode="driving", departure_time=None):
+        """Return (key, traffic dependent)."""
+        live = departure_time is not None or mode in TRAFFIC_DEPENDENT_MODES
+        bucket = departure_bucket(departure_time, self.bucketSeconds, self.clock()) if live else "static"
+        return ["directions", normalize_place(origin), normalize_place(destination), mode, bucket], live
+
+    def directions(self, origin, destination, mode="driving", departure_time=None, **kwargs):
+        key, live = self.cache_key(origin, destination, mode, departure_time)
+        if kwargs:
+            key.append(sorted(kwargs.items()))
+
+        def fetch():
+            self.mapsCalls += 1
+            logger.info("Google Maps directions %s -> %s (%s)", origin, destination, mode)
+            return self.gmaps.directions(origin, destination, mode=mode, departure_time=departure_time, **kwargs)
+
+        return self.cache.get_or_fetch(tuple(str(part) for part in key), fetch,
+                                       ttl=self.liveTtl if live else self.staticTtl)
+
+    def stats(self):
+        return {**self.cache.stats(), "maps_calls": self.mapsCalls}
+
+
+def create_cached_directions(gmaps, storePath=None, **kwargs):
+    """CachedDirections persisted to storePath (default: $MAPS_CACHE_PATH), in memory only if neither is set."""
+    storePath = storePath or os.getenv("MAPS_CACHE_PATH")
+    return CachedDirections(gmaps, store=SqliteStore(storePath) if storePath else None, **kwargs)
+
+
+def travel_time_text(directions):
+    """"Estimated travel time: ..." from a directions result, preferring the live-traffic duration."""
+    leg = directions[0]["legs"][0]
+    return f"Estimated travel time: {leg.get('duration_in_traffic', leg['duration'])['text']}"
+
+
+class _FakeMaps:
+    """Stands in for googlemaps.Client: counts calls, answers after a delay."""
+
+    def __init__(self, delaySeconds=0.05):
+        self.delaySeconds = delaySeconds
+        self.calls = []
+
+    def directions(self, origin, destination, mode="driving", departure_time=None):
+        self.calls.append((origin, destination, mode, departure_time))
+        time.sleep(self.delaySeconds)
+        minutes = 105 if departure_time else 90
+        return [{"legs": [{"duration": {"text": "1 hour 30 mins"},
+                           **({"duration_in_traffic": {"text": f"{minutes} mins"}} if departure_time else {}),
+                           "steps": [{"html_instructions": f"Head to {destination}"}]}]}]
+
+
+def test_repeated_and_concurrent_requests_hit_maps_once_per_bucket():
+    from concurrent.futures import ThreadPoolExecutor
+
+    now = [1_000_000.0]
+    fake = _FakeMaps(delaySeconds=0.1)
+    maps = CachedDirections(fake, clock=lambda: now[0])
+
+    with ThreadPoolExecutor(8) as threads:
+        results = list(threads.map(lambda origin: maps.directions(origin, "Gurgaon", departure_time="now"),
+                                   ["Noida", "noida", " NOIDA "] * 4))
+    assert len(fake.calls) == 1 and travel_time_text(results[0]) == "Estimated travel time: 105 mins"
+
+    assert travel_time_text(maps.directions("Noida", "Gurgaon")) == "Estimated travel time: 1 hour 30 mins"
+    assert len(fake.calls) == 2  # static (no departure time) is a different key
+
+    now[0] += DEFAULT_LIVE_TTL + 1  # live result expired and we're in a new departure bucket
+    maps.directions("Noida", "Gurgaon", departure_time="now")
+    maps.directions("Noida", "Gurgaon")  # static result still fresh
+    assert len(fake.calls) == 3
+    assert maps.stats()["maps_calls"] == 3 and maps.stats()["coalesced"] + maps.stats()["hits"] == 12
+
+
+def test_persistent_store_is_shared_across_instances(tmp_path):
+    fake = _FakeMaps(delaySeconds=0)
+    path = str(tmp_path / "maps_cache.sqlite")
+    CachedDirections(fake, store=SqliteStore(path)).directions("Statue of Liberty", "Central Park", mode="walking")
+    again = CachedDirections(fake, store=SqliteStore(path)).directions("statue of liberty", "central park", mode="walking")
+    assert len(fake.calls) == 1 and again[0]["legs"][0]["steps"][0]["html_instructions"] == "Head to Central Park"
@@ -0,0 +1,334 @@
+"""
+Long-lived, pooled MCP client sessions for LangChain tools.
+
+The MCP agents open a client inside every tool call (asyncio.run + async with client),
+so each call re-launches the npx stdio server or re-opens the HTTP session and redoes
+the MCP handshake: seconds of process startup for one round-trip of work.
+McpSessionPool keeps the sessions open instead:
+
+- one background event loop (daemon thread) owns every session
+- each registered server gets up to `size` persistent sessions, opened on first use and
+  handed out one call at a time, so concurrent tool calls don't queue behind each other
+- a call that fails on a dead connection (closed stream, broken pipe, disconnected
+  client) reconnects that session and retries once; anything else, including a call
+  timeout, is raised unchanged, since the tool may already have run (and MCP tools can
+  have side effects); check_health() (and, with healthCheckInterval, a periodic task) does a cheap
+  list_tools round-trip on idle sessions and reconnects the broken ones
+- call()/call_text() are a blocking facade for sync @tool functions; acall() can be
+  awaited from any event loop
+
+Usage:
+    pool = McpSessionPool()
+    pool.register("google-maps", stdio_server("npx", ["-y", "@modelcontextprotocol/server-google-maps"], env))
+    pool.call_text("google-maps", "maps_geocode", {"address": "Statue of Liberty"})
+"""
+
+import asyncio
+import atexit
+import logging
+import threading
+import time
+
+import anyio
+from fastmcp import Client
+from fastmcp.client.transports import StdioTransport
+from fastmcp.exceptions import ToolError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_CALL_TIMEOUT = 60.0
+DEFAULT_HEALTH_TIMEOUT = 10.0
+
+
+def stdio_server(command, args, env=None):
+    """Client factory for a stdio MCP server (the subprocess starts when a session connects)."""
+    return lambda: Client(StdioTransport(command=command, args=args, env=env))
+
+
+def http_server(url):
+    """Client factory for a streamable-HTTP MCP server, e.g. "http://localhost:8002/mcp"."""
+    return lambda: Client(url)
+
+
+CONNECTION_ERRORS = (ConnectionError, anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+
+
+def is_connection_error(error, client):
+    """True when a failed call means the session is gone (so the call never reached the tool)."""
+    return isinstance(error, CONNECTION_ERRORS) or not client.is_connected()
+
+
+def result_text(result):
+    """Text of a CallToolResult: its text content blocks, else its structured data."""
+    texts = [block.text for block in result.content if getattr(block, "text", None) is not None]
+    if texts:
+        return "\n".join(texts)
+    return "" if result.data is None else str(result.data)
+
+
+class _Server:
+    def __init__(self, name, clientFactory, size):
+        self.name = name
+        self.clientFactory = clientFactory
+        self.size = size
+        self.idle = asyncio.Queue()
+        self.opened = 0
+        self.calls = 0
+        self.connects = 0
+        self.reconnects = 0
+
+
+class McpSessionPool:
+    """Persistent MCP sessions per server, driven by one background event loop."""
+
+    def __init__(self, callTimeout=DEFAULT_CALL_TIMEOUT, healthCheckInterval=None,
+                 healthTimeout=DEFAULT_HEALTH_TIMEOUT):
+        self.callTimeout = callTimeout
+        self.healthCheckInterval = healthCheckInterval
+        self.healthTimeout = healthTimeout
+        self._servers = {}
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def register(self, name, clientFactory, size=DEFAULT_POOL_SIZE):
+        """Register a server; clientFactory() returns a new, unconnected fastmcp Client."""
+        with self._lock:
+            if name in self._servers:
+                raise ValueError(f"MCP server '{name}' is already registered")
+            self._servers[name] = _Server(name, clientFactory, size)
+        return self
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="mcp-session-pool", daemon=True)
+                self._thread.start()
+                if self.healthCheckInterval:
+                    asyncio.run_coroutine_threadsafe(self._health_loop(), self._loop)
+                atexit.register(self.close)
+            return self._loop
+
+    def _submit(self, coroutine):
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coroutine, loop)
+
+    def _server(self, name):
+        try:
+            return self._servers[name]
+        except KeyError:
+            raise ValueError(f"MCP server '{name}' is not registered") from None
+
+    async def _connect(self, server, client):
+        startTime = time.perf_counter()
+        await client.__aenter__()
+        server.connects += 1
+        logger.info("MCP session to %s connected in %.0f ms", server.name, (time.perf_counter() - startTime) * 1000)
+        return client
+
+    async def _disconnect(self, client):
+        try:
+            await client.__aexit__(None, None, None)
+        except Exception as e:
+            logger.debug("Ignoring error while closing MCP session: %s", e)
+
+    async def _reconnect(self, server, client):
+        server.reconnects += 1
+        await self._disconnect(client)
+        return await self._connect(server, client)
+
+    async def _acquire(self, server):
+        if server.idle.empty() and server.opened < server.size:
+            server.opened += 1
+            try:
+                return await self._connect(server, server.clientFactory())
+            except BaseException:
+                server.opened -= 1
+                raise
+        client = await server.idle.get()
+        if not client.is_connected():
+            try:
+                client = await self._reconnect(server, client)
+            except BaseException:
+                server.idle.put_nowait(client)
+                raise
+        return client
+
+    async def _call(self, name, toolName, arguments, timeout):
+        server = self._server(name)
+        client = await self._acquire(server)
+        server.calls += 1
+        try:
+            try:
+                return await client.call_tool(toolName, arguments or {}, timeout=timeout)
+            except Exception as e:
+                if isinstance(e, ToolError) or not is_connection_error(e, client):
+                    raise  # the tool ran (or may still be running); retrying could run it twice
+                logger.warning("MCP call %s.%s failed (%s); reconnecting and retrying once", name, toolName, e)
+                client = await self._reconnect(server, client)
+                return await client.call_tool(toolName, arguments or {}, timeout=timeout)
+        finally:
+            server.idle.put_nowait(client)
+
+    async def acall(self, name, toolName, arguments=None, timeout=None):
+        """Await a tool call from any event loop; returns the fastmcp CallToolResult."""
+        timeout = self.callTimeout if timeout is None else timeout
+        return await asyncio.wrap_future(self._submit(self._call(name, toolName, arguments, timeout)))
+
+    def call(self, name, toolName, arguments=None, timeout=None):
+        """Blocking tool call for sync code (LangChain @tool functions, scripts)."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("McpSessionPool.call() would block the pool's own event loop; use acall()")
+        timeout = self.callTimeout if timeout is None else timeout
+        return self._submit(self._call(name, toolName, arguments, timeout)).result()
+
+    def call_text(self, name, toolName, arguments=None, timeout=None):
+        return result_text(self.call(name, toolName, arguments, timeout))
+
+    async def _check_health(self):
+        healthy = {}
+        for server in list(self._servers.values()):
+            sessions = []
+            while not server.idle.empty():
+                sessions.append(server.idle.get_nowait())
+            healthy[server.name] = 0
+            for client in sessions:
+                try:
+                    await asyncio.wait_for(client.list_tools(), self.healthTimeout)
+                    healthy[server.name] += 1
+                except Exception as e:
+                    logger.warning("MCP session to %s failed its health check (%s); reconnecting", server.name, e)
+                    try:
+                        client = await self._reconnect(server, client)
+                        healthy[server.name] += 1
+                    except Exception as e:
+                        logger.warning("Reconnect to %s failed: %s", server.name, e)
+                server.idle.put_nowait(client)
+        return healthy
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.healthCheckInterval)
+            await self._check_health()
+
+    def check_health(self):
+        """Probe idle sessions, reconnect broken ones; returns {server: healthy idle sessions}."""
+        return self._submit(self._check_health()).result()
+
+    def stats(self):
+        return {name: {"sessions": server.opened, "calls": server.calls, "connects": server.connects,
+                       "reconnects": server.reconnects} for name, server in self._servers.items()}
+
+    async def _close_all(self):
+        for server in self._servers.values():
+            while not server.idle.empty():
+                await self._disconnect(server.idle.get_nowait())
+            server.opened = 0
+
+    def close(self):
+        """Close every session (stopping stdio subprocesses) and the background loop."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_all(), loop).result(timeout=self.healthTimeout)
+        except Exception as e:
+            logger.debug("Ignoring error while closing MCP sessions: %s", e)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=self.healthTimeout)
+        atexit.unregister(self.close)
+
+
+def _weather_server():
+    from fastmcp import FastMCP
+
+    mcp = FastMCP("test-weather")
+    runs = mcp.runs = []
+
+    @mcp.tool
+    async def get_weather(city: str) -> str:
+        """Weather for a city."""
+        await asyncio.sleep(0.2)
+        return f"{city.title()} weather: clear sky, 21°C"
+
+    @mcp.tool
+    async def slow_report(city: str) -> str:
+        """Takes a second; counts its runs."""
+        runs.append(city)
+        await asyncio.sleep(1)
+        return f"{city} report"
+
+    @mcp.tool
+    def broken(city: str) -> str:
+        """Always fails."""
+        raise ValueError(f"no data for {city}")
+
+    return mcp
+
+
+def test_sessions_are_reused_and_concurrent_calls_use_the_pool():
+    """Eight calls open two sessions once; four parallel 0.2 s calls over two sessions take ~0.4 s."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    server = _weather_server()
+    pool = McpSessionPool().register("weather", lambda: Client(server), size=2)
+    try:
+        for _ in range(4):
+            assert pool.call_text("weather", "get_weather", {"city": "paris"}) == "Paris weather: clear sky, 21°C"
+        startTime = time.perf_counter()
+        with ThreadPoolExecutor(4) as threads:
+            texts = list(threads.map(lambda city: pool.call_text("weather", "get_weather", {"city": city}),
+                                     ["paris", "delhi", "oslo", "lima"]))
+        assert time.perf_counter() - startTime < 0.7
+        assert texts[1] == "Delhi weather: clear sky, 21°C"
+        assert pool.stats()["weather"] == {"sessions": 2, "calls": 8, "connects": 2, "reconnects": 0}
+
+        async def from_another_loop():
+            return await asyncio.gather(*(pool.acall("weather", "get_weather", {"city": "rome"}) for _ in range(2)))
+
+        assert [result_text(result) for result in asyncio.run(from_another_loop())] == ["Rome weather: clear sky, 21°C"] * 2
+    finally:
+        pool.close()
+
+
+def test_dead_sessions_reconnect_and_tool_errors_do_not():
+    server = _weather_server()
+    pool = McpSessionPool().register("weather", lambda: Client(server), size=1)
+    try:
+        pool.call("weather", "get_weather", {"city": "paris"})
+        session = pool._servers["weather"].idle._queue[0]
+        pool._submit(session.__aexit__(None, None, None)).result()  # the server went away
+
+        assert pool.check_health() == {"weather": 1}
+        assert pool.call_text("weather", "get_weather", {"city": "paris"}).startswith("Paris")
+        try:
+            pool.call("weather", "broken", {"city": "paris"})
+            raise AssertionError("ToolError expected")
+        except ToolError as e:
+            assert "no data for paris" in str(e)
+        assert pool.stats()["weather"]["reconnects"] == 1 and pool.stats()["weather"]["connects"] == 2
+    finally:
+        pool.close()
+
+
+def test_timeouts_are_raised_without_a_retry():
+    server = _weather_server()
+    pool = McpSessionPool().register("weather", lambda: Client(server), size=1)
+    try:
+        try:
+            pool.call("weather", "slow_report", {"city": "paris"}, timeout=0.3)
+            raise AssertionError("timeout expected")
+        except AssertionError:
+            raise
+        except Exception as e:  # mcp's MCPError (McpError in older releases)
+            assert "timed out" in str(e)
+        time.sleep(1)
+        assert server.runs == ["paris"]
+        assert pool.stats()["weather"]["reconnects"] == 0
+        assert pool.call_text("weather", "get_weather", {"city": "oslo"}).startswith("Oslo")
+    finally:
+        pool.close()
@@ -0,0 +1,358 @@
+"""
+Background outbox for agent notifications (Slack posts, SMS).
+
+Sending a notification inside the agent turn adds its HTTP round-trip, and any
+retries, to the user-facing latency. With Outbox, the tool call only enqueues the
+message and returns. A background event loop (daemon thread) delivers the messages:
+
+- messages that arrive within coalesceSeconds of each other are combined into one
+  message (up to maxBatch messages or maxChars characters)
+- failed sends are retried with exponential backoff; a sender can raise RetryLater
+  to honour a server's Retry-After
+- the queue is bounded (maxQueue); post() returns False instead of blocking when full
+- with dedupeSeconds, a message equal (case/whitespace-insensitively) to one posted
+  within the last dedupeSeconds is dropped
+- with storePath, queued messages are kept in SQLite until delivered, and anything
+  left over from a previous run (including batches that ran out of retries) is sent
+  when the outbox starts
+
+send is an async callable taking the combined text; sync senders (e.g. the Twilio
+client) can be wrapped with asyncio.to_thread. flush() waits until everything queued
+so far has been delivered (or given up on); scripts call it, or close(), before exiting.
+"""
+
+import asyncio
+import atexit
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COALESCE_SECONDS = 2.0
+DEFAULT_MAX_BATCH = 50
+DEFAULT_MAX_CHARS = 35000  # Slack truncates messages past 40k characters
+DEFAULT_MAX_QUEUE = 1000
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_SECONDS = 1.0
+
+
+class RetryLater(Exception):
+    """Raised by a sender to retry after retryAfter seconds (e.g. HTTP 429 Retry-After)."""
+
+    def __init__(self, retryAfter, message=""):
+        super().__init__(message or f"retry after {retryAfter}s")
+        self.retryAfter = retryAfter
+
+
+def join_messages(messages):
+    return "\n\n".join(messages)
+
+
+def dedupe_key(message):
+    return re.sub(r"\s+", " ", message.strip().lower())
+
+
+class Outbox:
+    """Bounded, coalescing, retrying background queue in front of an async sender."""
+
+    def __init__(self, send, coalesceSeconds=DEFAULT_COALESCE_SECONDS, maxBatch=DEFAULT_MAX_BATCH,
+                 maxChars=DEFAULT_MAX_CHARS, maxQueue=DEFAULT_MAX_QUEUE, maxRetries=DEFAULT_MAX_RETRIES,
+                 backoffSeconds=DEFAULT_BACKOFF_SECONDS, combine=join_messages, dedupeSeconds=None,
+                 storePath=None, name="outbox"):
+        self.send = send
+        self.coalesceSeconds = coalesceSeconds
+        self.maxBatch = maxBatch
+        self.maxChars = maxChars
+        self.maxQueue = maxQueue
+        self.maxRetries = maxRetries
+        self.backoffSeconds = backoffSeconds
+        self.combine = combine
+        self.dedupeSeconds = dedupeSeconds
+        self.storePath = storePath
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._queue = None
+        self._carry = None
+        self._store = None
+        self._recent = {}
+        self._lock = threading.Lock()
+        self.stats = {"queued": 0, "dropped": 0, "deduplicated": 0, "sent_messages": 0, "sends": 0, "retries": 0,
+                      "failed": 0}
+        if storePath:
+            self._ensure_started()  # deliver what a previous run left behind
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+                asyncio.run_coroutine_threadsafe(self._start_worker(), self._loop).result()
+                atexit.register(self.close)
+            return self._loop
+
+    async def _start_worker(self):
+        # Unbounded so a persisted backlog always fits; _enqueue enforces maxQueue for new messages.
+        self._queue = asyncio.Queue()
+        if self.storePath:
+            self._store = sqlite3.connect(self.storePath, check_same_thread=False)
+            with self._store:
+                self._store.execute("CREATE TABLE IF NOT EXISTS outbox "
+                                    "(id INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT NOT NULL, queued_at REAL)")
+            pending = self._store.execute("SELECT id, message FROM outbox ORDER BY id").fetchall()
+            if pending:
+                logger.info("%s: resending %d message(s) from a previous run", self.name, len(pending))
+            for item in pending:
+                self._queue.put_nowait(item)
+        self._worker = asyncio.create_task(self._run())
+
+    def _is_duplicate(self, message, now):
+        if not self.dedupeSeconds:
+            return False
+        seenAt = self._recent.get(dedupe_key(message))
+        return seenAt is not None and now - seenAt < self.dedupeSeconds
+
+    def _remember(self, message, now):
+        if not self.dedupeSeconds:
+            return
+        if len(self._recent) > 1000:
+            self._recent = {key: at for key, at in self._recent.items() if now - at < self.dedupeSeconds}
+        self._recent[dedupe_key(message)] = now
+
+    async def _enqueue(self, message):
+        now = time.monotonic()
+        if self._is_duplicate(message, now):
+            self.stats["deduplicated"] += 1
+            return True
+        if self._queue.qsize() >= self.maxQueue:
+            self.stats["dropped"] += 1
+            logger.warning("%s full (%d messages); dropping a message", self.name, self.maxQueue)
+            return False
+        rowId = None
+        if self._store is not None:
+            with self._store:
+                rowId = self._store.execute("INSERT INTO outbox (message, queued_at) VALUES (?, ?)",
+                                            (message, time.time())).lastrowid
+        self._queue.put_nowait((rowId, message))
+        # Only now: a message dropped above must not suppress a later retry of it.
+        self._remember(message, now)
+        self.stats["queued"] += 1
+        return True
+
+    def post(self, message):
+        """Queue a message from any thread; returns at once (False if the queue is full)."""
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._enqueue(message), loop).result()
+
+    async def apost(self, message):
+        """post() for coroutines running on another event loop."""
+        loop = self._ensure_started()
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._enqueue(message), loop))
+
+    async def _next_batch(self):
+        if self._carry is not None:
+            batch, self._carry = [self._carry], None
+        else:
+            batch = [await self._queue.get()]
+        size = len(batch[0][1])
+        deadline = self._loop.time() + self.coalesceSeconds
+        while len(batch) < self.maxBatch:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if size + len(item[1]) > self.maxChars:
+                self._carry = item  # starts the next batch
+                break
+            batch.append(item)
+            size += len(item[1])
+        return batch
+
+    async def _deliver(self, text):
+        for attempt in range(self.maxRetries + 1):
+            try:
+                self.stats["sends"] += 1
+                await self.send(text)
+                return True
+            except Exception as e:
+                if attempt == self.maxRetries:
+                    logger.error("%s gave up after %d attempts: %s", self.name, attempt + 1, e)
+                    return False
+                delay = e.retryAfter if isinstance(e, RetryLater) else self.backoffSeconds * 2 ** attempt
+                self.stats["retries"] += 1
+                logger.warning("%s send failed (%s); retrying in %.1fs", self.name, e, delay)
+                await asyncio.sleep(delay)
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                delivered = await self._deliver(self.combine([message for _, message in batch]))
+                self.stats["sent_messages" if delivered else "failed"] += len(batch)
+                # Undelivered rows stay in the store and are resent on the next start.
+                if delivered and self._store is not None:
+                    with self._store:
+                        self._store.executemany("DELETE FROM outbox WHERE id = ?",
+                                                [(rowId,) for rowId, _ in batch if rowId is not None])
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _drain(self):
+        await self._queue.join()
+
+    async def _stop_worker(self):
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+
+    def flush(self, timeout=None):
+        """Block until every message queued so far has been delivered or given up on."""
+        if self._loop is None:
+            return True
+        try:
+            asyncio.run_coroutine_threadsafe(self._drain(), self._loop).result(timeout)
+            return True
+        except TimeoutError:
+            return False
+
+    def close(self, timeout=30):
+        """Flush, then stop the background loop."""
+        if self._loop is None:
+            return
+        self.flush(timeout)
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        asyncio.run_coroutine_threadsafe(self._stop_worker(), loop).result(timeout)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        loop.close()
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        atexit.unregister(self.close)
+
+
+class _RecordingSender:
+    def __init__(self, delaySeconds=0.0, failures=0):
+        self.delaySeconds = delaySeconds
+        self.failures = failures
+        self.messages = []
+
+    async def __call__(self, text):
+        await asyncio.sleep(self.delaySeconds)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("webhook unavailable")
+        self.messages.append(text)
+
+
+def test_posts_return_immediately_and_coalesce_into_one_message():
+    sender = _RecordingSender(delaySeconds=0.2)
+    outbox = Outbox(sender, coalesceSeconds=0.1)
+    try:
+        startTime = time.perf_counter()
+        assert all(outbox.post(f"update {n}") for n in range(5))
+        assert time.perf_counter() - startTime < 0.05
+        assert outbox.flush(timeout=5)
+        assert sender.messages == ["update 0\n\nupdate 1\n\nupdate 2\n\nupdate 3\n\nupdate 4"]
+        assert outbox.stats["sent_messages"] == 5 and outbox.stats["sends"] == 1
+    finally:
+        outbox.close()
+
+
+def test_failed_sends_are_retried_and_large_batches_split():
+    sender = _RecordingSender(failures=2)
+    outbox = Outbox(sender, coalesceSeconds=0.05, maxChars=25, backoffSeconds=0.01)
+    try:
+        for n in range(3):
+            outbox.post(f"message number {n}")  # 16 characters each: two don't fit in 25
+        assert outbox.flush(timeout=5)
+        assert sender.messages == ["message number 0", "message number 1", "message number 2"]
+        assert outbox.stats["retries"] == 2 and outbox.stats["failed"] == 0
+    finally:
+        outbox.close()
+
+
+def test_full_queue_drops_instead_of_blocking():
+    sender = _RecordingSender(delaySeconds=0.2)
+    outbox = Outbox(sender, coalesceSeconds=0, maxBatch=1, maxQueue=2)
+    try:
+        results = [outbox.post(str(n)) for n in range(5)]
+        assert results.count(False) >= 1 and outbox.stats["dropped"] == results.count(False)
+    finally:
+        outbox.close()
+
+
+def test_duplicates_within_the_window_are_suppressed():
+    sender = _RecordingSender()
+    outbox = Outbox(sender, coalesceSeconds=0.05, dedupeSeconds=60)
+    try:
+        for message in ("What is your notice period?", "what is your  notice period? ", "Do you know Rust?"):
+            assert outbox.post(message)
+        assert outbox.flush(timeout=5)
+        assert sender.messages == ["What is your notice period?\n\nDo you know Rust?"]
+        assert outbox.stats["deduplicated"] == 1
+    finally:
+        outbox.close()
+
+
+def test_dropped_message_is_not_suppressed_as_a_duplicate():
+    sender = _RecordingSender(delaySeconds=0.2)
+    outbox = Outbox(sender, coalesceSeconds=0, maxBatch=1, maxQueue=1, dedupeSeconds=60)
+    try:
+        outbox.post("first")
+        time.sleep(0.05)  # the worker has taken it and is sending
+        outbox.post("second")  # fills the queue
+        assert outbox.post("third") is False
+        assert outbox.flush(timeout=5)
+        assert outbox.post("third") is True and outbox.flush(timeout=5)
+        assert sender.messages == ["first", "second", "third"] and outbox.stats["deduplicated"] == 0
+    finally:
+        outbox.close()
+
+
+def test_undelivered_messages_stay_in_the_store(tmp_path):
+    storePath = str(tmp_path / "outbox.sqlite")
+    outbox = Outbox(_RecordingSender(failures=10**6), coalesceSeconds=0, maxRetries=1, backoffSeconds=0.01,
+                    storePath=storePath)
+    outbox.post("during an outage")
+    outbox.close()
+    assert outbox.stats["failed"] == 1
+
+    sender = _RecordingSender()
+    restarted = Outbox(sender, coalesceSeconds=0, storePath=storePath)
+    try:
+        assert restarted.flush(timeout=5) and sender.messages == ["during an outage"]
+    finally:
+        restarted.close()
+
+
+def test_pending_messages_survive_a_restart(tmp_path):
+    storePath = str(tmp_path / "outbox.sqlite")
+    sender = _RecordingSender()
+    outbox = Outbox(sender, coalesceSeconds=0, storePath=storePath)
+    outbox.post("delivered")
+    outbox.close()
+    # A row left behind by a run that was killed before it could deliver.
+    with sqlite3.connect(storePath) as connection:
+        connection.execute("INSERT INTO outbox (message, queued_at) VALUES ('left over', 0)")
+
+    restarted = Outbox(sender, coalesceSeconds=0, storePath=storePath)
+    try:
+        assert restarted.flush(timeout=5)
+        assert sender.messages == ["delivered", "left over"]
+    finally:
+        restarted.close()
+    with sqlite3.connect(storePath) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM outbox").fetchone()[0] == 0
@@ -0,0 +1,287 @@
+"""
+AgentExecutor that runs the tool calls of one model turn concurrently.
+
+When a tool-calling model asks for several tools at once (get_coordinates and
+get_directions, or weather_tool, directions_tool and get_travel_time), AgentExecutor
+runs them one after another, so a step costs the sum of the tool latencies.
+ParallelAgentExecutor is a drop-in replacement that costs max() instead:
+
+- sync tools run in a bounded thread pool (maxToolWorkers threads)
+- async tools (with a coroutine) run on the event loop when the agent is awaited
+- observations come back in the order the model asked for them
+- each call has a timeout (toolTimeouts[name], else toolTimeout seconds); a call that
+  times out returns an explanatory observation to the model instead of failing the run
+
+A timed-out sync tool cannot be stopped: Python threads cannot be killed, so the call
+keeps its worker thread until the tool returns. Once half of the pool is held by such
+calls, the next step gets a fresh pool (the old one finishes its stragglers and exits),
+so slow tools cannot stall later turns. close() shuts the pool down; it also runs when
+the executor is garbage-collected.
+
+Usage:
+    executor = ParallelAgentExecutor(agent=agent, tools=tools, toolTimeout=30)
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentStep
+from langchain_core.tools import BaseTool, StructuredTool, Tool
+from pydantic import PrivateAttr
+
+DEFAULT_MAX_TOOL_WORKERS = 8
+DEFAULT_TOOL_TIMEOUT = 60.0
+
+
+class _DeferredStep:
+    """A tool call AgentExecutor._iter_next_step asked for, not started yet."""
+
+    def __init__(self, action, run):
+        self.action = action
+        self.run = run
+
+
+def is_async_tool(tool):
+    """True when the tool has a native coroutine (Tool/StructuredTool) or overrides _arun."""
+    if isinstance(tool, (Tool, StructuredTool)):
+        return tool.coroutine is not None
+    return type(tool)._arun is not BaseTool._arun
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """AgentExecutor whose steps cost max(tool latencies) rather than their sum."""
+
+    maxToolWorkers: int = DEFAULT_MAX_TOOL_WORKERS
+    toolTimeout: Optional[float] = DEFAULT_TOOL_TIMEOUT
+    toolTimeouts: dict = {}
+
+    _pool: Optional[ThreadPoolExecutor] = PrivateAttr(default=None)
+    # Timed-out calls still holding a thread of the current pool.
+    _abandoned: list = PrivateAttr(default_factory=list)
+    _poolLock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def _tool_pool(self):
+        with self._poolLock:
+            if self._pool is not None and len(self._abandoned) >= max(1, self.maxToolWorkers // 2):
+                # Most workers are stuck in timed-out calls: leave them to finish in the old pool.
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.maxToolWorkers, thread_name_prefix="agent-tool")
+                self._abandoned = []
+            return self._pool
+
+    def _abandon(self, future):
+        """Count a timed-out call against the pool until its thread is free again."""
+        if future.cancel() or future.done():
+            return
+        with self._poolLock:
+            abandoned = self._abandoned
+            abandoned.append(future)
+
+        def release(done):
+            with self._poolLock:
+                if done in abandoned:
+                    abandoned.remove(done)
+
+        future.add_done_callback(release)
+
+    def close(self):
+        """Shut the tool pool down; calls still running finish in the background."""
+        with self._poolLock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self._abandoned = []
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _timeout_for(self, action):
+        return self.toolTimeouts.get(action.tool, self.toolTimeout)
+
+    def _timed_out_step(self, action):
+        return AgentStep(action=action, observation=(
+            f"Tool '{action.tool}' did not answer within {self._timeout_for(action):g} seconds. "
+            "Answer without it or try again later."))
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        # The base _iter_next_step calls this once per action of the turn, in order; defer the
+        # actual call so _iter_next_step below can start all of them before waiting on any.
+        perform = super()._perform_agent_action
+        return _DeferredStep(agent_action, lambda: perform(name_to_tool_map, color_mapping, agent_action, run_manager))
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        deferred = []
+        for item in super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager):
+            if isinstance(item, _DeferredStep):
+                deferred.append(item)
+            else:
+                yield item
+        if not deferred:
+            return
+        if len(deferred) == 1:
+            yield deferred[0].run()
+            return
+
+        pool = self._tool_pool()
+        started = []
+        for step in deferred:
+            # Copy the context so callbacks and tracing stay attached to this run.
+            started.append((step, time.monotonic(), pool.submit(contextvars.copy_context().run, step.run)))
+        for step, startTime, future in started:
+            timeout = self._timeout_for(step.action)
+            try:
+                remaining = None if timeout is None else max(0.0, startTime + timeout - time.monotonic())
+                yield future.result(timeout=remaining)
+            except FutureTimeoutError:
+                self._abandon(future)
+                yield self._timed_out_step(step.action)
+
+    async def _aperform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        # The base _aiter_next_step already gathers these concurrently and keeps their order.
+        timeout = self._timeout_for(agent_action)
+        tool = name_to_tool_map.get(agent_action.tool)
+        future = None
+        if tool is not None and not is_async_tool(tool):
+            # Sync tool: run it in our bounded pool rather than the loop's default executor.
+            syncRunManager = run_manager.get_sync() if run_manager else None
+            call = contextvars.copy_context().run
+            future = self._tool_pool().submit(call, AgentExecutor._perform_agent_action, self,
+                                              name_to_tool_map, color_mapping, agent_action, syncRunManager)
+            work = asyncio.wrap_future(future)
+        else:
+            work = super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        try:
+            return await asyncio.wait_for(work, timeout)
+        except asyncio.TimeoutError:
+            if future is not None:
+                self._abandon(future)
+            return self._timed_out_step(agent_action)
+
+
+def _scripted_agent(calls):
+    """Agent runnable that asks for all `calls` in its first turn, then finishes with the observations."""
+    from langchain_core.agents import AgentFinish
+    from langchain_core.runnables import RunnableLambda
+
+    def plan(inputs):
+        steps = inputs["intermediate_steps"]
+        if not steps:
+            return [AgentAction(tool=name, tool_input=toolInput, log="") for name, toolInput in calls]
+        return AgentFinish({"output": " | ".join(str(observation) for _, observation in steps)}, log="")
+
+    return RunnableLambda(plan)
+
+
+def test_tool_calls_of_one_turn_run_concurrently_in_order():
+    """Three 0.3 s sync tools take ~0.3 s, not 0.9 s, and observations keep the model's order."""
+    from langchain_core.tools import tool
+
+    @tool
+    def weather_tool(origin_city: str) -> str:
+        """Weather."""
+        time.sleep(0.3)
+        return f"weather {origin_city}"
+
+    @tool
+    def get_travel_time(origin: str, destination: str) -> str:
+        """Travel time."""
+        time.sleep(0.3)
+        return f"time {origin}->{destination}"
+
+    @tool
+    def directions_tool(origin: str, destination: str) -> str:
+        """Directions."""
+        time.sleep(0.3)
+        return f"directions {origin}->{destination}"
+
+    calls = [("directions_tool", {"origin": "A", "destination": "B"}), ("weather_tool", {"origin_city": "A"}),
+             ("get_travel_time", {"origin": "A", "destination": "B"})]
+    tools = [weather_tool, get_travel_time, directions_tool]
+    executor = ParallelAgentExecutor(agent=_scripted_agent(calls), tools=tools)
+    startTime = time.perf_counter()
+    result = executor.invoke({"input": "plan my trip"})
+    assert time.perf_counter() - startTime < 0.6
+    assert result["output"] == "directions A->B | weather A | time A->B"
+
+
+def test_async_tools_share_the_loop_and_timeouts_are_reported():
+    """Async tools run on the loop next to pooled sync tools; a slow tool times out alone."""
+    from langchain_core.tools import tool
+
+    def coordinates(place: str) -> str:
+        time.sleep(0.3)
+        return f"coords {place}"
+
+    async def acoordinates(place: str) -> str:
+        await asyncio.sleep(0.3)
+        return f"coords {place}"
+
+    get_coordinates = StructuredTool.from_function(coordinates, coroutine=acoordinates, name="get_coordinates",
+                                                   description="Coordinates.")
+
+    @tool
+    def get_directions(origin: str, destination: str) -> str:
+        """Directions."""
+        time.sleep(0.3)
+        return f"directions {origin}->{destination}"
+
+    @tool
+    def slow_tool(query: str) -> str:
+        """Never answers in time."""
+        time.sleep(2)
+        return "too late"
+
+    calls = [("get_coordinates", {"place": "Statue of Liberty"}), ("slow_tool", {"query": "x"}),
+             ("get_directions", {"origin": "Statue of Liberty", "destination": "Central Park"})]
+    executor = ParallelAgentExecutor(agent=_scripted_agent(calls), tools=[get_coordinates, get_directions, slow_tool],
+                                     toolTimeouts={"slow_tool": 0.5})
+    for run in (executor.invoke, lambda inputs: asyncio.run(executor.ainvoke(inputs))):
+        startTime = time.perf_counter()
+        output = run({"input": "where"})["output"].split(" | ")
+        assert time.perf_counter() - startTime < 0.9
+        assert output[0] == "coords Statue of Liberty"
+        assert output[1].startswith("Tool 'slow_tool' did not answer within 0.5 seconds")
+        assert output[2] == "directions Statue of Liberty->Central Park"
+
+
+def test_timed_out_calls_do_not_stall_later_turns():
+    """Stuck sync tools get a fresh pool for the next turn; close() shuts it down."""
+    from langchain_core.tools import tool
+
+    @tool
+    def stuck_tool(query: str) -> str:
+        """Hangs for a long time."""
+        time.sleep(1.5)
+        return "too late"
+
+    @tool
+    def quick_tool(query: str) -> str:
+        """Answers at once."""
+        time.sleep(0.05)
+        return f"quick {query}"
+
+    from langchain_core.runnables import RunnableLambda
+
+    agents = {name: _scripted_agent([(name, {"query": "a"}), (name, {"query": "b"})]) for name in ("stuck_tool", "quick_tool")}
+    executor = ParallelAgentExecutor(agent=RunnableLambda(lambda inputs: agents[inputs["input"]].invoke(inputs)),
+                                     tools=[stuck_tool, quick_tool], maxToolWorkers=2, toolTimeouts={"stuck_tool": 0.1})
+    assert executor.invoke({"input": "stuck_tool"})["output"].count("did not answer") == 2
+    firstPool = executor._pool
+
+    for run in (executor.invoke, lambda inputs: asyncio.run(executor.ainvoke(inputs))):
+        startTime = time.perf_counter()
+        assert run({"input": "quick_tool"})["output"] == "quick a | quick b"
+        assert time.perf_counter() - startTime < 0.5
+    assert executor._pool is not firstPool
+    executor.close()
+    assert executor._pool is None
@@ -0,0 +1,238 @@
+"""
+TTL cache with in-flight request coalescing for tool calls to external APIs.
+
+Agents ask for the same thing many times in a burst: a load of "weather in Paris"
+questions, or the same origin/destination pair again later in a conversation. Without
+a cache every one of them is an upstream request, and a burst that arrives before the
+first answer is back is N requests even with a cache. RequestCache.aget_or_fetch:
+
+- returns a fresh cached value (per-call ttl, else defaultTtl seconds)
+- otherwise, if the same key is already being fetched, awaits that fetch (single flight)
+- otherwise runs fetch() once and caches the result; failures are not cached and are
+  raised to every coalesced caller
+
+get_or_fetch does the same for sync callers (threads, e.g. the agent's tool pool).
+Eviction is LRU beyond maxEntries. With a store (SqliteStore), entries also survive
+restarts and are shared between processes; values must then be JSON-serializable.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+DEFAULT_TTL_SECONDS = 600
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class RequestCache:
+    """LRU + TTL cache whose misses are fetched once per key, however many callers wait."""
+
+    def __init__(self, defaultTtl=DEFAULT_TTL_SECONDS, maxEntries=DEFAULT_MAX_ENTRIES, store=None, clock=time.time):
+        self.defaultTtl = defaultTtl
+        self.maxEntries = maxEntries
+        self.store = store
+        self.clock = clock
+        # key -> (value, expires at)
+        self._entries = OrderedDict()
+        self._inFlight = {}
+        self._syncInFlight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        """Fresh cached value (from memory, else from the store) or None."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry[1]:
+                self._entries.move_to_end(key)
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+        if self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None and now < entry[1]:
+                self._remember(key, *entry)
+                return entry[0]
+        return None
+
+    def _remember(self, key, value, expiresAt):
+        with self._lock:
+            self._entries[key] = (value, expiresAt)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+
+    def put(self, key, value, ttl=None):
+        expiresAt = self.clock() + (self.defaultTtl if ttl is None else ttl)
+        self._remember(key, value, expiresAt)
+        if self.store is not None:
+            self.store.put(key, value, expiresAt)
+
+    def get_or_fetch(self, key, fetch, ttl=None):
+        """Sync aget_or_fetch: cached value, else fetch() run once for all concurrent callers of key."""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        with self._lock:
+            pending = self._syncInFlight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._syncInFlight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return pending.result()
+
+        try:
+            value = fetch()
+            self.put(key, value, ttl)
+            pending.set_result(value)
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._syncInFlight.pop(key, None)
+        return value
+
+    async def aget_or_fetch(self, key, fetch, ttl=None):
+        """Cached value for key, else the result of `await fetch()` (shared by concurrent callers)."""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        pending = self._inFlight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        pending = asyncio.ensure_future(fetch())
+        self._inFlight[key] = pending
+        try:
+            value = await asyncio.shield(pending)
+        finally:
+            self._inFlight.pop(key, None)
+        self.put(key, value, ttl)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+class SqliteStore:
+    """Persistent key -> (JSON value, expires at epoch seconds) table for RequestCache."""
+
+    def __init__(self, path, table="request_cache"):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            connection.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                               "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def _key(key):
+        return key if isinstance(key, str) else json.dumps(key)
+
+    def get(self, key):
+        with self._lock, self._connect() as connection:
+            row = connection.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?",
+                                     (self._key(key),)).fetchone()
+        return None if row is None else (json.loads(row[0]), row[1])
+
+    def put(self, key, value, expiresAt):
+        with self._lock, self._connect() as connection:
+            connection.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                               (self._key(key), json.dumps(value), expiresAt))
+            connection.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self):
+        with self._lock, self._connect() as connection:
+            connection.execute(f"DELETE FROM {self.table}")
+
+
+def test_burst_for_one_key_is_fetched_once_and_then_served_from_cache():
+    now = [0.0]
+    cache = RequestCache(defaultTtl=60, clock=lambda: now[0])
+    upstreamCalls = []
+
+    async def fetch():
+        upstreamCalls.append(1)
+        await asyncio.sleep(0.05)
+        return "Paris weather: clear sky, 21°C"
+
+    async def burst():
+        return await asyncio.gather(*(cache.aget_or_fetch("paris", fetch) for _ in range(50)))
+
+    assert set(asyncio.run(burst())) == {"Paris weather: clear sky, 21°C"}
+    assert len(upstreamCalls) == 1 and cache.stats()["coalesced"] == 49
+    asyncio.run(cache.aget_or_fetch("paris", fetch))
+    assert len(upstreamCalls) == 1 and cache.hits == 1
+    now[0] = 61.0
+    asyncio.run(cache.aget_or_fetch("paris", fetch))
+    assert len(upstreamCalls) == 2
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    cache = RequestCache()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise ConnectionError("upstream down")
+        return "ok"
+
+    async def burst():
+        return await asyncio.gather(*(cache.aget_or_fetch("k", flaky) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, ConnectionError) for result in asyncio.run(burst()))
+    assert asyncio.run(cache.aget_or_fetch("k", flaky)) == "ok" and len(attempts) == 2
+
+
+def test_sync_callers_share_one_fetch_and_store_survives_restart(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    store = SqliteStore(str(tmp_path / "cache.sqlite"))
+    cache = RequestCache(store=store)
+    upstreamCalls = []
+
+    def fetch():
+        upstreamCalls.append(1)
+        time.sleep(0.1)
+        return {"legs": [{"duration": {"text": "1 hour 45 mins"}}]}
+
+    with ThreadPoolExecutor(8) as threads:
+        results = list(threads.map(lambda _: cache.get_or_fetch(("noida", "gurgaon", "driving"), fetch), range(8)))
+    assert len(upstreamCalls) == 1 and all(result == results[0] for result in results)
+
+    restarted = RequestCache(store=SqliteStore(str(tmp_path / "cache.sqlite")))
+    assert restarted.get_or_fetch(("noida", "gurgaon", "driving"), fetch) == results[0]
+    assert len(upstreamCalls) == 1 and restarted.hits == 1
@@ -16,6 +16,15 @@ from langchain_openai import OpenAIEmbeddings
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+import sys
+
+# Shared RAG helpers (index cache etc.) live next to the LangGraph RAG script
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "langgraph"))
+from index_store import load_or_build_vectorstore
+from embedding_cache import CachedEmbeddings
+from streaming_ingest import stream_into_faiss, stream_pdf_chunks
+from answer_cache import AnswerCache, index_version, with_answer_cache
+from token_streaming import format_timings, stream_turn
 
 # Load environment variables from .env file
 load_dotenv()
@@ -24,19 +33,18 @@ load_dotenv()
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
 pdf_path = "my_resume.pdf"
-loader = PyPDFLoader(pdf_path)
-docs = loader.load()
-
-# Split resume into smaller chunks
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-split_docs = text_splitter.split_documents(docs)
 
-# Create vector store from split documents
-embeddings = OpenAIEmbeddings()
-vectorstore = FAISS.from_documents(split_docs, embeddings)
+# Load the vector store from the on-disk cache, or build and save it on the first run.
+# Embeddings go through the shared embedding cache, so chunks seen by any script are never re-embedded.
+embeddings = CachedEmbeddings(OpenAIEmbeddings())
+# On a cache miss the resume is streamed page by page into chunks, and the chunks are embedded
+# window by window (concurrent, rate-limit-aware batches) so memory stays bounded.
+vectorstore = load_or_build_vectorstore(pdf_path, embeddings, loadDocs=stream_pdf_chunks,
+                                        buildVectorstore=stream_into_faiss)
 retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
 
-llm = OpenAI(api_key=openai_api_key)
+# streaming=True so the chat loop can print the answer while it is being generated
+llm = OpenAI(api_key=openai_api_key, streaming=True)
 # Create RAG chatbot chain
 qa_chain = RetrievalQA.from_chain_type(
     llm=llm,
@@ -60,11 +68,17 @@ qa_chain = RetrievalQA.from_chain_type(
     chain_type_kwargs={"prompt": PromptTemplate.from_template(prompt_template)}
 )
 
+# Serve repeated (or reworded) questions from the answer cache; it resets when the resume is re-indexed.
+answer_cache = AnswerCache(embeddings)
+qa_chain = with_answer_cache(qa_chain, answer_cache, index_version(vectorstore), inputKey="query", outputKey="result")
+
 # RAG chatbot loop
 print("Resume RAG Chatbot. Type your interview question (or 'exit' to quit):")
 while True:
     question = input("You: ")
     if question.lower() == "exit":
+        print("Answer cache:", answer_cache.stats())
         break
-    answer = qa_chain.invoke({"query": question})
-    print("Bot:", answer)
\ No newline at end of file
+    # Prints "Bot: ..." token by token as the answer is generated
+    answer, timings = stream_turn(qa_chain, {"query": question}, answerKey="result")
+    print(f"[latency] {format_timings(timings)}")
\ No newline at end of file
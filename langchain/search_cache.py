@@ -0,0 +1,237 @@
+"""
+Caching and concurrent multi-query for the SerpAPI Google Search tool.
+
+The Google Search agent calls SerpAPIWrapper.run for every tool call, and agents
+re-issue the same or nearly the same query within a session ("petrol price today in
+Mumbai", "Petrol price today in Mumbai?"). Each one is a SerpAPI round-trip and a
+billed search. CachedSearch.run() has the same argument and result as
+SerpAPIWrapper.run(), plus:
+
+- a key of the normalized query (case, whitespace and trailing punctuation ignored)
+  and the wrapper's locale (gl, hl, location), so results for India are not served
+  for the US
+- a freshness TTL per query class: "live" queries (today, latest, price, news, ...)
+  expire after minutes, "recent" ones (this week, yesterday, a year) after hours,
+  everything else after a week
+- single-flight: concurrent identical searches make one SerpAPI call
+- an optional persistent store (request_cache.SqliteStore) shared across restarts
+
+run_many() / arun_many() search several queries concurrently (identical ones once)
+and merge the results into one text, so the agent gets them in a single tool step.
+
+Usage:
+    search = create_cached_search(SerpAPIWrapper(serpapi_api_key=key))  # SEARCH_CACHE_PATH to persist
+    tools = search_tools(search)
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from request_cache import RequestCache, SqliteStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 5
+QUERY_CLASS_TTLS = {"live": 10 * 60, "recent": 6 * 60 * 60, "evergreen": 7 * 24 * 60 * 60}
+LIVE_QUERY = re.compile(r"\b(today|tonight|now|right now|current|currently|latest|live|breaking|news|price|prices|"
+                        r"rate|rates|stock|stocks|score|scores|weather|as of)\b")
+RECENT_QUERY = re.compile(r"\b(yesterday|this (week|month|year)|last (week|month)|recent|recently|20\d\d)\b")
+LOCALE_PARAMS = ("gl", "hl", "location", "google_domain")
+
+
+def normalize_query(query):
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a search query."""
+    return re.sub(r"\s+", " ", query.strip().lower()).rstrip("?.!")
+
+
+def query_class(query):
+    """"live", "recent" or "evergreen", by how quickly the answer to the query changes."""
+    query = normalize_query(query)
+    if LIVE_QUERY.search(query):
+        return "live"
+    if RECENT_QUERY.search(query):
+        return "recent"
+    return "evergreen"
+
+
+def split_queries(text):
+    """Queries from one tool input: separated by newlines or ';', blanks dropped."""
+    return [query.strip() for query in re.split(r"[\n;]", text) if query.strip()]
+
+
+class CachedSearch:
+    """SerpAPIWrapper.run() behind a per-query-class TTL cache with single-flight and optional persistence."""
+
+    def __init__(self, search, ttls=None, store=None, maxConcurrency=DEFAULT_MAX_CONCURRENCY, clock=time.time):
+        self.search = search
+        self.ttls = {**QUERY_CLASS_TTLS, **(ttls or {})}
+        self.maxConcurrency = maxConcurrency
+        self.cache = RequestCache(defaultTtl=self.ttls["evergreen"], store=store, clock=clock)
+        self.searchCalls = 0
+
+    def locale(self):
+        params = getattr(self.search, "params", None) or {}
+        return tuple(str(params.get(name) or "") for name in LOCALE_PARAMS)
+
+    def cache_key(self, query):
+        """Return (key, query class)."""
+        kind = query_class(query)
+        return ("search", normalize_query(query), *self.locale()), kind
+
+    def run(self, query):
+        key, kind = self.cache_key(query)
+
+        def fetch():
+            self.searchCalls += 1
+            logger.info("SerpAPI search %r (%s)", query, kind)
+            return self.search.run(query)
+
+        return self.cache.get_or_fetch(key, fetch, ttl=self.ttls[kind])
+
+    async def arun(self, query):
+        key, kind = self.cache_key(query)
+
+        async def fetch():
+            self.searchCalls += 1
+            logger.info("SerpAPI search %r (%s)", query, kind)
+            if hasattr(self.search, "arun"):
+                return await self.search.arun(query)
+            return await asyncio.to_thread(self.search.run, query)
+
+        return await self.cache.aget_or_fetch(key, fetch, ttl=self.ttls[kind])
+
+    def _unique(self, queries):
+        """queries without repeats (by normalized form), first spelling kept."""
+        unique = {}
+        for query in queries:
+            unique.setdefault(normalize_query(query), query)
+        return list(unique.values())
+
+    def run_many(self, queries):
+        """Search queries concurrently (maxConcurrency at a time); one merged text in query order."""
+        queries = self._unique(queries)
+        with ThreadPoolExecutor(min(self.maxConcurrency, len(queries)) or 1) as pool:
+            results = list(pool.map(self._run_or_error, queries))
+        return merge_results(queries, results)
+
+    async def arun_many(self, queries):
+        queries = self._unique(queries)
+        semaphore = asyncio.Semaphore(self.maxConcurrency)
+
+        async def one(query):
+            async with semaphore:
+                try:
+                    return await self.arun(query)
+                except Exception as e:
+                    return f"Search failed: {e}"
+
+        return merge_results(queries, await asyncio.gather(*(one(query) for query in queries)))
+
+    def _run_or_error(self, query):
+        try:
+            return self.run(query)
+        except Exception as e:
+            return f"Search failed: {e}"
+
+    def run_many_text(self, text):
+        return self.run_many(split_queries(text))
+
+    async def arun_many_text(self, text):
+        return await self.arun_many(split_queries(text))
+
+    def stats(self):
+        return {**self.cache.stats(), "search_calls": self.searchCalls}
+
+
+def merge_results(queries, results):
+    return "\n\n".join(f"Results for '{query}':\n{result}" for query, result in zip(queries, results))
+
+
+def create_cached_search(search, storePath=None, **kwargs):
+    """CachedSearch persisted to storePath (default: $SEARCH_CACHE_PATH), in memory only if neither is set."""
+    storePath = storePath or os.getenv("SEARCH_CACHE_PATH")
+    return CachedSearch(search, store=SqliteStore(storePath) if storePath else None, **kwargs)
+
+
+def search_tools(search):
+    """The agent's google_search and google_search_many tools over a CachedSearch."""
+    from langchain.tools import Tool
+
+    return [
+        Tool.from_function(
+            func=search.run,
+            coroutine=search.arun,
+            name="google_search",
+            description="Use this to search the internet for current events, recent information, or news."
+        ),
+        Tool.from_function(
+            func=search.run_many_text,
+            coroutine=search.arun_many_text,
+            name="google_search_many",
+            description="Use this to run several internet searches at once. Input: the queries separated by ';'. "
+                        "Prefer it over repeated google_search calls when a question needs more than one search."
+        ),
+    ]
+
+
+class _FakeSerpApi:
+    """Stands in for SerpAPIWrapper: counts calls, answers after a delay."""
+
+    def __init__(self, delaySeconds=0.05, params=None):
+        self.delaySeconds = delaySeconds
+        self.params = params or {"engine": "google", "gl": "us", "hl": "en"}
+        self.calls = []
+
+    def run(self, query):
+        self.calls.append(query)
+        time.sleep(self.delaySeconds)
+        return f"answer to {query.strip().lower()}"
+
+
+def test_repeated_queries_hit_serpapi_once_per_class_ttl():
+    now = [1_000_000.0]
+    fake = _FakeSerpApi(delaySeconds=0)
+    search = CachedSearch(fake, clock=lambda: now[0])
+
+    assert search.run("Petrol price today in Mumbai") == "answer to petrol price today in mumbai"
+    search.run("  petrol price TODAY in mumbai? ")
+    search.run("What is Operation Sindoor?")
+    assert len(fake.calls) == 2
+    assert [query_class(query) for query in fake.calls] == ["live", "evergreen"]
+
+    now[0] += QUERY_CLASS_TTLS["live"] + 1
+    search.run("petrol price today in Mumbai")  # live result expired
+    search.run("what is operation sindoor")  # evergreen still fresh
+    assert len(fake.calls) == 3
+
+    fake.params = {**fake.params, "gl": "in"}
+    search.run("what is operation sindoor")  # another locale is another key
+    assert len(fake.calls) == 4 and search.stats()["search_calls"] == 4
+
+
+def test_many_queries_run_concurrently_and_merge():
+    fake = _FakeSerpApi(delaySeconds=0.2)
+    search = CachedSearch(fake, maxConcurrency=5)
+
+    startTime = time.perf_counter()
+    merged = search.run_many_text("petrol price in Mumbai; diesel price in Mumbai\nPetrol price in Mumbai;;CEO of X")
+    assert time.perf_counter() - startTime < 0.35
+    assert len(fake.calls) == 3
+    assert merged.index("Results for 'petrol price in Mumbai':\nanswer to petrol price in mumbai") \
+        < merged.index("Results for 'diesel price in Mumbai'") < merged.index("Results for 'CEO of X'")
+
+    assert asyncio.run(search.arun_many(["ceo of x", "weather in Pune"])).startswith(
+        "Results for 'ceo of x':\nanswer to ceo of x\n\nResults for 'weather in Pune'")
+    assert len(fake.calls) == 4
+
+
+def test_persistent_store_is_shared_across_instances(tmp_path):
+    fake = _FakeSerpApi(delaySeconds=0)
+    path = str(tmp_path / "search_cache.sqlite")
+    CachedSearch(fake, store=SqliteStore(path)).run("Who founded SerpAPI")
+    assert CachedSearch(fake, store=SqliteStore(path)).run("who founded serpapi?") == "answer to who founded serpapi"
+    assert len(fake.calls) == 1
@@ -0,0 +1,281 @@
+"""
+Concurrent conversion of Excel test cases into one pytest file.
+
+The Jira test-case agent converted rows with one llm.invoke at a time, so a story with
+60 test cases took 60 LLM round-trips back to back. convert_test_cases sends every row
+(from any number of Jira IDs) through llm.batch with max_concurrency, so wall time is
+roughly rows / maxConcurrency round-trips until the provider's rate limit is reached:
+
+- results keep the original row order, whatever order the calls finish in
+- rows that fail (rate limits, timeouts) are retried in further batches with
+  exponential backoff; rows that still fail become a comment in the file
+- write_pytest_file hoists the imports of every generated function to the top of the
+  file once, then writes one section per Jira ID; a test name that is already defined
+  earlier in the file (models reuse names like test_login_success across stories) gets
+  the section's suffix, so no test silently shadows another
+
+aconvert_test_cases is the same with llm.abatch.
+"""
+
+import ast
+import asyncio
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 2.0
+
+CONVERSION_PROMPT = (
+    "You are a senior QA engineer. Convert the following test case information into a complete pytest-style test function in Python. "
+    "Only output valid Python code as plain text. Do NOT include any markdown, code block markers (such as ```python or ```), explanations, notes, or comments about assumptions. "
+    "Only include necessary imports once at the top. If 'LoginPage' and 'HomePage' are needed, import them from 'app' at the top. Do not repeat imports. "
+    "Test Case Information:\n{test_case}\n"
+)
+
+
+def clean_code(text):
+    """Strip whitespace and markdown code fences from a model answer."""
+    return text.strip().removeprefix("```python").removeprefix("```").removesuffix("```").strip()
+
+
+def _answer_text(answer):
+    return answer.content if hasattr(answer, "content") else str(answer)
+
+
+class _Conversion:
+    """Retry bookkeeping shared by convert_test_cases and aconvert_test_cases (which only do the I/O)."""
+
+    def __init__(self, testCases, maxRetries, backoffSeconds):
+        self.prompts = [CONVERSION_PROMPT.format(test_case=testCase) for testCase in testCases]
+        self.results = [None] * len(self.prompts)
+        self.pending = list(range(len(self.prompts)))
+        self.maxRetries = maxRetries
+        self.backoffSeconds = backoffSeconds
+
+    def rounds(self):
+        """(delay before the batch, prompts of the batch) for the first try and each retry; record() each answer."""
+        for attempt in range(self.maxRetries + 1):
+            if not self.pending:
+                return
+            delay = 0.0
+            if attempt:
+                delay = self.backoffSeconds * 2 ** (attempt - 1)
+                logger.warning("Retrying %d failed test case(s) in %.1fs", len(self.pending), delay)
+            yield delay, [self.prompts[index] for index in self.pending]
+
+    def record(self, answers):
+        for index, answer in zip(self.pending, answers):
+            self.results[index] = answer if isinstance(answer, Exception) else clean_code(_answer_text(answer))
+        self.pending = [index for index, result in enumerate(self.results)
+                        if result is None or isinstance(result, Exception)]
+
+    @property
+    def failedCount(self):
+        return len(self.pending)
+
+    def codes(self):
+        return [_code_or_failure(index, result) for index, result in enumerate(self.results)]
+
+
+def _convert(llm, testCases, maxConcurrency=DEFAULT_MAX_CONCURRENCY, maxRetries=DEFAULT_MAX_RETRIES,
+             backoffSeconds=DEFAULT_BACKOFF_SECONDS):
+    conversion = _Conversion(testCases, maxRetries, backoffSeconds)
+    for delay, prompts in conversion.rounds():
+        time.sleep(delay)
+        conversion.record(llm.batch(prompts, config={"max_concurrency": maxConcurrency}, return_exceptions=True))
+    return conversion
+
+
+def convert_test_cases(llm, testCases, maxConcurrency=DEFAULT_MAX_CONCURRENCY, maxRetries=DEFAULT_MAX_RETRIES,
+                       backoffSeconds=DEFAULT_BACKOFF_SECONDS):
+    """Convert test case texts to pytest code concurrently; returns code strings in input order."""
+    return _convert(llm, testCases, maxConcurrency, maxRetries, backoffSeconds).codes()
+
+
+async def aconvert_test_cases(llm, testCases, maxConcurrency=DEFAULT_MAX_CONCURRENCY, maxRetries=DEFAULT_MAX_RETRIES,
+                              backoffSeconds=DEFAULT_BACKOFF_SECONDS):
+    """convert_test_cases with llm.abatch."""
+    conversion = _Conversion(testCases, maxRetries, backoffSeconds)
+    for delay, prompts in conversion.rounds():
+        await asyncio.sleep(delay)
+        conversion.record(await llm.abatch(prompts, config={"max_concurrency": maxConcurrency}, return_exceptions=True))
+    return conversion.codes()
+
+
+def _code_or_failure(index, result):
+    if isinstance(result, Exception):
+        logger.error("Test case %d could not be converted: %s", index + 1, result)
+        message = " ".join(str(result).split())
+        return f"# Test case {index + 1} could not be converted: {type(result).__name__}: {message}"
+    return result
+
+
+def split_imports(code):
+    """Split generated code into (top-level import lines, rest)."""
+    imports = []
+    lines = code.splitlines()
+    start = 0
+    for start, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith(("import ", "from ")):
+            imports.append(stripped)
+        elif stripped:
+            break
+    else:
+        start = len(lines)
+    return imports, "\n".join(lines[start:]).strip()
+
+
+def rename_duplicate_definitions(code, definedNames, suffix):
+    """
+    Rename the top-level functions and classes of code whose names are in definedNames
+    to name_suffix (name_suffix_2, ... if that is taken too). Adds the final names to
+    definedNames. Code that does not parse is returned unchanged.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code
+    lines = code.splitlines()
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        name = node.name
+        if name in definedNames:
+            newName, number = f"{name}_{suffix}", 2
+            while newName in definedNames:
+                newName, number = f"{name}_{suffix}_{number}", number + 1
+            logger.warning("%s is defined more than once; renamed to %s", name, newName)
+            lines[node.lineno - 1] = re.sub(rf"\b(def|class)(\s+){re.escape(name)}\b", rf"\g<1>\g<2>{newName}",
+                                            lines[node.lineno - 1], count=1)
+            name = newName
+        definedNames.add(name)
+    return "\n".join(lines)
+
+
+def write_pytest_file(path, codeBySection):
+    """Write {section title: [code, ...]} (e.g. per Jira ID) as one pytest file, imports hoisted once."""
+    imports = ["import pytest"]
+    sections = []
+    definedNames = set()
+    for title, codeBlocks in codeBySection.items():
+        suffix = re.sub(r"\W+", "_", str(title)).strip("_").lower() or "dup"
+        bodies = []
+        for code in codeBlocks:
+            codeImports, body = split_imports(code)
+            imports.extend(line for line in codeImports if line not in imports)
+            bodies.append(rename_duplicate_definitions(body, definedNames, suffix))
+        sections.append((title, bodies))
+
+    with open(path, "w", encoding="utf-8") as pyfile:
+        pyfile.write("\n".join(imports) + "\n\n")
+        for title, bodies in sections:
+            if len(sections) > 1:
+                pyfile.write(f"\n# ---------- {title} ----------\n\n")
+            for body in bodies:
+                pyfile.write(body + "\n\n\n")
+    return path
+
+
+def generate_pytest_file(llm, testCasesById, path, maxConcurrency=DEFAULT_MAX_CONCURRENCY, **retryKwargs):
+    """
+    Convert {jira_id: [test case text, ...]} in one concurrent batch and write a single pytest file.
+    Returns (path, number of test cases that could not be converted and are only comments in the file).
+    """
+    rows = [(jiraId, testCase) for jiraId, testCases in testCasesById.items() for testCase in testCases]
+    startTime = time.perf_counter()
+    conversion = _convert(llm, [testCase for _, testCase in rows], maxConcurrency, **retryKwargs)
+    logger.info("Converted %d test cases in %.1fs (max_concurrency=%d, %d failed)", len(rows),
+                time.perf_counter() - startTime, maxConcurrency, conversion.failedCount)
+    codeBySection = {jiraId: [] for jiraId in testCasesById}
+    for (jiraId, _), code in zip(rows, conversion.codes()):
+        codeBySection[jiraId].append(code)
+    return write_pytest_file(path, codeBySection), conversion.failedCount
+
+
+def _code_model(delaySeconds=0.1, failFirst=()):
+    """Chat model that turns "Title: X" into a test function after delaySeconds; titles in failFirst fail once."""
+    import re
+
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    failed = set()
+
+    class CodeModel(BaseChatModel):
+        @property
+        def _llm_type(self):
+            return "fake-code"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(delaySeconds)
+            title = re.search(r"Title: (\w+)", messages[-1].content).group(1)
+            if title in failFirst and title not in failed:
+                failed.add(title)
+                raise TimeoutError(f"upstream timeout for {title}")
+            code = f"```python\nimport pytest\nfrom app import LoginPage\n\ndef test_{title}():\n    assert True\n```"
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=code))])
+
+    return CodeModel()
+
+
+def test_rows_convert_concurrently_in_order_with_retries(tmp_path):
+    """20 rows at 0.1 s each take ~0.2 s at concurrency 10; a failing row is retried; order is kept."""
+    llm = _code_model(delaySeconds=0.1, failFirst={"case07"})
+    testCases = [f"Title: case{n:02d}\nSteps: open the login page" for n in range(20)]
+
+    startTime = time.perf_counter()
+    codes = convert_test_cases(llm, testCases, maxConcurrency=10, backoffSeconds=0)
+    assert time.perf_counter() - startTime < 0.8
+    assert [code.split("def ")[1].split("(")[0] for code in codes] == [f"test_case{n:02d}" for n in range(20)]
+
+    assert asyncio.run(aconvert_test_cases(llm, testCases[:4], maxConcurrency=4)) == codes[:4]
+
+
+def test_many_jira_ids_make_one_file_with_imports_once(tmp_path):
+    llm = _code_model(delaySeconds=0)
+    path, failed = generate_pytest_file(llm, {"PROJ-1": ["Title: login"], "PROJ-2": ["Title: logout", "Title: reset"]},
+                                        str(tmp_path / "combined_test.py"), maxRetries=0)
+    assert failed == 0
+    text = open(path, encoding="utf-8").read()
+    assert text.startswith("import pytest\nfrom app import LoginPage\n\n")
+    assert text.count("import pytest") == 1
+    assert text.index("# ---------- PROJ-1") < text.index("def test_login") < text.index("# ---------- PROJ-2")
+    assert text.index("def test_logout") < text.index("def test_reset")
+    compile(text, path, "exec")
+
+
+def test_rows_that_keep_failing_become_comments():
+    llm = _code_model(delaySeconds=0, failFirst={"broken"})
+    codes = convert_test_cases(llm, ["Title: ok", "Title: broken"], maxRetries=0)
+    assert codes[0].startswith("import pytest")
+    assert codes[1] == "# Test case 2 could not be converted: TimeoutError: upstream timeout for broken"
+
+
+def test_generate_pytest_file_counts_rows_that_could_not_be_converted(tmp_path):
+    llm = _code_model(delaySeconds=0, failFirst={"broken", "flaky"})
+    path, failed = generate_pytest_file(llm, {"PROJ-1": ["Title: ok", "Title: broken"], "PROJ-2": ["Title: flaky"]},
+                                        str(tmp_path / "partial_test.py"), maxRetries=0)
+    assert failed == 2
+    assert open(path, encoding="utf-8").read().count("could not be converted") == 2
+
+    llm = _code_model(delaySeconds=0, failFirst={"broken"})
+    assert asyncio.run(aconvert_test_cases(llm, ["Title: broken"], maxRetries=1, backoffSeconds=0))[0].startswith(
+        "import pytest")
+
+
+def test_repeated_test_names_across_sections_are_renamed(tmp_path):
+    """Two stories whose generated tests share a name both get collected."""
+    code = "import pytest\n\n@pytest.mark.smoke\ndef test_login_success():\n    assert True\n"
+    path = write_pytest_file(str(tmp_path / "dupes_test.py"),
+                             {"PROJ-1": [code, code], "PROJ-2": [code], "PROJ-3": ["# Test case 1 could not be converted"]})
+    text = open(path, encoding="utf-8").read()
+    tree = ast.parse(text)
+    names = [node.name for node in tree.body if isinstance(node, ast.FunctionDef)]
+    assert names == ["test_login_success", "test_login_success_proj_1", "test_login_success_proj_2"]
+    assert text.count("@pytest.mark.smoke") == 3
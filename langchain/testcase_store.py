@@ -0,0 +1,231 @@
+"""
+Indexed SQLite sidecar for the test-case workbook read by the Jira agent.
+
+generate_pytest_file_from_excel used to pd.read_excel the whole testcases.xlsx on every
+call, rescan the headers for the Jira ID column and string-filter every row: seconds
+per call on large workbooks. TestCaseStore parses the workbook once into
+"<workbook>.index.sqlite" next to it:
+
+    testcases(row_number, jira_id, row_text)   indexed on the normalized jira_id
+
+Each row_text is the row already formatted as "column: value" lines (empty cells
+skipped), which is what the LLM prompt needs. A lookup for one ID is an index hit.
+The sidecar is reused while the workbook's size and mtime are unchanged. If only the
+mtime changed (the file was touched or copied), a matching SHA-256 still counts as
+unchanged. Anything else rebuilds it. The first conversion streams the sheet with
+openpyxl in read-only mode, so a 200k-row workbook is never held in memory, and it is
+written to a temporary file that replaces the old sidecar atomically.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+JIRA_ID_HEADERS = ("jira id", "jiraid")
+INSERT_CHUNK_ROWS = 5000
+SCHEMA_VERSION = 1
+
+
+def normalize_jira_id(jiraId):
+    return str(jiraId).strip().upper()
+
+
+def file_sha256(path, chunkSize=1 << 20):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunkSize), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def iter_workbook_rows(path):
+    """Yield the first sheet's rows as tuples (header first), streamed by openpyxl in read-only mode."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        # The first sheet, as pd.read_excel read; workbook.active is whichever sheet was last selected.
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _is_empty(value):
+    return value is None or (isinstance(value, str) and not value.strip()) or value != value  # NaN
+
+
+def format_row(headers, values):
+    """The row as "column: value" lines, skipping empty cells."""
+    return "\n".join(f"{header}: {value}" for header, value in zip(headers, values)
+                     if header is not None and not _is_empty(value))
+
+
+class TestCaseStore:
+    """Jira ID -> test case rows, served from an mtime/hash-invalidated SQLite sidecar."""
+
+    __test__ = False  # not a pytest test class
+
+    def __init__(self, excelPath, sidecarPath=None, readRows=iter_workbook_rows):
+        self.excelPath = excelPath
+        self.sidecarPath = sidecarPath or f"{excelPath}.index.sqlite"
+        self.readRows = readRows
+        self._lock = threading.Lock()
+
+    def _connect(self, path=None):
+        return sqlite3.connect(path or self.sidecarPath, timeout=30)
+
+    def _stored_meta(self):
+        if not os.path.exists(self.sidecarPath):
+            return None
+        try:
+            with self._connect() as connection:
+                return dict(connection.execute("SELECT key, value FROM meta").fetchall())
+        except sqlite3.DatabaseError:
+            return None
+
+    def _source_stat(self):
+        stat = os.stat(self.excelPath)
+        return str(stat.st_size), str(stat.st_mtime_ns)
+
+    def ensure_fresh(self):
+        """Rebuild the sidecar if the workbook changed; returns True when it was rebuilt."""
+        with self._lock:
+            size, mtime = self._source_stat()
+            meta = self._stored_meta()
+            if meta and meta.get("schema") == str(SCHEMA_VERSION) and meta.get("source_size") == size:
+                if meta.get("source_mtime_ns") == mtime:
+                    return False
+                sha256 = file_sha256(self.excelPath)
+                if meta.get("source_sha256") == sha256:
+                    with self._connect() as connection:
+                        connection.execute("UPDATE meta SET value = ? WHERE key = 'source_mtime_ns'", (mtime,))
+                    return False
+            self._build(size, mtime)
+            return True
+
+    def _build(self, size, mtime):
+        startTime = time.perf_counter()
+        sha256 = file_sha256(self.excelPath)
+        tempPath = f"{self.sidecarPath}.{os.getpid()}.tmp"
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        rows = iter(self.readRows(self.excelPath))
+        headers = list(next(rows, None) or [])
+        jiraColumn = next((index for index, header in enumerate(headers)
+                           if str(header).strip().lower() in JIRA_ID_HEADERS), None)
+        if jiraColumn is None:
+            raise ValueError("No Jira ID column found in Excel file.")
+
+        connection = self._connect(tempPath)
+        try:
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            connection.execute("CREATE TABLE testcases (row_number INTEGER PRIMARY KEY, jira_id TEXT, row_text TEXT)")
+            rowCount = 0
+            numbered = ((number, values) for number, values in enumerate(rows, start=2)
+                        if not _is_empty(values[jiraColumn] if jiraColumn < len(values) else None))
+            while True:
+                chunk = [(number, normalize_jira_id(values[jiraColumn]), format_row(headers, values))
+                         for number, values in islice(numbered, INSERT_CHUNK_ROWS)]
+                if not chunk:
+                    break
+                connection.executemany("INSERT INTO testcases VALUES (?, ?, ?)", chunk)
+                rowCount += len(chunk)
+            # Build the index after the bulk insert; much faster than maintaining it row by row.
+            connection.execute("CREATE INDEX testcases_jira_id ON testcases (jira_id, row_number)")
+            connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("schema", str(SCHEMA_VERSION)), ("source_size", size), ("source_mtime_ns", mtime),
+                ("source_sha256", sha256), ("headers", json.dumps([str(header) for header in headers])),
+                ("rows", str(rowCount)),
+            ])
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(tempPath, self.sidecarPath)
+        logger.info("Indexed %d test case rows from %s in %.1fs", rowCount, self.excelPath,
+                    time.perf_counter() - startTime)
+
+    def lookup(self, jiraIds):
+        """{normalized jira id: [row text, ...] in sheet order} for each requested ID."""
+        self.ensure_fresh()
+        jiraIds = [normalize_jira_id(jiraId) for jiraId in jiraIds]
+        found = {jiraId: [] for jiraId in jiraIds}
+        with self._connect() as connection:
+            for jiraId in found:
+                found[jiraId] = [text for (text,) in connection.execute(
+                    "SELECT row_text FROM testcases WHERE jira_id = ? ORDER BY row_number", (jiraId,))]
+        return found
+
+
+def _write_sheet(path, rows):
+    """Stand-in workbook: the tests read it back with a JSON reader instead of openpyxl."""
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(rows, file)
+
+
+def _read_sheet(path):
+    with open(path, encoding="utf-8") as file:
+        yield from (tuple(row) for row in json.load(file))
+
+
+def test_lookup_is_an_index_hit_until_the_workbook_changes(tmp_path):
+    path = str(tmp_path / "testcases.xlsx")
+    rows = [["Test Case", "Jira ID", "Steps", "Expected"]]
+    rows += [[f"case {n}", f" proj-{n % 50} ", "open login page", None] for n in range(5000)]
+    _write_sheet(path, rows)
+    reads = []
+    store = TestCaseStore(path, readRows=lambda p: reads.append(p) or _read_sheet(p))
+
+    found = store.lookup(["PROJ-7", "proj-99"])
+    assert found["PROJ-99"] == [] and len(found["PROJ-7"]) == 100
+    assert found["PROJ-7"][0] == "Test Case: case 7\nJira ID:  proj-7 \nSteps: open login page"
+    assert store.lookup(["PROJ-8"])["PROJ-8"][1].startswith("Test Case: case 58\n")
+    assert len(reads) == 1
+
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))  # touched, same content
+    assert store.ensure_fresh() is False and len(reads) == 1
+
+    _write_sheet(path, rows[:1] + [["new case", "PROJ-7", "log out", "logged out"]])
+    assert store.lookup(["PROJ-7"])["PROJ-7"] == ["Test Case: new case\nJira ID: PROJ-7\nSteps: log out\nExpected: logged out"]
+    assert len(reads) == 2
+
+
+def test_missing_jira_column_is_reported(tmp_path):
+    path = str(tmp_path / "testcases.xlsx")
+    _write_sheet(path, [["Test Case", "Steps"], ["case", "open"]])
+    try:
+        TestCaseStore(path, readRows=_read_sheet).lookup(["PROJ-1"])
+        raise AssertionError("ValueError expected")
+    except ValueError as e:
+        assert str(e) == "No Jira ID column found in Excel file."
+    assert not os.path.exists(f"{path}.index.sqlite")
+
+
+def test_real_workbook_is_read_from_its_first_sheet(tmp_path):
+    from openpyxl import Workbook
+
+    path = str(tmp_path / "testcases.xlsx")
+    workbook = Workbook()
+    cases = workbook.active
+    cases.title = "Test Cases"
+    cases.append(["Test Case", "Jira ID", "Steps", "Expected"])
+    cases.append(["login works", "PROJ-1", "open login page", "form shown"])
+    cases.append(["logout works", "proj-1", "click logout", None])
+    notes = workbook.create_sheet("Notes")
+    notes.append(["Jira ID", "Note"])
+    notes.append(["PROJ-1", "not a test case"])
+    workbook.active = 1  # saved with the notes sheet selected
+    workbook.save(path)
+
+    assert TestCaseStore(path).lookup(["PROJ-1"])["PROJ-1"] == [
+        "Test Case: login works\nJira ID: PROJ-1\nSteps: open login page\nExpected: form shown",
+        "Test Case: logout works\nJira ID: proj-1\nSteps: click logout",
+    ]
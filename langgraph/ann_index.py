@@ -0,0 +1,296 @@
+"""
+Approximate nearest-neighbour index types for the FAISS retriever.
+
+FAISS.from_documents always builds a flat (exact, linear-scan) index. to_ann_vectorstore
+rebuilds the vectors of an existing store into one of:
+
+    "flat"   exact search (the default, unchanged behaviour)
+    "ivf"    IVF-Flat: k-means coarse quantizer, searches nprobe of nlist lists
+    "hnsw"   HNSW graph, query effort set by efSearch
+    "ivfpq"  IVF with product-quantized codes, smallest memory footprint
+
+Every type keeps the metric of the store it replaces (L2, or inner product for
+MAX_INNER_PRODUCT stores); other FAISS metrics are rejected. IVF variants are trained on
+a random sample of the vectors. to_ann_vectorstore copies the vectors over in chunks of
+ADD_CHUNK_SIZE, so the conversion needs the two indexes plus one chunk in memory, not a
+second full float32 copy of the corpus. nprobe and efSearch can be changed at query
+time with set_search_params. recall_latency_report compares any set of
+configurations against the flat index (recall@k and p50/p99 latency per question).
+
+Run this file directly for a synthetic report that needs no API key.
+"""
+
+import math
+import time
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+# FAISS wants roughly this many training points per k-means centroid.
+MIN_POINTS_PER_CENTROID = 39
+ADD_CHUNK_SIZE = 65536
+METRICS = (faiss.METRIC_L2, faiss.METRIC_INNER_PRODUCT)
+
+
+def vectorstore_vectors(vectorstore):
+    """All vectors of a LangChain FAISS store as a float32 matrix, in index order (a full copy)."""
+    return vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal)
+
+
+def default_nlist(vectorCount):
+    return max(1, min(int(4 * math.sqrt(vectorCount)), vectorCount // MIN_POINTS_PER_CENTROID))
+
+
+def default_pq_m(dimension):
+    """Largest sub-quantizer count <= 64 that divides the dimension."""
+    return max(m for m in range(1, min(64, dimension) + 1) if dimension % m == 0)
+
+
+def new_ann_index(dimension, vectorCount, indexType="flat", metric=faiss.METRIC_L2, nlist=None, pqM=None,
+                  pqBits=8, hnswM=32, efConstruction=80):
+    """An empty (untrained) FAISS index of the requested type and metric, sized for vectorCount vectors."""
+    if indexType not in INDEX_TYPES:
+        raise ValueError(f"indexType must be one of {INDEX_TYPES}, got {indexType!r}")
+    if metric not in METRICS:
+        raise ValueError(f"Only L2 and inner-product indexes are supported, got FAISS metric {metric}")
+
+    if indexType == "flat":
+        return faiss.IndexFlat(dimension, metric)
+    if indexType == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnswM, metric)
+        index.hnsw.efConstruction = efConstruction
+        return index
+    nlist = nlist or default_nlist(vectorCount)
+    quantizer = faiss.IndexFlat(dimension, metric)
+    if indexType == "ivf":
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+    else:
+        if vectorCount < 2 ** pqBits:
+            raise ValueError(f"ivfpq with {pqBits}-bit codes needs at least {2 ** pqBits} vectors, got {vectorCount}")
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pqM or default_pq_m(dimension), pqBits, metric)
+    return index
+
+
+def training_sample_ids(index, vectorCount, trainSampleSize=None, seed=0):
+    """Sorted ids of the vectors to train an IVF index on (empty for index types without training)."""
+    if index.is_trained:
+        return np.zeros(0, dtype=np.int64)
+    pqBits = faiss.downcast_index(index).pq.nbits if isinstance(faiss.downcast_index(index), faiss.IndexIVFPQ) else 8
+    sampleSize = min(vectorCount, trainSampleSize or max(faiss.extract_index_ivf(index).nlist, 2 ** pqBits) * 64)
+    return np.sort(np.random.default_rng(seed).choice(vectorCount, sampleSize, replace=False))
+
+
+def build_ann_index(vectors, indexType="flat", metric=faiss.METRIC_L2, trainSampleSize=None, seed=0, **indexKwargs):
+    """Build and fill a FAISS index of the requested type and metric from a float32 matrix."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    vectorCount, dimension = vectors.shape
+    index = new_ann_index(dimension, vectorCount, indexType, metric, **indexKwargs)
+    sampleIds = training_sample_ids(index, vectorCount, trainSampleSize, seed)
+    if len(sampleIds):
+        index.train(vectors[sampleIds])
+    index.add(vectors)
+    return index
+
+
+def copy_ann_index(source, indexType="flat", trainSampleSize=None, seed=0, chunkSize=ADD_CHUNK_SIZE, **indexKwargs):
+    """build_ann_index over the vectors of another index, reconstructed one chunk at a time."""
+    vectorCount = source.ntotal
+    index = new_ann_index(source.d, vectorCount, indexType, source.metric_type, **indexKwargs)
+    sampleIds = training_sample_ids(index, vectorCount, trainSampleSize, seed)
+    if len(sampleIds):
+        index.train(source.reconstruct_batch(sampleIds))
+    for start in range(0, vectorCount, chunkSize):
+        index.add(source.reconstruct_n(start, min(chunkSize, vectorCount - start)))
+    return index
+
+
+def set_search_params(index, nprobe=None, efSearch=None):
+    """Apply query-time knobs; settings that don't apply to the index type are ignored."""
+    if nprobe is not None:
+        ivfIndex = faiss.try_extract_index_ivf(index)
+        if ivfIndex is not None:
+            ivfIndex.nprobe = nprobe
+    if efSearch is not None and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = efSearch
+    return index
+
+
+def to_ann_vectorstore(vectorstore, indexType="flat", nprobe=None, efSearch=None, **buildKwargs):
+    """Return a FAISS store sharing the docstore of vectorstore, backed by an index of indexType."""
+    if indexType == "flat" and isinstance(vectorstore.index, faiss.IndexFlat):
+        return vectorstore
+    index = copy_ann_index(vectorstore.index, indexType, **buildKwargs)
+    set_search_params(index, nprobe, efSearch)
+    return FAISS(vectorstore.embedding_function, index, vectorstore.docstore, dict(vectorstore.index_to_docstore_id),
+                 normalize_L2=getattr(vectorstore, "_normalize_L2", False), distance_strategy=vectorstore.distance_strategy)
+
+
+def recall_latency_report(vectors, queryVectors, configs, k=4, metric=faiss.METRIC_L2):
+    """
+    Compare index configurations against exact search under the same metric.
+
+    configs is a list of dicts, e.g. {"indexType": "ivf", "nprobe": 8}; any other keys
+    are passed to build_ann_index. Returns one row per config with recall@k against the
+    flat index, per-query p50/p99 latency in milliseconds and build time in seconds.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queryVectors = np.ascontiguousarray(queryVectors, dtype=np.float32)
+    exactIndex = faiss.IndexFlat(vectors.shape[1], metric)
+    exactIndex.add(vectors)
+    _, exactIds = exactIndex.search(queryVectors, k)
+
+    rows = []
+    for config in configs:
+        buildKwargs = {key: value for key, value in config.items() if key not in ("nprobe", "efSearch")}
+        startTime = time.perf_counter()
+        index = build_ann_index(vectors, metric=metric, **buildKwargs)
+        buildSeconds = time.perf_counter() - startTime
+        set_search_params(index, config.get("nprobe"), config.get("efSearch"))
+
+        latencies = []
+        hits = 0
+        for queryNumber in range(len(queryVectors)):
+            # One question at a time, like the retriever does.
+            startTime = time.perf_counter()
+            _, ids = index.search(queryVectors[queryNumber:queryNumber + 1], k)
+            latencies.append((time.perf_counter() - startTime) * 1000)
+            hits += len(set(ids[0].tolist()) & set(exactIds[queryNumber].tolist()))
+        rows.append({
+            "config": config,
+            "recall_at_k": hits / (k * len(queryVectors)),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "build_s": buildSeconds,
+        })
+    return rows
+
+
+def question_set_report(vectorstore, questions, configs, k=4):
+    """recall_latency_report for a real store and a list of question strings."""
+    # embed_query, as retrieval does: some models embed queries and documents differently.
+    embeddingFunction = vectorstore.embedding_function
+    queryVectors = np.asarray([embeddingFunction.embed_query(question) for question in questions], dtype=np.float32)
+    return recall_latency_report(vectorstore_vectors(vectorstore), queryVectors, configs, k, vectorstore.index.metric_type)
+
+
+def format_report(rows, k=4):
+    lines = [f"{'config':<42} {f'recall@{k}':>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8}"]
+    for row in rows:
+        label = ", ".join(f"{key}={value}" for key, value in row["config"].items())
+        lines.append(f"{label:<42} {row['recall_at_k']:>9.3f} {row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f} {row['build_s']:>8.2f}")
+    return "\n".join(lines)
+
+
+def clustered_vectors(count, dimension, clusters=64, seed=0):
+    """Synthetic embeddings with cluster structure (uniform noise makes every ANN look bad)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    return centers[labels] + 0.3 * rng.normal(size=(count, dimension)).astype(np.float32)
+
+
+def test_ann_indexes_find_exact_neighbours_with_enough_probes():
+    """IVF/HNSW/IVF-PQ return the flat results when nprobe/efSearch are generous."""
+    vectors = clustered_vectors(3000, 32)
+    queries = clustered_vectors(50, 32, seed=1)
+    rows = recall_latency_report(vectors, queries, [
+        {"indexType": "flat"},
+        {"indexType": "ivf", "nprobe": 64},
+        {"indexType": "hnsw", "efSearch": 128},
+        {"indexType": "ivfpq", "nprobe": 64, "pqM": 16},
+    ])
+    recalls = {row["config"]["indexType"]: row["recall_at_k"] for row in rows}
+    assert recalls["flat"] == 1.0
+    assert recalls["ivf"] == 1.0
+    assert recalls["hnsw"] >= 0.95
+    assert recalls["ivfpq"] >= 0.5
+    assert all(row["p99_ms"] >= row["p50_ms"] for row in rows)
+
+
+def test_to_ann_vectorstore_keeps_documents():
+    """The converted store answers similarity_search with the original documents."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    docs = [Document(page_content=f"policy clause {n}") for n in range(200)]
+    flat = FAISS.from_documents(docs, DeterministicFakeEmbedding(size=16))
+    ivf = to_ann_vectorstore(flat, "ivf", nprobe=4)
+    assert faiss.try_extract_index_ivf(ivf.index).nprobe == 4
+    assert ivf.similarity_search("policy clause 7", k=1)[0].page_content == "policy clause 7"
+    assert to_ann_vectorstore(flat, "flat") is flat
+
+
+def test_inner_product_stores_keep_their_metric():
+    """A MAX_INNER_PRODUCT store ranks by inner product after conversion, like its flat index."""
+    from langchain_community.vectorstores.utils import DistanceStrategy
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    docs = [Document(page_content=f"policy clause {n}") for n in range(300)]
+    flat = FAISS.from_documents(docs, embeddings, distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT)
+    query = embeddings.embed_query("leave")
+    expected = flat.similarity_search_with_score_by_vector(query, k=4)
+    for indexType, settings in (("ivf", {"nprobe": 64}), ("hnsw", {"efSearch": 256}), ("ivfpq", {"nprobe": 64})):
+        converted = to_ann_vectorstore(flat, indexType, chunkSize=64, pqM=16, **settings)
+        assert converted.index.metric_type == faiss.METRIC_INNER_PRODUCT
+        found = converted.similarity_search_with_score_by_vector(query, k=4)
+        if indexType != "ivfpq":  # PQ codes approximate the scores
+            assert [doc.page_content for doc, _ in found] == [doc.page_content for doc, _ in expected]
+            assert np.allclose([score for _, score in found], [score for _, score in expected], atol=1e-4)
+
+    rows = recall_latency_report(vectorstore_vectors(flat), np.asarray([query]), [{"indexType": "hnsw", "efSearch": 256}],
+                                 metric=faiss.METRIC_INNER_PRODUCT)
+    assert rows[0]["recall_at_k"] == 1.0
+    try:
+        new_ann_index(16, 100, "hnsw", faiss.METRIC_L1)
+        raise AssertionError("ValueError expected")
+    except ValueError:
+        pass
+
+
+def test_hnsw_vectorstore_survives_save_and_load(tmp_path):
+    """ANN stores round-trip through save_local/load_local like the flat ones the index cache writes."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    docs = [Document(page_content=f"policy clause {n}") for n in range(50)]
+    hnsw = to_ann_vectorstore(FAISS.from_documents(docs, embeddings), "hnsw")
+    hnsw.save_local(str(tmp_path))
+    loaded = FAISS.load_local(str(tmp_path), embeddings, allow_dangerous_deserialization=True)
+    set_search_params(loaded.index, efSearch=64)
+    assert loaded.index.hnsw.efSearch == 64
+    assert loaded.similarity_search("policy clause 3", k=1)[0].page_content == "policy clause 3"
+    rows = question_set_report(loaded, ["policy clause 3", "policy clause 9"], [{"indexType": "hnsw", "efSearch": 64}], k=2)
+    assert rows[0]["recall_at_k"] == 1.0
+
+
+def test_question_set_report_embeds_questions_as_queries():
+    from unittest import mock
+
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    store = FAISS.from_documents([Document(page_content=f"policy clause {n}") for n in range(20)], embeddings)
+    with mock.patch.object(DeterministicFakeEmbedding, "embed_documents", side_effect=AssertionError("documents")):
+        rows = question_set_report(store, ["policy clause 3"], [{"indexType": "flat"}], k=2)
+    assert rows[0]["recall_at_k"] == 1.0
+
+
+if __name__ == "__main__":
+    vectorCount = 100_000
+    vectors = clustered_vectors(vectorCount, 128)
+    queries = clustered_vectors(500, 128, seed=1)
+    print(f"{vectorCount} synthetic 128-d vectors, 500 questions")
+    print(format_report(recall_latency_report(vectors, queries, [
+        {"indexType": "flat"},
+        {"indexType": "ivf", "nprobe": 4},
+        {"indexType": "ivf", "nprobe": 16},
+        {"indexType": "hnsw", "efSearch": 32},
+        {"indexType": "hnsw", "efSearch": 128},
+        {"indexType": "ivfpq", "nprobe": 16},
+    ])))
@@ -0,0 +1,307 @@
+"""
+Semantic answer cache for the RAG chains.
+
+The HR bot answers the same few questions over and over, and every one of them still
+pays for a retrieval plus a full LLM call. AnswerCache sits in front of a chain:
+
+    1. exact match on the normalized question ("What is WFH Policy?" == "what is wfh policy")
+    2. otherwise, cosine similarity of the question embedding against cached questions,
+       accepted above similarityThreshold
+
+Entries are scoped to an index version (see index_version), so re-ingesting the
+document invalidates every answer built from the old chunks. Eviction is LRU with a
+per-entry TTL. with_answer_cache wraps any chain (LangGraph graph or RetrievalQA) as a
+Runnable with the same input/output keys.
+
+similarityThreshold is a setting, not a constant: the right value depends on the
+embedding model, and no single number is correct across models. Set it per deployment
+(ANSWER_CACHE_SIMILARITY_THRESHOLD, or the similarityThreshold argument). To choose it,
+run similarity_report on the production embedding model with paraphrases that should
+hit and distinct questions that must miss ("What is the WFH policy?" / "What is the
+leave policy?"), ideally taken from the bot's logs, and set it above the report's
+highest_distinct. A false hit serves the answer to a different question, while a missed
+paraphrase only costs one chain call, so when the two ranges overlap keep the threshold
+above the distinct ones. The 0.95 default is only a conservative starting point.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.runnables import RunnableLambda
+
+# Tune per embedding model with similarity_report (see the module docstring).
+DEFAULT_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 3600
+
+
+def normalize_question(question):
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a question."""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+
+def index_version(vectorstore):
+    """Short hash of the chunk ids in a FAISS store; changes whenever the index is rebuilt or synced."""
+    hasher = hashlib.sha256()
+    for docstoreId in sorted(vectorstore.index_to_docstore_id.values()):
+        hasher.update(docstoreId.encode("utf-8"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()[:16]
+
+
+def similarity_report(embeddings, paraphrasePairs, distinctPairs):
+    """
+    Cosine similarity of question pairs under an embedding model, for choosing similarityThreshold.
+
+    Returns {"paraphrase": [(a, b, similarity), ...], "distinct": [...], "lowest_paraphrase": float,
+    "highest_distinct": float}; the threshold belongs above highest_distinct.
+    """
+    def similarities(pairs):
+        rows = []
+        for first, second in pairs:
+            vectors = np.asarray(embeddings.embed_documents([first, second]), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            rows.append((first, second, float(vectors[0] @ vectors[1])))
+        return rows
+
+    paraphrase, distinct = similarities(paraphrasePairs), similarities(distinctPairs)
+    return {
+        "paraphrase": paraphrase,
+        "distinct": distinct,
+        "lowest_paraphrase": min((row[2] for row in paraphrase), default=None),
+        "highest_distinct": max((row[2] for row in distinct), default=None),
+    }
+
+
+class AnswerCache:
+    """LRU + TTL answer cache with exact and embedding-similarity lookup."""
+
+    def __init__(self, embeddings=None, similarityThreshold=DEFAULT_SIMILARITY_THRESHOLD,
+                 maxEntries=DEFAULT_MAX_ENTRIES, ttlSeconds=DEFAULT_TTL_SECONDS, clock=time.monotonic):
+        if not 0.0 < similarityThreshold <= 1.0:
+            raise ValueError(f"similarityThreshold must be in (0, 1], got {similarityThreshold}")
+        self.embeddings = embeddings
+        self.similarityThreshold = similarityThreshold
+        self.maxEntries = maxEntries
+        self.ttlSeconds = ttlSeconds
+        self.clock = clock
+        # (indexVersion, normalized question) -> (answer, unit vector or None, stored at)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.exactHits = 0
+        self.semanticHits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _unit(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _unit_vector(self, question):
+        if self.embeddings is None:
+            return None
+        return self._unit(self.embeddings.embed_query(question))
+
+    async def _aunit_vector(self, question):
+        if self.embeddings is None:
+            return None
+        return self._unit(await self.embeddings.aembed_query(question))
+
+    def _expired(self, storedAt):
+        return self.clock() - storedAt > self.ttlSeconds
+
+    def _evict_expired(self):
+        for key in [key for key, (_, _, storedAt) in self._entries.items() if self._expired(storedAt)]:
+            del self._entries[key]
+            self.evictions += 1
+
+    def _exact_lookup(self, question, indexVersion):
+        key = (indexVersion, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry[2]):
+                self._entries.move_to_end(key)
+                self.exactHits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+                self.evictions += 1
+        return None
+
+    def _semantic_lookup(self, queryVector, indexVersion):
+        with self._lock:
+            if queryVector is not None:
+                self._evict_expired()
+                candidates = [(key, entry) for key, entry in self._entries.items()
+                              if key[0] == indexVersion and entry[1] is not None]
+                if candidates:
+                    similarities = np.stack([entry[1] for _, entry in candidates]) @ queryVector
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.similarityThreshold:
+                        bestKey, bestEntry = candidates[best]
+                        self._entries.move_to_end(bestKey)
+                        self.semanticHits += 1
+                        return bestEntry[0]
+            self.misses += 1
+        return None
+
+    def lookup(self, question, indexVersion):
+        """Return (answer, queryVector) on a hit, (None, queryVector) on a miss."""
+        answer = self._exact_lookup(question, indexVersion)
+        if answer is not None:
+            return answer, None
+        # Embed outside the lock: it may be a network call.
+        queryVector = self._unit_vector(question)
+        return self._semantic_lookup(queryVector, indexVersion), queryVector
+
+    async def alookup(self, question, indexVersion):
+        """lookup() that awaits the question embedding instead of blocking the event loop."""
+        answer = self._exact_lookup(question, indexVersion)
+        if answer is not None:
+            return answer, None
+        queryVector = await self._aunit_vector(question)
+        return self._semantic_lookup(queryVector, indexVersion), queryVector
+
+    def store(self, question, indexVersion, answer, queryVector=None):
+        if queryVector is None:
+            queryVector = self._unit_vector(question)
+        with self._lock:
+            key = (indexVersion, normalize_question(question))
+            self._entries[key] = (answer, queryVector, self.clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.exactHits + self.semanticHits + self.misses
+        return {
+            "exact_hits": self.exactHits,
+            "semantic_hits": self.semanticHits,
+            "misses": self.misses,
+            "hit_rate": (self.exactHits + self.semanticHits) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "evictions": self.evictions,
+        }
+
+
+def with_answer_cache(chain, cache, indexVersion, inputKey="question", outputKey="answer"):
+    """
+    Wrap a chain so cached questions skip retrieval and the LLM.
+
+    Use inputKey="query", outputKey="result" for RetrievalQA. Hits return
+    {inputKey: question, outputKey: answer, "cached": True}; misses return the chain's
+    own output (with "cached": False) and store its answer.
+    """
+    def answer(inputs):
+        question = inputs[inputKey]
+        cachedAnswer, queryVector = cache.lookup(question, indexVersion)
+        if cachedAnswer is not None:
+            return {inputKey: question, outputKey: cachedAnswer, "cached": True}
+        result = chain.invoke(inputs)
+        cache.store(question, indexVersion, result[outputKey], queryVector)
+        return {**result, "cached": False}
+
+    async def aanswer(inputs):
+        question = inputs[inputKey]
+        cachedAnswer, queryVector = await cache.alookup(question, indexVersion)
+        if cachedAnswer is not None:
+            return {inputKey: question, outputKey: cachedAnswer, "cached": True}
+        result = await chain.ainvoke(inputs)
+        cache.store(question, indexVersion, result[outputKey], queryVector)
+        return {**result, "cached": False}
+
+    return RunnableLambda(answer, afunc=aanswer, name="answer_cache")
+
+
+class _CountingChain:
+    """Stand-in chain that counts how often it really ran."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, inputs):
+        self.calls += 1
+        return {"question": inputs["question"], "context": "...", "answer": f"answer #{self.calls}"}
+
+
+def test_answer_cache_exact_and_semantic_hits():
+    """Rephrasings hit the cache; a new index version or an expired entry does not."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    class PolicyEmbeddings(DeterministicFakeEmbedding):
+        """Maps every WFH phrasing to the same vector, everything else by text."""
+
+        def embed_query(self, text):
+            return super().embed_query("wfh" if "work from home" in text.lower() or "wfh" in text.lower() else text)
+
+    now = [0.0]
+    cache = AnswerCache(PolicyEmbeddings(size=16), ttlSeconds=60, clock=lambda: now[0])
+    chain = _CountingChain()
+    cachedChain = with_answer_cache(chain, cache, indexVersion="v1")
+
+    first = cachedChain.invoke({"question": "What is WFH Policy?"})
+    assert first["cached"] is False and chain.calls == 1
+    assert cachedChain.invoke({"question": "  what is wfh policy "})["answer"] == first["answer"]
+    assert cachedChain.invoke({"question": "Can I work from home?"})["cached"] is True
+    assert chain.calls == 1
+
+    assert with_answer_cache(chain, cache, indexVersion="v2").invoke({"question": "What is WFH Policy?"})["cached"] is False
+    now[0] = 120.0
+    assert cachedChain.invoke({"question": "What is WFH Policy?"})["cached"] is False
+    assert chain.calls == 3
+    assert cache.stats()["exact_hits"] == 1 and cache.stats()["semantic_hits"] == 1
+
+
+class _FixedEmbeddings:
+    """Embeds each question as a unit vector at a chosen cosine similarity to the base question."""
+
+    def __init__(self, similarities):
+        self.similarities = similarities
+
+    def embed_query(self, text):
+        similarity = self.similarities[text]
+        return [similarity, float(np.sqrt(1.0 - similarity ** 2)), 0.0, 0.0]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def test_semantic_hits_follow_the_configured_threshold():
+    embeddings = _FixedEmbeddings({"base": 1.0, "above": 0.91, "at": 0.9, "below": 0.89})
+    cache = AnswerCache(embeddings, similarityThreshold=0.9)
+    cache.store("base", "v1", "base answer")
+    assert cache.lookup("above", "v1")[0] == "base answer"
+    assert cache.lookup("at", "v1")[0] == "base answer"
+    assert cache.lookup("below", "v1")[0] is None
+    assert cache.lookup("above", "v2")[0] is None  # another index version never sees v1 answers
+    assert cache.stats()["semantic_hits"] == 2 and cache.stats()["misses"] == 2
+
+    report = similarity_report(embeddings, [("base", "above")], [("base", "below"), ("base", "at")])
+    assert round(report["lowest_paraphrase"], 6) == 0.91 and round(report["highest_distinct"], 6) == 0.9
+    try:
+        AnswerCache(embeddings, similarityThreshold=1.5)
+        raise AssertionError("ValueError expected")
+    except ValueError:
+        pass
+
+
+def test_answer_cache_evicts_least_recently_used():
+    cache = AnswerCache(maxEntries=2)
+    cache.store("a", "v1", "A")
+    cache.store("b", "v1", "B")
+    assert cache.lookup("a", "v1")[0] == "A"
+    cache.store("c", "v1", "C")
+    assert cache.lookup("b", "v1")[0] is None
+    assert cache.lookup("a", "v1")[0] == "A"
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,238 @@
+"""
+Concurrent, rate-limit-aware embedding of large corpora into FAISS.
+
+FAISS.from_documents embeds the whole corpus in one synchronous sweep. Here chunks are
+packed into token-bounded batches that are embedded with bounded concurrency via
+aembed_documents. A 429 halves the allowed concurrency and the batch is retried with
+exponential backoff; successful batches slowly raise it again. Finished batches are
+added to the FAISS index in their original order as soon as every earlier batch is in,
+so the resulting index is identical to the serial path.
+
+abuild_faiss_concurrently is the API: await it from notebooks, servers and other async
+code. build_faiss_concurrently wraps it in asyncio.run for scripts, and so can't be
+called while an event loop is running.
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_TOKENS = 8000
+DEFAULT_MAX_BATCH_ITEMS = 256
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+def make_token_counter(modelName="text-embedding-ada-002"):
+    """Return a function counting tokens with tiktoken, or a chars/4 estimate without it."""
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(modelName)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # tiktoken missing, or its encoding file can't be downloaded (offline machine).
+        return lambda text: len(text) // 4 + 1
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def pack_batches(texts, countTokens, maxBatchTokens=DEFAULT_MAX_BATCH_TOKENS,
+                 maxBatchItems=DEFAULT_MAX_BATCH_ITEMS):
+    """Split texts into consecutive (start, end) index ranges that fit the token and item limits."""
+    batches = []
+    start = 0
+    batchTokens = 0
+    for position, text in enumerate(texts):
+        tokens = countTokens(text)
+        batchFull = position - start >= maxBatchItems or batchTokens + tokens > maxBatchTokens
+        if position > start and batchFull:
+            batches.append((start, position))
+            start = position
+            batchTokens = 0
+        batchTokens += tokens
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def is_rate_limit_error(error):
+    """True for OpenAI RateLimitError or any HTTP error carrying status 429."""
+    if type(error).__name__ == "RateLimitError":
+        return True
+    statusCode = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return statusCode == 429
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that halves on rate limiting and creeps back up on success."""
+
+    def __init__(self, maxConcurrency, increaseEvery=4):
+        self.maxConcurrency = maxConcurrency
+        self.limit = maxConcurrency
+        self.inFlight = 0
+        self.increaseEvery = increaseEvery
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.inFlight < self.limit)
+            self.inFlight += 1
+
+    async def release(self, rateLimited=False):
+        async with self._condition:
+            self.inFlight -= 1
+            if rateLimited:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.increaseEvery and self.limit < self.maxConcurrency:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+async def build_faiss_async(splitDocs, embeddings, maxConcurrency=DEFAULT_MAX_CONCURRENCY,
+                            maxBatchTokens=DEFAULT_MAX_BATCH_TOKENS, maxBatchItems=DEFAULT_MAX_BATCH_ITEMS,
+                            maxRetries=6, baseDelay=1.0, ids=None, onProgress=None, vectorstore=None):
+    """
+    Embed splitDocs concurrently and build a FAISS store identical to FAISS.from_documents.
+
+    Pass an existing vectorstore to append to it instead of creating a new one.
+    Returns (vectorstore, report). onProgress(report) is called after every batch lands in
+    the index; by default progress is logged.
+    """
+    texts = [doc.page_content for doc in splitDocs]
+    metadatas = [doc.metadata for doc in splitDocs]
+    countTokens = make_token_counter(getattr(embeddings, "model", None) or "text-embedding-ada-002")
+    batches = pack_batches(texts, countTokens, maxBatchTokens, maxBatchItems)
+    limiter = AdaptiveLimiter(maxConcurrency)
+    startTime = time.perf_counter()
+    report = {"chunks": len(texts), "batches": len(batches), "embedded_chunks": 0,
+              "rate_limited": 0, "elapsed_s": 0.0, "chunks_per_s": 0.0, "concurrency": maxConcurrency}
+    finished = {}
+    state = {"vectorstore": vectorstore, "nextBatch": 0}
+
+    async def embed_batch(batchNumber, start, end):
+        for attempt in range(maxRetries + 1):
+            await limiter.acquire()
+            try:
+                vectors = await embeddings.aembed_documents(texts[start:end])
+            except Exception as error:
+                if not is_rate_limit_error(error) or attempt == maxRetries:
+                    await limiter.release()
+                    raise
+                await limiter.release(rateLimited=True)
+                report["rate_limited"] += 1
+                delay = baseDelay * (2 ** attempt) * (0.5 + random.random())
+                logger.warning("Rate limited on batch %d, retrying in %.1fs (limit now %d)",
+                               batchNumber, delay, limiter.limit)
+                await asyncio.sleep(delay)
+                continue
+            await limiter.release()
+            finished[batchNumber] = vectors
+            flush_ready_batches()
+            return
+
+    def flush_ready_batches():
+        # Add batches strictly in order so index positions match the serial build.
+        while state["nextBatch"] in finished:
+            batchNumber = state["nextBatch"]
+            start, end = batches[batchNumber]
+            vectors = finished.pop(batchNumber)
+            textEmbeddings = list(zip(texts[start:end], vectors))
+            batchIds = ids[start:end] if ids is not None else None
+            if state["vectorstore"] is None:
+                state["vectorstore"] = FAISS.from_embeddings(textEmbeddings, embeddings,
+                                                             metadatas=metadatas[start:end], ids=batchIds)
+            else:
+                state["vectorstore"].add_embeddings(textEmbeddings, metadatas=metadatas[start:end], ids=batchIds)
+            state["nextBatch"] += 1
+            report["embedded_chunks"] += end - start
+            report["elapsed_s"] = time.perf_counter() - startTime
+            report["chunks_per_s"] = report["embedded_chunks"] / report["elapsed_s"] if report["elapsed_s"] else 0.0
+            report["concurrency"] = limiter.limit
+            if onProgress is not None:
+                onProgress(dict(report))
+            else:
+                logger.info("Embedded %d/%d chunks (%.1f chunks/s, concurrency %d, %d rate-limited)",
+                            report["embedded_chunks"], report["chunks"], report["chunks_per_s"],
+                            limiter.limit, report["rate_limited"])
+
+    await asyncio.gather(*(embed_batch(batchNumber, start, end)
+                           for batchNumber, (start, end) in enumerate(batches)))
+    return state["vectorstore"], report
+
+
+async def abuild_faiss_concurrently(splitDocs, embeddings, **kwargs):
+    """build_faiss_async with the FAISS.from_documents(splitDocs, embeddings) shape; prints a summary."""
+    vectorstore, report = await build_faiss_async(splitDocs, embeddings, **kwargs)
+    print(f"Embedded {report['embedded_chunks']} chunks in {report['batches']} batches, "
+          f"{report['elapsed_s']:.1f}s ({report['chunks_per_s']:.1f} chunks/s, "
+          f"{report['rate_limited']} rate-limited retries)")
+    return vectorstore
+
+
+def build_faiss_concurrently(splitDocs, embeddings, **kwargs):
+    """Synchronous abuild_faiss_concurrently for scripts; from async code, await that instead."""
+    return asyncio.run(abuild_faiss_concurrently(splitDocs, embeddings, **kwargs))
+
+
+class _FlakyEmbeddings(DeterministicFakeEmbedding):
+    """Fake embeddings whose first few async calls fail with a 429."""
+
+    failuresLeft: int = 2
+
+    async def aembed_documents(self, texts):
+        if self.failuresLeft > 0:
+            self.failuresLeft -= 1
+            error = RuntimeError("Too Many Requests")
+            error.status_code = 429
+            raise error
+        await asyncio.sleep(random.random() / 100)
+        return self.embed_documents(texts)
+
+
+def test_build_faiss_async_matches_serial_build():
+    """Concurrent batches with 429 retries produce exactly the serial FAISS index."""
+    import numpy as np
+    from langchain_core.documents import Document
+
+    splitDocs = [Document(page_content=f"Policy chunk number {n} " * (n % 7 + 1), metadata={"n": n})
+                 for n in range(50)]
+    embeddings = _FlakyEmbeddings(size=16)
+    ids = [f"chunk-{n}" for n in range(50)]
+    serial = FAISS.from_documents(splitDocs, embeddings, ids=ids)
+    progress = []
+    concurrent, report = asyncio.run(build_faiss_async(splitDocs, embeddings, maxConcurrency=4, maxBatchTokens=60,
+                                                       baseDelay=0.001, ids=ids, onProgress=progress.append))
+    assert report["rate_limited"] == 2 and report["batches"] > 1
+    assert [p["embedded_chunks"] for p in progress] == sorted(p["embedded_chunks"] for p in progress)
+    assert np.array_equal(serial.index.reconstruct_n(0, 50), concurrent.index.reconstruct_n(0, 50))
+    assert serial.index_to_docstore_id == concurrent.index_to_docstore_id
+    assert serial.docstore._dict == concurrent.docstore._dict
+
+
+def test_abuild_faiss_concurrently_can_be_awaited_in_a_running_loop():
+    from langchain_core.documents import Document
+
+    splitDocs = [Document(page_content=f"Leave policy clause {n}") for n in range(10)]
+
+    async def build():
+        return await abuild_faiss_concurrently(splitDocs, DeterministicFakeEmbedding(size=8), maxBatchItems=3)
+
+    assert asyncio.run(build()).index.ntotal == 10
+
+
+def test_pack_batches_respects_token_budget():
+    """Batches never exceed the token budget unless a single text is larger than it."""
+    texts = ["a" * 40, "b" * 40, "c" * 400, "d" * 4]
+    batches = pack_batches(texts, lambda text: len(text) // 4, maxBatchTokens=25)
+    assert batches == [(0, 2), (2, 3), (3, 4)]
@@ -0,0 +1,235 @@
+"""
+Batch question answering for the LangGraph RAG graph.
+
+    python batch_qa.py questions.jsonl answers.jsonl --concurrency 8
+
+Questions come from JSONL ({"id": ..., "question": ...} per line) or CSV (id,question
+columns); a missing id defaults to the line number. The compiled graph runs through
+batch_as_completed (or abatch_as_completed with --async) with max_concurrency set, and
+every answer is appended to the output JSONL as soon as it completes, together with its
+latency:
+
+    {"id": "17", "question": "...", "answer": "...", "latency_ms": 812.4}
+
+Re-running with the same output file resumes: ids that already have an answer are
+skipped. Items that failed are written with an "error" field and retried on the next run.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import threading
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+DEFAULT_CONCURRENCY = 8
+
+
+def read_questions(path):
+    """List of {"id", "question"} dicts from a .jsonl or .csv file."""
+    items = []
+    with open(path, newline="", encoding="utf-8") as inputFile:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(inputFile)
+        else:
+            rows = (json.loads(line) for line in inputFile if line.strip())
+        for lineNumber, row in enumerate(rows, start=1):
+            # Only a missing id falls back to the line number; 0 and "" are ids like any other.
+            itemId = lineNumber if row.get("id") is None else row["id"]
+            items.append({"id": str(itemId), "question": row["question"]})
+    return items
+
+
+def load_answered_ids(outputPath):
+    """Ids that already have an answer in outputPath (a torn last line from a crash is ignored)."""
+    answered = set()
+    if not os.path.exists(outputPath):
+        return answered
+    with open(outputPath, encoding="utf-8") as outputFile:
+        for line in outputFile:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "answer" in record:
+                answered.add(record["id"])
+    return answered
+
+
+def open_output(outputPath):
+    """Open outputPath for appending, starting on a fresh line if a crash left a torn record."""
+    outputFile = open(outputPath, "a+", encoding="utf-8")
+    if outputFile.tell() > 0:
+        outputFile.seek(outputFile.tell() - 1)
+        if outputFile.read(1) != "\n":
+            outputFile.write("\n")
+    return outputFile
+
+
+def timed(chain):
+    """Wrap chain so each result carries its own latency (batch_as_completed doesn't report it)."""
+    def run(inputs):
+        startTime = time.perf_counter()
+        result = chain.invoke(inputs)
+        return result, (time.perf_counter() - startTime) * 1000
+
+    async def arun(inputs):
+        startTime = time.perf_counter()
+        result = await chain.ainvoke(inputs)
+        return result, (time.perf_counter() - startTime) * 1000
+
+    return RunnableLambda(run, afunc=arun, name="timed_chain")
+
+
+def _record(item, outcome):
+    if isinstance(outcome, Exception):
+        return {"id": item["id"], "question": item["question"], "error": f"{type(outcome).__name__}: {outcome}"}
+    result, latencyMs = outcome
+    answer = result["answer"] if isinstance(result, dict) else result
+    return {"id": item["id"], "question": item["question"], "answer": answer, "latency_ms": round(latencyMs, 1)}
+
+
+def _pending(items, outputPath):
+    answered = load_answered_ids(outputPath)
+    seen = set()
+    pending = []
+    for item in items:
+        if item["id"] not in answered and item["id"] not in seen:
+            seen.add(item["id"])
+            pending.append(item)
+    return pending
+
+
+def _summary(records, skipped, startTime):
+    elapsed = time.perf_counter() - startTime
+    answered = [record for record in records if "answer" in record]
+    latencies = sorted(record["latency_ms"] for record in answered)
+    return {
+        "answered": len(answered),
+        "failed": len(records) - len(answered),
+        "skipped": skipped,
+        "seconds": round(elapsed, 2),
+        "questions_per_second": round(len(records) / elapsed, 2) if elapsed else 0.0,
+        "p50_latency_ms": latencies[len(latencies) // 2] if latencies else None,
+    }
+
+
+def run_batch(chain, items, outputPath, maxConcurrency=DEFAULT_CONCURRENCY):
+    """Answer every not-yet-answered item with up to maxConcurrency graph runs in flight."""
+    pending = _pending(items, outputPath)
+    startTime = time.perf_counter()
+    records = []
+    with open_output(outputPath) as outputFile:
+        inputs = [{"question": item["question"]} for item in pending]
+        for position, outcome in timed(chain).batch_as_completed(
+                inputs, config={"max_concurrency": maxConcurrency}, return_exceptions=True):
+            records.append(_record(pending[position], outcome))
+            outputFile.write(json.dumps(records[-1]) + "\n")
+            outputFile.flush()
+    return _summary(records, len(items) - len(pending), startTime)
+
+
+async def arun_batch(chain, items, outputPath, maxConcurrency=DEFAULT_CONCURRENCY):
+    """run_batch on the event loop via abatch_as_completed."""
+    pending = _pending(items, outputPath)
+    startTime = time.perf_counter()
+    records = []
+    with open_output(outputPath) as outputFile:
+        inputs = [{"question": item["question"]} for item in pending]
+        async for position, outcome in timed(chain).abatch_as_completed(
+                inputs, config={"max_concurrency": maxConcurrency}, return_exceptions=True):
+            records.append(_record(pending[position], outcome))
+            outputFile.write(json.dumps(records[-1]) + "\n")
+            outputFile.flush()
+    return _summary(records, len(items) - len(pending), startTime)
+
+
+def main():
+    from rag_langgraph import build_langgraph_chain, create_cached_retriever, defaultPdfPath, openaiApiKey
+
+    parser = argparse.ArgumentParser(description="Answer a file of policy questions with the LangGraph RAG graph.")
+    parser.add_argument("questions", help="questions as .jsonl ({\"id\", \"question\"}) or .csv (id,question)")
+    parser.add_argument("output", help="answers .jsonl; re-running with the same file resumes")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="graph runs in flight")
+    parser.add_argument("--pdf", default=os.getenv("POLICY_PDF_PATH", defaultPdfPath), help="policy PDF, directory or glob")
+    parser.add_argument("--async", dest="useAsync", action="store_true", help="use abatch_as_completed")
+    args = parser.parse_args()
+
+    chain = build_langgraph_chain(create_cached_retriever(args.pdf, incremental=True), openaiApiKey)
+    items = read_questions(args.questions)
+    if args.useAsync:
+        summary = asyncio.run(arun_batch(chain, items, args.output, args.concurrency))
+    else:
+        summary = run_batch(chain, items, args.output, args.concurrency)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
+
+
+class _SlowFakeGraph:
+    """Stand-in for the compiled graph: sleeps, tracks concurrency and fails on request."""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.inFlight = 0
+        self.maxInFlight = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, inputs):
+        with self._lock:
+            self.calls += 1
+            self.inFlight += 1
+            self.maxInFlight = max(self.maxInFlight, self.inFlight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.inFlight -= 1
+        if "boom" in inputs["question"]:
+            raise RuntimeError("LLM timeout")
+        return {"question": inputs["question"], "answer": inputs["question"].upper()}
+
+    async def ainvoke(self, inputs):
+        return await asyncio.to_thread(self.invoke, inputs)
+
+
+def test_run_batch_is_bounded_and_resumes(tmp_path):
+    """Concurrency stays under the limit, failures are retried and answered ids are skipped."""
+    questionsPath = tmp_path / "questions.csv"
+    questionsPath.write_text("id,question\n" + "".join(f"{n},question {n}\n" for n in range(20)) + "20,boom\n")
+    outputPath = str(tmp_path / "answers.jsonl")
+    items = read_questions(str(questionsPath))
+
+    graph = _SlowFakeGraph()
+    summary = run_batch(graph, items, outputPath, maxConcurrency=4)
+    assert summary["answered"] == 20 and summary["failed"] == 1
+    assert 1 < graph.maxInFlight <= 4
+    records = [json.loads(line) for line in open(outputPath)]
+    assert {record["id"] for record in records if "answer" in record} == {str(n) for n in range(20)}
+    assert all(record["latency_ms"] >= 20 for record in records if "answer" in record)
+
+    with open(outputPath, "a") as outputFile:
+        outputFile.write('{"id": "torn')  # crash mid-write
+    resumed = _SlowFakeGraph()
+    summary = asyncio.run(arun_batch(resumed, items, outputPath, maxConcurrency=4))
+    assert resumed.calls == 1 and summary["skipped"] == 20
+    assert json.loads(open(outputPath).read().splitlines()[-1])["id"] == "20"
+
+
+def test_read_questions_jsonl_defaults_ids_to_line_numbers(tmp_path):
+    questionsPath = tmp_path / "questions.jsonl"
+    questionsPath.write_text('{"question": "What is WFH Policy?"}\n\n{"id": "leave", "question": "What is the leave policy?"}\n')
+    assert read_questions(str(questionsPath)) == [
+        {"id": "1", "question": "What is WFH Policy?"},
+        {"id": "leave", "question": "What is the leave policy?"},
+    ]
+
+
+def test_read_questions_keeps_falsy_ids(tmp_path):
+    questionsPath = tmp_path / "questions.jsonl"
+    questionsPath.write_text('{"id": 0, "question": "a"}\n{"id": "", "question": "b"}\n{"id": null, "question": "c"}\n')
+    assert [item["id"] for item in read_questions(str(questionsPath))] == ["0", "", "3"]
@@ -0,0 +1,252 @@
+"""
+Context assembly between retrieval and generation.
+
+The splitter overlaps neighbouring chunks by chunk_overlap characters, so the top-k
+hits for a question often repeat the same sentences, and every repeated token is paid
+for in prompt latency. pack_documents turns the ranked hits into a smaller context:
+
+    1. hits from the same page whose start_index/end_index ranges overlap or touch are
+       merged into one block (the overlap is kept once)
+    2. blocks that are near-duplicates of a better-ranked block are dropped
+       (word 5-gram Jaccard similarity >= duplicateThreshold)
+    3. blocks are packed best-first into tokenBudget tokens; a best-ranked block that
+       alone exceeds the budget is cut to fit instead of being dropped
+
+A block's rank is the best rank of the hits it contains. The report gives the prompt
+tokens before and after, so tokens_saved can be logged per question. PackingRetriever
+applies the same stage to any retriever, e.g. the one behind a RetrievalQA "stuff" chain.
+"""
+
+import logging
+import re
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from batch_embedder import make_token_counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 1500
+DEFAULT_DUPLICATE_THRESHOLD = 0.9
+SHINGLE_SIZE = 5
+# Consecutive chunks that don't overlap are separated only by the whitespace the splitter stripped.
+MAX_ADJACENT_GAP = 2
+
+
+def _span(doc):
+    start = doc.metadata.get("start_index")
+    if start is None or start < 0:
+        return None
+    return start, doc.metadata.get("end_index", start + len(doc.page_content))
+
+
+def merge_overlapping(docs):
+    """
+    Merge ranked hits whose page offsets overlap or touch; return [(rank, Document)].
+
+    Hits without offsets (or from different pages) pass through unchanged.
+    """
+    blocks = []
+    byPage = {}
+    for rank, doc in enumerate(docs):
+        span = _span(doc)
+        if span is None:
+            blocks.append((rank, doc))
+        else:
+            byPage.setdefault((doc.metadata.get("source"), doc.metadata.get("page")), []).append((span, rank, doc))
+
+    for hits in byPage.values():
+        hits.sort(key=lambda hit: hit[0])
+        (start, end), bestRank, first = hits[0]
+        text = first.page_content
+        for (hitStart, hitEnd), rank, doc in hits[1:]:
+            if hitStart - end > MAX_ADJACENT_GAP:
+                blocks.append((bestRank, _block(first, text, start, end)))
+                (start, end), bestRank, first, text = (hitStart, hitEnd), rank, doc, doc.page_content
+                continue
+            if hitEnd > end:
+                # Keep the text we already have and append only the part of this hit past our end.
+                overlap = end - hitStart
+                text = text + ("\n" if overlap < 0 else "") + doc.page_content[max(overlap, 0):]
+                end = hitEnd
+            bestRank = min(bestRank, rank)
+        blocks.append((bestRank, _block(first, text, start, end)))
+    return sorted(blocks, key=lambda block: block[0])
+
+
+def _block(first, text, start, end):
+    metadata = dict(first.metadata, start_index=start, end_index=end)
+    return Document(page_content=text, metadata=metadata)
+
+
+def _shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def drop_near_duplicates(blocks, duplicateThreshold=DEFAULT_DUPLICATE_THRESHOLD):
+    """Keep each block unless it is a near-duplicate of (or contained in) a better-ranked one."""
+    kept = []
+    keptShingles = []
+    for rank, doc in blocks:
+        shingles = _shingles(doc.page_content)
+        duplicate = False
+        for other in keptShingles:
+            shared = len(shingles & other)
+            if shared / len(shingles | other) >= duplicateThreshold or shared == len(shingles):
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append((rank, doc))
+            keptShingles.append(shingles)
+    return kept
+
+
+def truncate_to_tokens(doc, tokenBudget, countTokens):
+    """doc cut to the longest prefix (at a word boundary where possible) of at most tokenBudget tokens."""
+    text = doc.page_content
+    low, high = 0, len(text)
+    while low < high:  # longest prefix length that fits
+        middle = (low + high + 1) // 2
+        if countTokens(text[:middle]) <= tokenBudget:
+            low = middle
+        else:
+            high = middle - 1
+    cut = text[:low]
+    if low < len(text) and " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    metadata = {**doc.metadata, "truncated": True}
+    if _span(doc) is not None:
+        metadata["end_index"] = metadata["start_index"] + len(cut)
+    return Document(page_content=cut.rstrip(), metadata=metadata)
+
+
+def pack_documents(docs, tokenBudget=DEFAULT_CONTEXT_TOKEN_BUDGET, countTokens=None,
+                   duplicateThreshold=DEFAULT_DUPLICATE_THRESHOLD, separator="\n"):
+    """Merge, de-duplicate and budget ranked hits; return (documents best-first, report)."""
+    countTokens = countTokens or _default_counter()
+    blocks = drop_near_duplicates(merge_overlapping(docs), duplicateThreshold)
+    separatorTokens = countTokens(separator) if separator else 0
+
+    packed = []
+    usedTokens = 0
+    truncated = 0
+    for _, doc in blocks:
+        blockTokens = countTokens(doc.page_content) + (separatorTokens if packed else 0)
+        if usedTokens + blockTokens > tokenBudget and not packed:
+            # The best-ranked block alone is over budget: keep as much of it as fits.
+            logger.warning("Best-ranked context block has %d tokens, over the %d-token budget; truncating it",
+                           blockTokens, tokenBudget)
+            doc = truncate_to_tokens(doc, tokenBudget, countTokens)
+            blockTokens = countTokens(doc.page_content)
+            truncated += 1
+        elif usedTokens + blockTokens > tokenBudget:
+            logger.debug("Skipping a %d-token context block, %d tokens left", blockTokens, tokenBudget - usedTokens)
+            continue  # a lower-ranked but shorter block may still fit
+        if not doc.page_content:
+            continue
+        packed.append(doc)
+        usedTokens += blockTokens
+
+    tokensBefore = countTokens(separator.join(doc.page_content for doc in docs)) if docs else 0
+    report = {
+        "chunks": len(docs),
+        "blocks": len(packed),
+        "tokens_before": tokensBefore,
+        "tokens_after": usedTokens,
+        "tokens_saved": tokensBefore - usedTokens,
+        "truncated": truncated,
+    }
+    logger.info("Context: %d chunks -> %d blocks, %d -> %d tokens (%d saved)", report["chunks"], report["blocks"],
+                tokensBefore, usedTokens, report["tokens_saved"])
+    return packed, report
+
+
+def pack_context(docs, tokenBudget=DEFAULT_CONTEXT_TOKEN_BUDGET, countTokens=None, separator="\n"):
+    """pack_documents joined into one context string; returns (context, report)."""
+    packed, report = pack_documents(docs, tokenBudget, countTokens, separator=separator)
+    return separator.join(doc.page_content for doc in packed), report
+
+
+_counters = {}
+
+
+def _default_counter(modelName="gpt-4"):
+    if modelName not in _counters:
+        _counters[modelName] = make_token_counter(modelName)
+    return _counters[modelName]
+
+
+class PackingRetriever(BaseRetriever):
+    """Wrap a retriever so it returns merged, de-duplicated, token-budgeted documents."""
+
+    retriever: Any
+    tokenBudget: int = DEFAULT_CONTEXT_TOKEN_BUDGET
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        docs = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return pack_documents(docs, self.tokenBudget)[0]
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> list[Document]:
+        docs = await self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return pack_documents(docs, self.tokenBudget)[0]
+
+
+def _page_chunks(text, chunkSize=120, chunkOverlap=30):
+    from fast_splitter import FastRecursiveCharacterTextSplitter
+
+    splitter = FastRecursiveCharacterTextSplitter(chunk_size=chunkSize, chunk_overlap=chunkOverlap)
+    return splitter.create_documents([text], [{"source": "policy.pdf", "page": 0}])
+
+
+POLICY_PAGE = (
+    "Work from home. Employees may work from home two days a week with manager approval. "
+    "Requests must be raised a day in advance in the HR portal. Employees whose commute is "
+    "longer than ninety minutes may work from home on any day of heavy traffic. Leave. "
+    "Employees get twenty days of annual leave and ten days of sick leave every year."
+)
+
+
+def test_overlapping_hits_merge_back_into_the_page_text():
+    """Adjacent overlapping chunks become one block equal to the page span, repeated text kept once."""
+    chunks = _page_chunks(POLICY_PAGE)
+    assert len(chunks) >= 3
+    hits = [chunks[1], chunks[0], chunks[2]]
+    packed, report = pack_documents(hits, tokenBudget=10_000, countTokens=len)
+    assert len(packed) == 1
+    block = packed[0]
+    assert block.page_content == POLICY_PAGE[block.metadata["start_index"]:block.metadata["end_index"]]
+    assert report["tokens_saved"] > 0 and report["tokens_after"] == len(block.page_content)
+
+
+def test_duplicates_dropped_and_budget_respected():
+    """Exact and contained duplicates go; blocks are packed best-first into the budget."""
+    chunks = _page_chunks(POLICY_PAGE)
+    copy = Document(page_content=chunks[0].page_content, metadata={"source": "copy.pdf"})
+    other = Document(page_content="Travel. Book flights through the company portal.", metadata={"source": "travel.pdf"})
+    tokenBudget = len(chunks[0].page_content) + 1 + len(other.page_content)
+    assert len(chunks[-1].page_content) > len(other.page_content)
+    packed, report = pack_documents([chunks[0], copy, chunks[-1], other], tokenBudget=tokenBudget, countTokens=len)
+    texts = [doc.page_content for doc in packed]
+    assert texts[0] == chunks[0].page_content
+    assert copy.page_content not in texts[1:]
+    assert other.page_content in texts and chunks[-1].page_content not in texts
+    assert report["tokens_after"] == tokenBudget
+
+
+def test_over_budget_top_block_is_truncated_not_dropped():
+    """The best hit survives (cut to the budget) instead of being replaced by a worse one."""
+    top = Document(page_content=POLICY_PAGE, metadata={"source": "policy.pdf", "page": 0, "start_index": 0})
+    other = Document(page_content="Travel. Book flights through the company portal.", metadata={"source": "travel.pdf"})
+    packed, report = pack_documents([top, other], tokenBudget=60, countTokens=len)
+    assert report["truncated"] == 1 and report["tokens_after"] <= 60
+    assert packed[0].metadata["truncated"] and POLICY_PAGE.startswith(packed[0].page_content)
+    assert packed[0].page_content == "Work from home. Employees may work from home two days a"
+    assert packed[0].metadata["end_index"] == len(packed[0].page_content)
+    assert other not in packed  # the cut block already fills the budget
@@ -0,0 +1,372 @@
+"""
+Shared on-disk embedding cache.
+
+CachedEmbeddings wraps any LangChain embeddings object (normally OpenAIEmbeddings) and
+remembers every vector it has seen, keyed by a hash of the model name and the text.
+Vectors live in one append-only file of fixed-layout records
+
+    16-byte key | uint32 dim | dim x float32
+
+which is memory-mapped, so a cache hit is a copy of a slice of the mapping with no
+deserialization. Writers append under a file lock (fcntl.flock, or msvcrt.locking on
+Windows) and readers pick up new records by re-scanning only the tail, so several
+scripts and notebooks can share one cache. When the file grows past maxBytes it is
+compacted down to the newest entries.
+
+Windows cannot truncate or replace a file while any process has it mapped. Each
+process closes its own mappings before doing either. If another process still has the
+file mapped, compaction is deferred to a later write (the file stays over maxBytes
+until then), and a torn record from a crashed writer blocks appends until it can be
+dropped. Lookups keep working either way.
+"""
+
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from index_store import embedding_model_name
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_EMBEDDING_CACHE_DIR = os.getenv(
+    "EMBEDDING_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "genaicoding", "embeddings"))
+DEFAULT_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+logger = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct("<16sI")
+# After eviction the file is trimmed to this fraction of maxBytes, so we don't compact on every append.
+COMPACT_TO_RATIO = 0.75
+
+
+def lock_file(lockFile):
+    """Block until this process holds the exclusive lock on lockFile."""
+    if fcntl is not None:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        return
+    lockFile.seek(0)
+    while True:
+        try:
+            msvcrt.locking(lockFile.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:  # LK_LOCK gives up after ~10 s; keep waiting
+            time.sleep(0.1)
+
+
+def unlock_file(lockFile):
+    if fcntl is not None:
+        fcntl.flock(lockFile, fcntl.LOCK_UN)
+        return
+    lockFile.seek(0)
+    msvcrt.locking(lockFile.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class VectorCacheFile:
+    """Append-only, memory-mapped float32 vector file with an in-memory key index."""
+
+    def __init__(self, path, maxBytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.maxBytes = maxBytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        open(path, "ab").close()
+        self._lockFile = open(path + ".lock", "a+b")
+        self._threadLock = threading.RLock()
+        self._offsets = {}
+        self._scannedBytes = 0
+        self._inode = None
+        self._mmap = None
+        self.refresh()
+
+    @contextmanager
+    def _write_lock(self):
+        with self._threadLock:
+            lock_file(self._lockFile)
+            try:
+                yield
+            finally:
+                unlock_file(self._lockFile)
+
+    def _close_mmap(self):
+        # get() hands out copies, so nothing else references the mapping.
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def refresh(self):
+        """Map any records appended (or a compacted file written) since the last scan."""
+        with self._threadLock:
+            fileStat = os.stat(self.path)
+            if fileStat.st_ino != self._inode:
+                self._offsets = {}
+                self._scannedBytes = 0
+                self._inode = fileStat.st_ino
+                self._close_mmap()
+            if fileStat.st_size == 0 or fileStat.st_size == self._scannedBytes:
+                return
+            self._close_mmap()
+            with open(self.path, "rb") as vectorFile:
+                self._mmap = mmap.mmap(vectorFile.fileno(), 0, access=mmap.ACCESS_READ)
+            position = self._scannedBytes
+            mappedSize = len(self._mmap)
+            while position + RECORD_HEADER.size <= mappedSize:
+                key, dim = RECORD_HEADER.unpack_from(self._mmap, position)
+                end = position + RECORD_HEADER.size + dim * 4
+                if end > mappedSize:
+                    break  # a writer is mid-append (or crashed); pick it up next time
+                self._offsets[key] = (position + RECORD_HEADER.size, dim)
+                position = end
+            self._scannedBytes = position
+
+    def get(self, key):
+        """Return a copy of the cached vector as float32, or None."""
+        with self._threadLock:
+            entry = self._offsets.get(key)
+            if entry is None:
+                self.refresh()
+                entry = self._offsets.get(key)
+            if entry is None:
+                return None
+            offset, dim = entry
+            # A copy, not a view: an exported buffer would keep the mapping (and on Windows the file) pinned.
+            return np.frombuffer(self._mmap, dtype=np.float32, count=dim, offset=offset).copy()
+
+    def put_many(self, items):
+        """Append (key, vector) pairs that are not cached yet, then evict if over budget."""
+        with self._write_lock():
+            self.refresh()
+            if os.path.getsize(self.path) > self._scannedBytes:
+                # Drop a torn record left by a writer that died mid-append.
+                self._close_mmap()
+                try:
+                    os.truncate(self.path, self._scannedBytes)
+                except PermissionError:  # Windows: another process has the file mapped
+                    logger.warning("Embedding cache %s has a torn record and is mapped elsewhere; "
+                                   "not caching until it can be dropped", self.path)
+                    return
+                finally:
+                    self._inode = None  # remap on the next refresh
+                self.refresh()
+            records = []
+            for key, vector in items:
+                if key in self._offsets:
+                    continue
+                vectorBytes = np.asarray(vector, dtype=np.float32).tobytes()
+                records.append(RECORD_HEADER.pack(key, len(vectorBytes) // 4) + vectorBytes)
+            if records:
+                with open(self.path, "ab") as vectorFile:
+                    vectorFile.write(b"".join(records))
+                self.refresh()
+            if self._scannedBytes > self.maxBytes:
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the file keeping only the newest records that fit in the size budget."""
+        budget = int(self.maxBytes * COMPACT_TO_RATIO)
+        records = sorted(self._offsets.items(), key=lambda item: item[1][0], reverse=True)
+        kept = []
+        keptBytes = 0
+        for key, (offset, dim) in records:
+            recordSize = RECORD_HEADER.size + dim * 4
+            if keptBytes + recordSize > budget:
+                break
+            kept.append((key, offset, dim))
+            keptBytes += recordSize
+        tmpPath = self.path + ".compact"
+        with open(tmpPath, "wb") as compactFile:
+            for key, offset, dim in reversed(kept):
+                compactFile.write(RECORD_HEADER.pack(key, dim))
+                compactFile.write(self._mmap[offset:offset + dim * 4])
+        self._close_mmap()
+        try:
+            os.replace(tmpPath, self.path)
+        except PermissionError:  # Windows: another process has the file mapped
+            logger.info("Embedding cache %s is mapped by another process; compaction deferred", self.path)
+            os.remove(tmpPath)
+        self._inode = None
+        self.refresh()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def size_bytes(self):
+        return self._scannedBytes
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated texts from the shared vector file."""
+
+    def __init__(self, embeddings, cacheDir=DEFAULT_EMBEDDING_CACHE_DIR, maxBytes=DEFAULT_MAX_BYTES):
+        self.embeddings = embeddings
+        # Expose the wrapped model name so index cache keys don't change when caching is enabled.
+        self.model = embedding_model_name(embeddings)
+        self.store = VectorCacheFile(os.path.join(cacheDir, "vectors.bin"), maxBytes)
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).digest()[:16]
+
+    def _lookup(self, texts):
+        """Fill in cached vectors; return them plus the misses grouped by key."""
+        vectors = [None] * len(texts)
+        missing = {}
+        for position, text in enumerate(texts):
+            key = self._key(text)
+            cached = self.store.get(key)
+            if cached is not None:
+                vectors[position] = cached.tolist()
+                self.hits += 1
+            else:
+                missing.setdefault(key, (text, []))[1].append(position)
+                self.misses += 1
+        return vectors, missing
+
+    def _store_misses(self, vectors, missing, newVectors):
+        self.store.put_many(zip(missing.keys(), newVectors))
+        for (text, positions), vector in zip(missing.values(), newVectors):
+            # Round through float32 so a miss returns exactly what a later hit will.
+            vector = np.asarray(vector, dtype=np.float32).tolist()
+            for position in positions:
+                vectors[position] = vector
+        return vectors
+
+    def embed_documents(self, texts):
+        vectors, missing = self._lookup(texts)
+        if missing:
+            newVectors = self.embeddings.embed_documents([text for text, _ in missing.values()])
+            self._store_misses(vectors, missing, newVectors)
+        return vectors
+
+    async def aembed_documents(self, texts):
+        vectors, missing = self._lookup(texts)
+        if missing:
+            newVectors = await self.embeddings.aembed_documents([text for text, _ in missing.values()])
+            # The append takes the file lock and writes; keep that off the event loop.
+            await asyncio.to_thread(self._store_misses, vectors, missing, newVectors)
+        return vectors
+
+    def _cached_query(self, text):
+        key = self._key(text)
+        cached = self.store.get(key)
+        if cached is not None:
+            self.hits += 1
+            return key, cached.tolist()
+        self.misses += 1
+        return key, None
+
+    def _store_query(self, key, vector):
+        self.store.put_many([(key, vector)])
+        return np.asarray(vector, dtype=np.float32).tolist()
+
+    def embed_query(self, text):
+        key, cached = self._cached_query(text)
+        if cached is not None:
+            return cached
+        return self._store_query(key, self.embeddings.embed_query(text))
+
+    async def aembed_query(self, text):
+        key, cached = self._cached_query(text)
+        if cached is not None:
+            return cached
+        vector = await self.embeddings.aembed_query(text)
+        return await asyncio.to_thread(self._store_query, key, vector)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.store),
+            "bytes": self.store.size_bytes(),
+        }
+
+
+class _CountingEmbeddings(Embeddings):
+    """Fake embeddings that count how many texts reached the 'API'."""
+
+    model = "counting-fake"
+
+    def __init__(self):
+        self.inner = DeterministicFakeEmbedding(size=8)
+        self.embeddedTexts = 0
+
+    def embed_documents(self, texts):
+        self.embeddedTexts += len(texts)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        self.embeddedTexts += 1
+        return self.inner.embed_query(text)
+
+
+def test_cached_embeddings_hits_across_instances(tmp_path):
+    """A second wrapper on the same directory (e.g. another script) gets hits without API calls."""
+    texts = ["WFH policy", "Leave policy", "WFH policy"]
+    firstInner = _CountingEmbeddings()
+    first = CachedEmbeddings(firstInner, cacheDir=str(tmp_path))
+    firstVectors = first.embed_documents(texts)
+    assert firstInner.embeddedTexts == 2
+    assert firstVectors[0] == firstVectors[2]
+
+    secondInner = _CountingEmbeddings()
+    second = CachedEmbeddings(secondInner, cacheDir=str(tmp_path))
+    assert second.embed_documents(texts) == firstVectors
+    assert second.embed_query("Leave policy") == firstVectors[1]
+    assert asyncio.run(second.aembed_query("WFH policy")) == firstVectors[0]
+    assert secondInner.embeddedTexts == 0
+    assert second.stats()["hits"] == 5 and second.stats()["misses"] == 0
+
+    missVector = asyncio.run(second.aembed_query("Remote work"))  # stored from a worker thread
+    assert CachedEmbeddings(_CountingEmbeddings(), cacheDir=str(tmp_path)).embed_query("Remote work") == missVector
+
+
+def test_vector_cache_file_evicts_oldest_when_over_budget(tmp_path):
+    """Going past maxBytes compacts the file down to the newest entries."""
+    recordSize = RECORD_HEADER.size + 8 * 4
+    store = VectorCacheFile(str(tmp_path / "vectors.bin"), maxBytes=recordSize * 10)
+    for n in range(12):
+        store.put_many([(f"key-{n:012d}".encode(), [float(n)] * 8)])
+    assert store.size_bytes() <= recordSize * 10
+    assert store.get(b"key-000000000000") is None
+    assert store.get(b"key-000000000011")[0] == 11.0
+
+
+def _append_from_another_process(cacheDir, start, count):
+    store = VectorCacheFile(os.path.join(cacheDir, "vectors.bin"))
+    for n in range(start, start + count):
+        store.put_many([(f"key-{n:012d}".encode(), [float(n)] * 8)])
+
+
+def test_processes_append_under_the_file_lock_and_maps_are_released(tmp_path):
+    """Concurrent writers in other processes never interleave records; compaction closes our maps."""
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    writers = [context.Process(target=_append_from_another_process, args=(str(tmp_path), start, 50))
+               for start in (0, 1000)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    recordSize = RECORD_HEADER.size + 8 * 4
+    store = VectorCacheFile(str(tmp_path / "vectors.bin"), maxBytes=recordSize * 120)
+    assert len(store) == 100 and store.size_bytes() == 100 * recordSize
+    assert store.get(b"key-000000001049")[0] == 1049.0
+
+    oldMap = store._mmap
+    store.put_many([(f"key-{n:012d}".encode(), [float(n)] * 8) for n in range(2000, 2030)])
+    assert oldMap.closed and len(store) == 90  # compacted to 75% of 120 records
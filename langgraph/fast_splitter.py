@@ -0,0 +1,207 @@
+"""
+Drop-in replacement for RecursiveCharacterTextSplitter that works on offsets.
+
+The stock splitter re-runs a regex search and re.split for every recursion level and
+rebuilds strings with join() and strip() while merging. This version finds the
+separator positions of a page once (one vectorised scan per separator), then recurses
+and merges on (start, end) offsets into the original text; a chunk's string is sliced
+out exactly once, when it is emitted. Chunk boundaries are identical to RecursiveCharacterTextSplitter for the
+default configuration (plain-string separators, keep_separator=True, len() as the
+length function, whitespace stripping); any other configuration falls back to the
+stock implementation.
+
+Every chunk produced by create_documents/split_documents carries "start_index" and
+"end_index" character offsets into its source page.
+
+Run this file directly to benchmark it against the stock splitter on the repo's PDFs.
+"""
+
+import bisect
+import copy
+import os
+import random
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+
+IMMUTABLE_METADATA_TYPES = (str, int, float, bool, type(None))
+
+
+class FastRecursiveCharacterTextSplitter(RecursiveCharacterTextSplitter):
+    """RecursiveCharacterTextSplitter with precomputed separator positions and offset metadata."""
+
+    def _offsets_supported(self):
+        return (self._length_function is len and not self._is_separator_regex
+                and self._keep_separator in (True, "start") and self._strip_whitespace)
+
+    def split_text(self, text):
+        if not self._offsets_supported():
+            return super().split_text(text)
+        return [text[start:end] for start, end in self.split_text_with_offsets(text)]
+
+    def split_text_with_offsets(self, text):
+        """Return (start, end) offsets of every chunk, in order."""
+        positions = {}
+        codepoints = []
+
+        def separator_positions(separator, start, end):
+            """Sorted start offsets of separator occurrences that lie fully inside text[start:end]."""
+            if len(separator) == 1:
+                # One vectorised scan per page; single characters can't overlap, so it's exact for any range.
+                if separator not in positions:
+                    if not codepoints:
+                        codepoints.append(np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32))
+                    positions[separator] = np.flatnonzero(codepoints[0] == ord(separator)).tolist()
+                found = positions[separator]
+                return found[bisect.bisect_left(found, start):bisect.bisect_left(found, end)]
+            # Multi-character separators are matched left to right like re.split does.
+            return find_all(text, separator, start, end)
+
+        chunks = []
+        self._split_range(text, 0, len(text), self._separators, separator_positions, chunks)
+        return chunks
+
+    def _split_range(self, text, start, end, separators, separator_positions, chunks):
+        newSeparators = []
+        cuts = None
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                break
+            found = separator_positions(candidate, start, end)
+            if found:
+                newSeparators = separators[i + 1:]
+                cuts = found
+                break
+
+        if cuts is None:
+            # Character-level split: every piece is one character long.
+            bounds = range(start, end + 1)
+        else:
+            # keep_separator=True: each piece starts at a separator occurrence; drop the empty leading piece.
+            bounds = ([start] if cuts[0] != start else []) + cuts + [end]
+
+        chunkSize = self._chunk_size
+        runStart = 0
+        for piece in range(len(bounds) - 1):
+            pieceStart, pieceEnd = bounds[piece], bounds[piece + 1]
+            if pieceEnd - pieceStart < chunkSize:
+                continue
+            if piece > runStart:
+                self._merge_bounds(text, bounds, runStart, piece, chunks)
+            if not newSeparators:
+                chunks.append((pieceStart, pieceEnd))
+            else:
+                self._split_range(text, pieceStart, pieceEnd, newSeparators, separator_positions, chunks)
+            runStart = piece + 1
+        if len(bounds) - 1 > runStart:
+            self._merge_bounds(text, bounds, runStart, len(bounds) - 1, chunks)
+
+    def _merge_bounds(self, text, bounds, first, last, chunks):
+        """
+        Offset version of TextSplitter._merge_splits for the contiguous pieces first..last-1.
+
+        Because the pieces are contiguous and the join separator is empty, the running
+        total is just bounds[i] - bounds[lo], so instead of walking piece by piece we
+        bisect straight to the next piece that overflows the chunk and to the first
+        piece that fits in the overlap.
+        """
+        chunkSize = self._chunk_size
+        chunkOverlap = self._chunk_overlap
+        lo = first
+        while True:
+            # First piece i whose end overflows a chunk starting at piece lo.
+            overflow = bisect.bisect_right(bounds, bounds[lo] + chunkSize, lo, last + 1) - 1
+            if overflow >= last:
+                break
+            self._emit_stripped(text, bounds[lo], bounds[overflow], chunks)
+            keepForOverlap = bisect.bisect_left(bounds, bounds[overflow] - chunkOverlap, lo, overflow)
+            keepForSize = bisect.bisect_left(bounds, bounds[overflow + 1] - chunkSize, lo, overflow)
+            lo = max(keepForOverlap, keepForSize)
+        self._emit_stripped(text, bounds[lo], bounds[last], chunks)
+
+    @staticmethod
+    def _emit_stripped(text, start, end, chunks):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            chunks.append((start, end))
+
+    def create_documents(self, texts, metadatas=None):
+        if not self._offsets_supported():
+            return super().create_documents(texts, metadatas)
+        metadatas = metadatas or [{}] * len(texts)
+        documents = []
+        for text, metadata in zip(texts, metadatas):
+            # PDF page metadata is flat strings and ints, so a shallow copy is as good as a deepcopy.
+            flat = all(isinstance(value, IMMUTABLE_METADATA_TYPES) for value in metadata.values())
+            for start, end in self.split_text_with_offsets(text):
+                chunkMetadata = dict(metadata) if flat else copy.deepcopy(metadata)
+                chunkMetadata["start_index"] = start
+                chunkMetadata["end_index"] = end
+                documents.append(Document(page_content=text[start:end], metadata=chunkMetadata))
+        return documents
+
+
+def find_all(text, separator, start, end):
+    """Non-overlapping occurrences of separator fully inside text[start:end], left to right."""
+    found = []
+    position = text.find(separator, start, end)
+    while position != -1:
+        found.append(position)
+        position = text.find(separator, position + len(separator), end)
+    return found
+
+
+LANGCHAIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "langchain")
+REPO_PDFS = [os.path.join(LANGCHAIN_DIR, "my_resume.pdf"),
+             os.path.join(LANGCHAIN_DIR, "Labs", "Lab3", "company_policy.pdf")]
+
+
+def test_fast_splitter_matches_recursive_splitter_on_repo_pdfs():
+    """Same chunk boundaries as the stock splitter on the PDFs shipped with the repo."""
+    from pdf_ingest import iter_pdf_pages
+
+    pages = [page for pdfPath in REPO_PDFS for page in iter_pdf_pages(pdfPath)]
+    stock = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50).split_documents(pages)
+    fast = FastRecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50).split_documents(pages)
+    assert [doc.page_content for doc in fast] == [doc.page_content for doc in stock]
+    pagesBySource = {(page.metadata["source"], page.metadata["page"]): page.page_content for page in pages}
+    for doc in fast:
+        pageText = pagesBySource[(doc.metadata["source"], doc.metadata["page"])]
+        assert pageText[doc.metadata["start_index"]:doc.metadata["end_index"]] == doc.page_content
+
+
+def test_fast_splitter_matches_recursive_splitter_on_random_text():
+    """Fuzz: runs of separators, long unbroken words and tiny chunk sizes all split identically."""
+    rng = random.Random(7)
+    alphabet = ["a", "b", "policy", " ", "  ", "\n", "\n\n", "\n\n\n", "x" * 40, "\t"]
+    for _ in range(300):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 200)))
+        chunkSize = rng.randint(1, 60)
+        chunkOverlap = rng.randint(0, chunkSize)
+        stock = RecursiveCharacterTextSplitter(chunk_size=chunkSize, chunk_overlap=chunkOverlap)
+        fast = FastRecursiveCharacterTextSplitter(chunk_size=chunkSize, chunk_overlap=chunkOverlap)
+        assert fast.split_text(text) == stock.split_text(text), (text, chunkSize, chunkOverlap)
+
+
+if __name__ == "__main__":
+    from pdf_ingest import iter_pdf_pages
+
+    pages = [page for pdfPath in REPO_PDFS for page in iter_pdf_pages(pdfPath)]
+    # Repeat the repo's pages so the timing isn't dominated by noise.
+    corpus = [Document(page_content=page.page_content, metadata=dict(page.metadata)) for page in pages * 200]
+    totalChars = sum(len(page.page_content) for page in corpus)
+    print(f"Corpus: {len(corpus)} pages, {totalChars / 1e6:.1f}M characters (repo PDFs x200)")
+    for name, splitter in [("RecursiveCharacterTextSplitter", RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)),
+                           ("FastRecursiveCharacterTextSplitter", FastRecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50))]:
+        bestTime = float("inf")
+        for _ in range(3):
+            startTime = time.perf_counter()
+            chunks = splitter.split_documents(corpus)
+            bestTime = min(bestTime, time.perf_counter() - startTime)
+        print(f"{name:>36}: {len(chunks)} chunks in {bestTime * 1000:.0f} ms ({totalChars / bestTime / 1e6:.1f}M chars/s)")
@@ -0,0 +1,244 @@
+"""
+Hybrid BM25 + vector retrieval over a FAISS store.
+
+Policy questions are keyword-heavy ("WFH policy", "leave policy"), and a pure embedding
+retriever has to call the embedding API before it can search at all. BM25Index is a
+compact in-memory inverted index (one int32 document array and one float32 term
+frequency array per term) built from the chunks already in the FAISS docstore, in the
+same position order as the FAISS index. HybridRetriever runs both searches and fuses the
+two rankings with reciprocal rank fusion (RRF):
+
+    score(chunk) = sum over rankings of 1 / (rrfK + rank)
+
+mode="lexical" skips the vector search, so the question never leaves the process;
+mode="vector" is the plain embedding retriever.
+
+The BM25 index is built at ingest time: index_store saves it as bm25.npz next to the
+FAISS files of every index it writes, and attaches it to the stores it loads (as
+vectorstore.bm25Index), so a warm start never re-tokenizes the corpus. Stores without
+one (built in memory, or saved before this) get it built from their docstore.
+"""
+
+import logging
+import math
+import re
+from typing import Any
+
+import faiss
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_MODES = ("hybrid", "lexical", "vector")
+BM25_FILE = "bm25.npz"
+DEFAULT_RRF_K = 60
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or our "
+    "should the this to we what when where which who will with you your".split())
+
+
+def tokenize(text):
+    """Lower-cased alphanumeric terms without stopwords."""
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of texts; search returns (position, score) pairs."""
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        postings = {}
+        docLengths = np.zeros(len(texts), dtype=np.float32)
+        for position, text in enumerate(texts):
+            terms = tokenize(text)
+            docLengths[position] = len(terms)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(position)
+                postings[term][1].append(count)
+
+        self.docCount = len(texts)
+        averageLength = float(docLengths.mean()) if len(texts) and docLengths.mean() > 0 else 1.0
+        # The length part of the BM25 denominator depends only on the document, so precompute it.
+        self._lengthNorm = k1 * (1 - b + b * docLengths / averageLength)
+        self.postings = {term: (np.array(positions, dtype=np.int32), np.array(counts, dtype=np.float32))
+                         for term, (positions, counts) in postings.items()}
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        """BM25 over the chunks in a FAISS store, in FAISS position order."""
+        return cls([vectorstore.docstore.search(vectorstore.index_to_docstore_id[position]).page_content
+                    for position in range(vectorstore.index.ntotal)])
+
+    def save(self, path):
+        """Write the index as flat numpy arrays (no pickle)."""
+        terms = list(self.postings)
+        offsets = np.cumsum([0] + [len(self.postings[term][0]) for term in terms], dtype=np.int64)
+        emptyInt, emptyFloat = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        np.savez(path, terms=np.array(terms, dtype=str), offsets=offsets,
+                 positions=np.concatenate([self.postings[term][0] for term in terms] or [emptyInt]),
+                 counts=np.concatenate([self.postings[term][1] for term in terms] or [emptyFloat]),
+                 lengthNorm=self._lengthNorm, params=np.array([self.k1, self.b, self.docCount], dtype=np.float64))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            index = cls.__new__(cls)
+            index.k1, index.b, docCount = arrays["params"].tolist()
+            index.docCount = int(docCount)
+            index._lengthNorm = arrays["lengthNorm"]
+            offsets, positions, counts = arrays["offsets"], arrays["positions"], arrays["counts"]
+            index.postings = {term: (positions[offsets[n]:offsets[n + 1]], counts[offsets[n]:offsets[n + 1]])
+                              for n, term in enumerate(arrays["terms"].tolist())}
+        return index
+
+    def idf(self, term):
+        documentFrequency = len(self.postings[term][0])
+        return math.log(1 + (self.docCount - documentFrequency + 0.5) / (documentFrequency + 0.5))
+
+    def search(self, query, k=4):
+        scores = np.zeros(self.docCount, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            positions, counts = self.postings[term]
+            scores[positions] += self.idf(term) * counts * (self.k1 + 1) / (counts + self._lengthNorm[positions])
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(position), float(scores[position])) for position in ranked]
+
+
+def reciprocal_rank_fusion(rankings, rrfK=DEFAULT_RRF_K):
+    """Fuse lists of positions (best first) into one list of positions, best first."""
+    fused = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking, start=1):
+            fused[position] = fused.get(position, 0.0) + 1.0 / (rrfK + rank)
+    return sorted(fused, key=lambda position: -fused[position])
+
+
+class HybridRetriever(BaseRetriever):
+    """Retriever over a FAISS store that fuses BM25 and embedding rankings."""
+
+    vectorstore: Any
+    bm25: Any = None
+    k: int = 4
+    fetchK: int = 20
+    mode: str = "hybrid"
+    rrfK: int = DEFAULT_RRF_K
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, mode="hybrid", **kwargs):
+        """Use the store's saved BM25 index (see index_store); build one only if it has none."""
+        bm25 = None
+        if mode != "vector":
+            bm25 = getattr(vectorstore, "bm25Index", None)
+            if bm25 is None or bm25.docCount != vectorstore.index.ntotal:
+                logger.info("No saved BM25 index for this store; building it from %d chunks", vectorstore.index.ntotal)
+                bm25 = BM25Index.from_vectorstore(vectorstore)
+        return cls(vectorstore=vectorstore, bm25=bm25, mode=mode, **kwargs)
+
+    @staticmethod
+    def _document_at(vectorstore, position):
+        return vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+
+    def _vector_positions(self, queryVector):
+        vector = np.array([queryVector], dtype=np.float32)
+        if self.vectorstore._normalize_L2:
+            faiss.normalize_L2(vector)
+        _, positions = self.vectorstore.index.search(vector, self.fetchK)
+        return [int(position) for position in positions[0] if position != -1]
+
+    def _fuse(self, query, vectorPositions):
+        if self.mode == "vector":
+            return [self._document_at(self.vectorstore, position) for position in vectorPositions[:self.k]]
+        lexicalPositions = [position for position, _ in self.bm25.search(query, self.fetchK)]
+        if self.mode == "lexical":
+            ranked = lexicalPositions
+        else:
+            ranked = reciprocal_rank_fusion([lexicalPositions, vectorPositions], self.rrfK)
+        return [self._document_at(self.vectorstore, position) for position in ranked[:self.k]]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        vectorPositions = []
+        if self.mode != "lexical":
+            vectorPositions = self._vector_positions(self.vectorstore.embedding_function.embed_query(query))
+        return self._fuse(query, vectorPositions)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> list[Document]:
+        vectorPositions = []
+        if self.mode != "lexical":
+            vectorPositions = self._vector_positions(await self.vectorstore.embedding_function.aembed_query(query))
+        return self._fuse(query, vectorPositions)
+
+
+def create_hybrid_retriever(vectorstore, mode="hybrid", k=4, fetchK=20):
+    """as_retriever() replacement; mode is "hybrid", "lexical" or "vector"."""
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"mode must be one of {RETRIEVAL_MODES}, got {mode!r}")
+    return HybridRetriever.from_vectorstore(vectorstore, mode=mode, k=k, fetchK=fetchK)
+
+
+POLICY_CHUNKS = [
+    "WFH policy: employees may work from home two days a week with manager approval.",
+    "Leave policy: employees get 20 days of annual leave and 10 days of sick leave.",
+    "Travel policy: book flights through the company portal at least two weeks ahead.",
+    "Office hours are 9 to 5; the office is closed on public holidays.",
+]
+
+
+def test_bm25_ranks_exact_policy_terms_first():
+    """Rare query terms dominate; stopwords and unknown terms are ignored."""
+    index = BM25Index(POLICY_CHUNKS)
+    assert index.search("What is the WFH policy?", k=1)[0][0] == 0
+    assert index.search("sick leave", k=2)[0][0] == 1
+    assert index.search("what is the", k=4) == []
+    assert len(index.search("policy", k=2)) == 2
+
+
+def test_lexical_mode_never_calls_the_embedder():
+    """mode="lexical" answers from the inverted index alone; hybrid still embeds the question."""
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    class CountingEmbeddings(DeterministicFakeEmbedding):
+        queries: int = 0
+
+        def embed_query(self, text):
+            self.queries += 1
+            return super().embed_query(text)
+
+    embeddings = CountingEmbeddings(size=16)
+    vectorstore = FAISS.from_texts(POLICY_CHUNKS, embeddings)
+    lexical = create_hybrid_retriever(vectorstore, mode="lexical", k=1)
+    assert lexical.invoke("leave policy")[0].page_content == POLICY_CHUNKS[1]
+    assert embeddings.queries == 0
+
+    hybrid = create_hybrid_retriever(vectorstore, mode="hybrid", k=2)
+    assert POLICY_CHUNKS[1] in [doc.page_content for doc in hybrid.invoke("leave policy")]
+    assert embeddings.queries == 1
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    """A chunk ranked well by both retrievers beats one ranked first by only one."""
+    assert reciprocal_rank_fusion([[1, 2, 3], [2, 4, 1]])[:2] == [2, 1]
+
+
+def test_bm25_index_round_trips_through_npz(tmp_path):
+    index = BM25Index(POLICY_CHUNKS)
+    path = str(tmp_path / BM25_FILE)
+    index.save(path)
+    loaded = BM25Index.load(path)
+    for query in ("WFH policy", "sick leave", "office holidays", "unknown"):
+        assert loaded.search(query, k=4) == index.search(query, k=4)
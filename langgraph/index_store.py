@@ -0,0 +1,310 @@
+"""
+Persistent FAISS index store for the RAG scripts.
+
+The saved index is keyed by a hash of the source PDF bytes, the splitter settings
+and the embedding model name. If an index for that key already exists on disk it is
+loaded without a single embedding call; otherwise the PDF is parsed, embedded once
+and the FAISS index plus docstore are saved atomically for the next start.
+
+sync_vectorstore is the incremental mode for documents that get edited: chunks are
+fingerprinted by content, so only new or changed chunks are embedded and removed
+chunks are deleted from the index by id.
+
+Every saved index also holds the BM25 index of its chunks (hybrid_retriever.BM25_FILE),
+written in the same atomic step; loaded stores carry it as vectorstore.bm25Index.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from fast_splitter import FastRecursiveCharacterTextSplitter
+from hybrid_retriever import BM25_FILE, BM25Index
+from pdf_ingest import expand_pdf_paths, is_multi_source, load_and_chunk_pdfs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.getenv("RAG_INDEX_DIR", ".rag_index")
+MANIFEST_FILE = "manifest.json"
+
+
+def load_and_split_pdf(pdfPath, chunkSize=500, chunkOverlap=50):
+    """Default document loader: parse the PDF (or a directory/glob of PDFs) and split it into chunks."""
+    if is_multi_source(pdfPath):
+        return load_and_chunk_pdfs(pdfPath, chunkSize, chunkOverlap)
+    docs = PyPDFLoader(pdfPath).load()
+    textSplitter = FastRecursiveCharacterTextSplitter(chunk_size=chunkSize, chunk_overlap=chunkOverlap)
+    return textSplitter.split_documents(docs)
+
+
+def embedding_model_name(embeddings):
+    """Best-effort model name of an embeddings object, used as part of the cache key."""
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def hash_file(path):
+    """SHA-256 of a file's bytes."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as sourceFile:
+        for block in iter(lambda: sourceFile.read(1 << 20), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def hash_source(pdfPath):
+    """Content hash of a PDF, or of every PDF (name and bytes) matched by a directory or glob."""
+    if not is_multi_source(pdfPath):
+        return hash_file(pdfPath)
+    hasher = hashlib.sha256()
+    for path in expand_pdf_paths(pdfPath):
+        hasher.update(os.path.relpath(path, pdfPath if os.path.isdir(pdfPath) else ".").encode("utf-8"))
+        hasher.update(hash_file(path).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def compute_index_key(pdfPath, chunkSize, chunkOverlap, modelName, indexSettings=None):
+    """Hash the PDF contents together with the splitter settings, embedding model and index settings."""
+    hasher = hashlib.sha256(hash_source(pdfPath).encode("utf-8"))
+    settings = {"chunk_size": chunkSize, "chunk_overlap": chunkOverlap, "model": modelName}
+    if indexSettings:
+        # Only non-default index types change the key, so existing flat indexes stay valid.
+        settings["index"] = indexSettings
+    hasher.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return hasher.hexdigest()[:32]
+
+
+def load_vectorstore(indexDir, embeddings):
+    """FAISS.load_local plus the BM25 index saved next to it (when there is one)."""
+    # The docstore is pickled by save_local; we only ever load files we wrote ourselves.
+    vectorstore = FAISS.load_local(indexDir, embeddings, allow_dangerous_deserialization=True)
+    bm25Path = os.path.join(indexDir, BM25_FILE)
+    if os.path.exists(bm25Path):
+        vectorstore.bm25Index = BM25Index.load(bm25Path)
+    return vectorstore
+
+
+def save_vectorstore_atomically(vectorstore, targetDir, manifest=None, replace=False):
+    """
+    Write the index to a temp dir and rename it into place so readers never see a partial index.
+
+    With replace=True an existing targetDir is swapped out (used by incremental syncs);
+    otherwise an existing targetDir means another process won the race and is kept.
+    """
+    parentDir = os.path.dirname(os.path.abspath(targetDir))
+    os.makedirs(parentDir, exist_ok=True)
+    tmpDir = tempfile.mkdtemp(prefix=".tmp-", dir=parentDir)
+    try:
+        vectorstore.save_local(tmpDir)
+        # The lexical index is built with the vector index, and saved next to it.
+        vectorstore.bm25Index = BM25Index.from_vectorstore(vectorstore)
+        vectorstore.bm25Index.save(os.path.join(tmpDir, BM25_FILE))
+        if manifest is not None:
+            with open(os.path.join(tmpDir, MANIFEST_FILE), "w", encoding="utf-8") as manifestFile:
+                json.dump(manifest, manifestFile)
+        if replace and os.path.isdir(targetDir):
+            oldDir = tempfile.mkdtemp(prefix=".old-", dir=parentDir)
+            os.rename(targetDir, os.path.join(oldDir, "index"))
+            os.rename(tmpDir, targetDir)
+            shutil.rmtree(oldDir, ignore_errors=True)
+        else:
+            os.rename(tmpDir, targetDir)
+    except OSError:
+        # Another process finished the same index first; keep theirs.
+        shutil.rmtree(tmpDir, ignore_errors=True)
+        if not os.path.isdir(targetDir):
+            raise
+
+
+def load_or_build_vectorstore(pdfPath, embeddings, loadDocs=load_and_split_pdf,
+                              chunkSize=500, chunkOverlap=50, indexDir=DEFAULT_INDEX_DIR,
+                              buildVectorstore=FAISS.from_documents, indexSettings=None):
+    """
+    Return a FAISS vector store for the PDF, loading it from indexDir when possible.
+
+    loadDocs(pdfPath, chunkSize, chunkOverlap) and buildVectorstore(splitDocs, embeddings)
+    are only called on a cache miss, so a warm start neither parses the PDF nor calls the
+    embedder. indexSettings describes what buildVectorstore produces (e.g. an ANN index
+    type) and becomes part of the cache key.
+    """
+    key = compute_index_key(pdfPath, chunkSize, chunkOverlap, embedding_model_name(embeddings), indexSettings)
+    keyDir = os.path.join(indexDir, key)
+    if os.path.isdir(keyDir):
+        logger.info("Loading cached FAISS index %s for %s", key, pdfPath)
+        return load_vectorstore(keyDir, embeddings)
+
+    logger.info("Building FAISS index %s for %s", key, pdfPath)
+    splitDocs = loadDocs(pdfPath, chunkSize, chunkOverlap)
+    vectorstore = buildVectorstore(splitDocs, embeddings)
+    save_vectorstore_atomically(vectorstore, keyDir)
+    return vectorstore
+
+
+def fingerprint_chunks(splitDocs):
+    """
+    Give every chunk a content-derived id.
+
+    Identical chunk texts get a running suffix so each one keeps its own vector slot.
+    """
+    seen = {}
+    ids = []
+    for doc in splitDocs:
+        digest = hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()[:32]
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(digest if occurrence == 0 else f"{digest}-{occurrence}")
+    return ids
+
+
+def incremental_index_dir(pdfPath, chunkSize, chunkOverlap, modelName, indexDir=DEFAULT_INDEX_DIR):
+    """Stable index location for a source file: keyed by path and settings, not by contents."""
+    settings = {"source": os.path.abspath(pdfPath), "chunk_size": chunkSize,
+                "chunk_overlap": chunkOverlap, "model": modelName}
+    settingsKey = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    baseName = re.sub(r"[^A-Za-z0-9_.-]+", "_", os.path.splitext(os.path.basename(pdfPath.rstrip("/\\")))[0]) or "pdfs"
+    return os.path.join(indexDir, "incremental", f"{baseName}-{settingsKey}")
+
+
+def sync_vectorstore(pdfPath, embeddings, loadDocs=load_and_split_pdf,
+                     chunkSize=500, chunkOverlap=50, indexDir=DEFAULT_INDEX_DIR):
+    """
+    Bring the saved index for pdfPath up to date, embedding only new or changed chunks.
+
+    Chunks are identified by a hash of their text. Chunks that disappeared from the PDF
+    are deleted from the FAISS index and docstore by id, unchanged chunks keep their
+    vectors, and only the new ones are sent to the embedder.
+
+    Returns (vectorstore, stats) where stats counts the "added", "removed" and "reused" chunks.
+    """
+    targetDir = incremental_index_dir(pdfPath, chunkSize, chunkOverlap,
+                                      embedding_model_name(embeddings), indexDir)
+    sourceHash = hash_source(pdfPath)
+    manifestPath = os.path.join(targetDir, MANIFEST_FILE)
+    manifest = {}
+    if os.path.exists(manifestPath):
+        with open(manifestPath, encoding="utf-8") as manifestFile:
+            manifest = json.load(manifestFile)
+
+    vectorstore = None
+    if os.path.isdir(targetDir):
+        vectorstore = load_vectorstore(targetDir, embeddings)
+        if manifest.get("source_hash") == sourceHash:
+            # The PDF is byte-for-byte unchanged: nothing to parse, nothing to embed.
+            stats = {"added": 0, "removed": 0, "reused": vectorstore.index.ntotal}
+            return vectorstore, stats
+
+    splitDocs = loadDocs(pdfPath, chunkSize, chunkOverlap)
+    chunkIds = fingerprint_chunks(splitDocs)
+    docsById = dict(zip(chunkIds, splitDocs))
+
+    if vectorstore is None:
+        vectorstore = FAISS.from_documents(splitDocs, embeddings, ids=chunkIds)
+        stats = {"added": len(chunkIds), "removed": 0, "reused": 0}
+    else:
+        existingIds = set(vectorstore.index_to_docstore_id.values())
+        removedIds = [chunkId for chunkId in existingIds if chunkId not in docsById]
+        addedIds = [chunkId for chunkId in chunkIds if chunkId not in existingIds]
+        reusedIds = [chunkId for chunkId in chunkIds if chunkId in existingIds]
+        if removedIds:
+            vectorstore.delete(removedIds)
+        if addedIds:
+            vectorstore.add_documents([docsById[chunkId] for chunkId in addedIds], ids=addedIds)
+        if reusedIds:
+            # Same text, possibly new page metadata: refresh the docstore entry, keep the vector.
+            vectorstore.docstore.delete(reusedIds)
+            vectorstore.docstore.add({chunkId: docsById[chunkId] for chunkId in reusedIds})
+        stats = {"added": len(addedIds), "removed": len(removedIds), "reused": len(reusedIds)}
+
+    save_vectorstore_atomically(vectorstore, targetDir, manifest={"source_hash": sourceHash}, replace=True)
+    logger.info("Synced index for %s: %s", pdfPath, stats)
+    return vectorstore, stats
+
+
+POLICY_PDF = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "..", "langchain", "Labs", "Lab3", "company_policy.pdf")
+
+
+class _CountingEmbeddings(Embeddings):
+    """Fake embeddings that count how many texts were embedded."""
+
+    model = "counting-fake"
+
+    def __init__(self):
+        self.inner = DeterministicFakeEmbedding(size=16)
+        self.embeddedTexts = 0
+
+    def embed_documents(self, texts):
+        self.embeddedTexts += len(texts)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.inner.embed_query(text)
+
+
+def test_load_or_build_vectorstore_reuses_saved_index(tmp_path):
+    """The second start loads the saved index without parsing or embedding anything."""
+    firstEmbeddings = _CountingEmbeddings()
+    built = load_or_build_vectorstore(POLICY_PDF, firstEmbeddings, indexDir=str(tmp_path))
+    assert firstEmbeddings.embeddedTexts == built.index.ntotal > 0
+
+    def fail_to_load(*args):
+        raise AssertionError("PDF should not be parsed on a warm start")
+
+    secondEmbeddings = _CountingEmbeddings()
+    loaded = load_or_build_vectorstore(POLICY_PDF, secondEmbeddings, loadDocs=fail_to_load,
+                                       indexDir=str(tmp_path))
+    assert secondEmbeddings.embeddedTexts == 0
+    assert loaded.index.ntotal == built.index.ntotal
+    assert [d.name for d in tmp_path.iterdir()] == [compute_index_key(POLICY_PDF, 500, 50, "counting-fake")]
+    assert loaded.bm25Index.docCount == loaded.index.ntotal
+    assert loaded.bm25Index.search("leave", k=2) == built.bm25Index.search("leave", k=2) != []
+
+
+def test_compute_index_key_changes_with_settings():
+    """Different splitter settings or models never share an index."""
+    baseKey = compute_index_key(POLICY_PDF, 500, 50, "text-embedding-ada-002")
+    assert baseKey != compute_index_key(POLICY_PDF, 400, 50, "text-embedding-ada-002")
+    assert baseKey != compute_index_key(POLICY_PDF, 500, 50, "text-embedding-3-small")
+    assert baseKey == compute_index_key(POLICY_PDF, 500, 50, "text-embedding-ada-002", indexSettings=None)
+    assert baseKey != compute_index_key(POLICY_PDF, 500, 50, "text-embedding-ada-002", {"index_type": "hnsw"})
+
+
+def test_sync_vectorstore_only_embeds_changed_chunks(tmp_path):
+    """Editing one chunk re-embeds that chunk only and drops the stale one."""
+    from langchain_core.documents import Document
+
+    pdfPath = tmp_path / "policy.pdf"
+    pdfPath.write_bytes(b"v1")
+    chunks = [Document(page_content=f"Policy section {n}", metadata={"page": n}) for n in range(5)]
+
+    def load_chunks(path, chunkSize, chunkOverlap):
+        return list(chunks)
+
+    embeddings = _CountingEmbeddings()
+    vectorstore, stats = sync_vectorstore(str(pdfPath), embeddings, loadDocs=load_chunks, indexDir=str(tmp_path / "idx"))
+    assert stats == {"added": 5, "removed": 0, "reused": 0}
+
+    chunks[2] = Document(page_content="Policy section 2 (revised)", metadata={"page": 2})
+    pdfPath.write_bytes(b"v2")
+    embeddings = _CountingEmbeddings()
+    vectorstore, stats = sync_vectorstore(str(pdfPath), embeddings, loadDocs=load_chunks, indexDir=str(tmp_path / "idx"))
+    assert stats == {"added": 1, "removed": 1, "reused": 4}
+    assert embeddings.embeddedTexts == 1
+    assert vectorstore.index.ntotal == 5
+    storedTexts = sorted(doc.page_content for doc in vectorstore.docstore._dict.values())
+    assert storedTexts == sorted(chunk.page_content for chunk in chunks)
+
+    # Unchanged file: loaded from disk without calling the loader at all.
+    def fail_to_load(*args):
+        raise AssertionError("unchanged PDF should not be re-parsed")
+
+    vectorstore, stats = sync_vectorstore(str(pdfPath), _CountingEmbeddings(), loadDocs=fail_to_load,
+                                          indexDir=str(tmp_path / "idx"))
+    assert stats == {"added": 0, "removed": 0, "reused": 5}
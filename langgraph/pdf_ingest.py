@@ -0,0 +1,164 @@
+"""
+Parallel PDF ingestion for directories and glob patterns.
+
+PyPDFLoader parses one file page by page on a single core. load_and_chunk_pdfs expands
+a directory or glob into a sorted list of PDFs, cuts them into page ranges and hands
+those to a process pool; each worker extracts the text of its pages and splits it into
+chunks right there, so only the finished chunks travel back. Results are reassembled in
+(file, page) order, so the output is deterministic and matches loading and splitting
+every file serially.
+"""
+
+import glob
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pypdf
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from fast_splitter import FastRecursiveCharacterTextSplitter
+
+DEFAULT_PAGES_PER_TASK = 8
+PAGES_PER_READER = 64
+
+
+def is_multi_source(pathOrPattern):
+    """True when the argument names a directory or a glob rather than a single file."""
+    return os.path.isdir(pathOrPattern) or glob.has_magic(pathOrPattern)
+
+
+def expand_pdf_paths(pathOrPattern):
+    """Sorted list of PDF files for a file path, a directory (searched recursively) or a glob."""
+    if os.path.isdir(pathOrPattern):
+        pattern = os.path.join(pathOrPattern, "**", "*.pdf")
+        return sorted(glob.glob(pattern, recursive=True))
+    if glob.has_magic(pathOrPattern):
+        return sorted(path for path in glob.glob(pathOrPattern, recursive=True) if os.path.isfile(path))
+    return [pathOrPattern]
+
+
+def pdf_document_metadata(reader, source):
+    """File-level metadata in the same shape PyPDFLoader produces."""
+    metadata = {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+    for key, value in (reader.metadata or {}).items():
+        metadata[key.lstrip("/").lower()] = str(value)
+    metadata["source"] = source
+    metadata["total_pages"] = len(reader.pages)
+    return metadata
+
+
+def page_document(reader, documentMetadata, pageNumber, pageLabel):
+    """Document for one page: its plain-text extraction plus page/page_label metadata."""
+    text = reader.pages[pageNumber].extract_text(extraction_mode="plain").strip()
+    metadata = dict(documentMetadata, page=pageNumber, page_label=pageLabel)
+    return Document(page_content=text, metadata=metadata)
+
+
+def read_page_labels(pdfPath):
+    """The label of every page (its length is the page count); reader.page_labels builds all of them at once."""
+    with open(pdfPath, "rb") as stream:
+        return pypdf.PdfReader(stream).page_labels
+
+
+def load_and_split_pages(task):
+    """Worker: extract pages [startPage, endPage) of one PDF and split them into chunks."""
+    pdfPath, startPage, endPage, pageLabels, chunkSize, chunkOverlap = task
+    reader = pypdf.PdfReader(pdfPath)
+    documentMetadata = pdf_document_metadata(reader, pdfPath)
+    textSplitter = FastRecursiveCharacterTextSplitter(chunk_size=chunkSize, chunk_overlap=chunkOverlap)
+    pageDocs = [page_document(reader, documentMetadata, pageNumber, pageLabel)
+                for pageNumber, pageLabel in zip(range(startPage, endPage), pageLabels)]
+    return textSplitter.split_documents(pageDocs)
+
+
+def iter_pdf_pages(pathOrPattern, pagesPerReader=PAGES_PER_READER):
+    """
+    Yield one Document per page, opening each PDF only when the previous one is exhausted.
+
+    PdfReader(path) reads the whole file into a BytesIO, so the reader is given an open
+    file instead and seeks to the objects it needs. A reader keeps every object it has
+    resolved (content streams, fonts) for its lifetime, so a fresh reader is opened on
+    the same file every pagesPerReader pages: memory is bounded by one window of pages
+    plus the page tree and cross-reference table, not by the file size.
+    """
+    for pdfPath in expand_pdf_paths(pathOrPattern):
+        with open(pdfPath, "rb") as stream:
+            reader = pypdf.PdfReader(stream)
+            documentMetadata = pdf_document_metadata(reader, pdfPath)
+            for pageNumber, pageLabel in enumerate(reader.page_labels):
+                if pageNumber and pageNumber % pagesPerReader == 0:
+                    reader = pypdf.PdfReader(stream)
+                yield page_document(reader, documentMetadata, pageNumber, pageLabel)
+
+
+def plan_page_tasks(pdfPaths, pageLabels, chunkSize, chunkOverlap, pagesPerTask=DEFAULT_PAGES_PER_TASK):
+    """Cut every PDF (given the labels of its pages) into consecutive page ranges, in file then page order."""
+    tasks = []
+    for pdfPath, labels in zip(pdfPaths, pageLabels):
+        for startPage in range(0, len(labels), pagesPerTask):
+            endPage = min(startPage + pagesPerTask, len(labels))
+            tasks.append((pdfPath, startPage, endPage, labels[startPage:endPage], chunkSize, chunkOverlap))
+    return tasks
+
+
+def load_and_chunk_pdfs(pathOrPattern, chunkSize=500, chunkOverlap=50, maxWorkers=None,
+                        pagesPerTask=DEFAULT_PAGES_PER_TASK):
+    """
+    Parse and split every PDF under pathOrPattern using a process pool.
+
+    Small inputs (a single page range) are handled in-process to skip pool start-up.
+    """
+    pdfPaths = expand_pdf_paths(pathOrPattern)
+    if not pdfPaths:
+        raise FileNotFoundError(f"No PDF files found for {pathOrPattern}")
+    if len(pdfPaths) == 1:
+        pageLabels = read_page_labels(pdfPaths[0])
+        if len(pageLabels) <= pagesPerTask:
+            return load_and_split_pages((pdfPaths[0], 0, len(pageLabels), pageLabels, chunkSize, chunkOverlap))
+
+    with ProcessPoolExecutor(max_workers=maxWorkers) as pool:
+        pageLabels = [pageLabels] if len(pdfPaths) == 1 else list(pool.map(read_page_labels, pdfPaths))
+        tasks = plan_page_tasks(pdfPaths, pageLabels, chunkSize, chunkOverlap, pagesPerTask)
+        splitDocs = []
+        # map() yields in submission order, which keeps the output deterministic.
+        for chunks in pool.map(load_and_split_pages, tasks):
+            splitDocs.extend(chunks)
+    return splitDocs
+
+
+LANGCHAIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "langchain")
+
+
+def test_load_and_chunk_pdfs_matches_serial_loader(tmp_path):
+    """Parallel page-level ingestion returns the same chunks, in order, as PyPDFLoader + splitter."""
+    import shutil
+    from langchain_community.document_loaders import PyPDFLoader
+
+    shutil.copy(os.path.join(LANGCHAIN_DIR, "Labs", "Lab3", "company_policy.pdf"), tmp_path / "a_policy.pdf")
+    (tmp_path / "nested").mkdir()
+    shutil.copy(os.path.join(LANGCHAIN_DIR, "my_resume.pdf"), tmp_path / "nested" / "b_resume.pdf")
+
+    splitDocs = load_and_chunk_pdfs(str(tmp_path), maxWorkers=2, pagesPerTask=1)
+
+    textSplitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    expected = []
+    for pdfPath in expand_pdf_paths(str(tmp_path)):
+        expected.extend(textSplitter.split_documents(PyPDFLoader(pdfPath).load()))
+    assert [doc.page_content for doc in splitDocs] == [doc.page_content for doc in expected]
+    assert [(doc.metadata["source"], doc.metadata["page"]) for doc in splitDocs] == \
+        [(doc.metadata["source"], doc.metadata["page"]) for doc in expected]
+    assert expand_pdf_paths(str(tmp_path / "*.pdf")) == [str(tmp_path / "a_policy.pdf")]
+
+
+def test_iter_pdf_pages_streams_from_the_file_with_a_reader_per_window():
+    """Pages match PyPDFLoader when read from the open file, a fresh reader every page."""
+    from langchain_community.document_loaders import PyPDFLoader
+
+    pdfPath = os.path.join(LANGCHAIN_DIR, "Labs", "Lab3", "company_policy.pdf")
+    pages = iter_pdf_pages(pdfPath, pagesPerReader=1)
+    first = next(pages)
+    assert not isinstance(pages.gi_frame.f_locals["reader"].stream, io.BytesIO)
+    expected = PyPDFLoader(pdfPath).load()
+    assert len(expected) > 1 and [first] + list(pages) == expected
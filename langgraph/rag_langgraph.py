@@ -5,25 +5,91 @@ from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
 from langchain.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from index_store import DEFAULT_INDEX_DIR, load_or_build_vectorstore, sync_vectorstore
+from embedding_cache import CachedEmbeddings
+from batch_embedder import abuild_faiss_concurrently, build_faiss_concurrently
+from fast_splitter import FastRecursiveCharacterTextSplitter
+from pdf_ingest import is_multi_source, load_and_chunk_pdfs
+from streaming_ingest import DEFAULT_WINDOW_SIZE, stream_into_faiss, stream_pdf_chunks
+from ann_index import set_search_params, to_ann_vectorstore
+from hybrid_retriever import create_hybrid_retriever
+from answer_cache import AnswerCache, index_version, with_answer_cache
+from token_streaming import format_timings, stream_turn
+from context_packing import DEFAULT_CONTEXT_TOKEN_BUDGET, pack_context
 
 # Load environment variables from .env file
 load_dotenv()
 openaiApiKey = os.getenv("OPENAI_API_KEY")
 
-# Load and chunk the company policy PDF
-def load_and_chunk_policy(pdfPath):
+# Load and chunk the company policy PDF.
+# pdfPath may also be a directory or glob; those PDFs are parsed in parallel across a process pool.
+def load_and_chunk_policy(pdfPath, chunkSize=500, chunkOverlap=50):
+    if is_multi_source(pdfPath):
+        return load_and_chunk_pdfs(pdfPath, chunkSize, chunkOverlap)
     loader = PyPDFLoader(pdfPath)
     docs = loader.load()
-    textSplitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    textSplitter = FastRecursiveCharacterTextSplitter(chunk_size=chunkSize, chunk_overlap=chunkOverlap)
     splitDocs = textSplitter.split_documents(docs)
     return splitDocs
 
-# Create a vector store and retriever
-def create_retriever(splitDocs):
-    embeddings = OpenAIEmbeddings()
-    vectorstore = FAISS.from_documents(splitDocs, embeddings)
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
+# Lazily stream chunks of a large PDF page by page so memory stays bounded.
+# Directories and globs keep the parallel process-pool parse.
+def stream_policy_chunks(pdfPath, chunkSize=500, chunkOverlap=50):
+    if is_multi_source(pdfPath):
+        return load_and_chunk_policy(pdfPath, chunkSize, chunkOverlap)
+    return stream_pdf_chunks(pdfPath, chunkSize, chunkOverlap)
+
+# Create a vector store and retriever.
+# asyncIngest=True embeds token-bounded batches concurrently (with 429 backoff) instead of one serial sweep.
+# indexType picks exact "flat" search or an approximate "ivf", "hnsw" or "ivfpq" index (see ann_index.py);
+# nprobe/efSearch trade recall for query latency on those.
+# retrievalMode "vector" (the default) is embeddings only, "hybrid" fuses BM25 and vector rankings,
+# "lexical" skips the embedding call.
+def create_retriever(splitDocs, asyncIngest=False, maxConcurrency=4, indexType="flat", nprobe=None, efSearch=None,
+                     retrievalMode="vector"):
+    embeddings = CachedEmbeddings(OpenAIEmbeddings())
+    if asyncIngest:
+        vectorstore = build_faiss_concurrently(splitDocs, embeddings, maxConcurrency=maxConcurrency)
+    else:
+        vectorstore = FAISS.from_documents(splitDocs, embeddings)
+    vectorstore = to_ann_vectorstore(vectorstore, indexType, nprobe=nprobe, efSearch=efSearch)
+    retriever = create_hybrid_retriever(vectorstore, mode=retrievalMode, k=4)
+    return retriever
+
+# create_retriever(asyncIngest=True) for async callers (notebooks, servers): awaits the concurrent build.
+async def acreate_retriever(splitDocs, maxConcurrency=4, indexType="flat", nprobe=None, efSearch=None,
+                            retrievalMode="vector"):
+    embeddings = CachedEmbeddings(OpenAIEmbeddings())
+    vectorstore = await abuild_faiss_concurrently(splitDocs, embeddings, maxConcurrency=maxConcurrency)
+    vectorstore = to_ann_vectorstore(vectorstore, indexType, nprobe=nprobe, efSearch=efSearch)
+    retriever = create_hybrid_retriever(vectorstore, mode=retrievalMode, k=4)
+    return retriever
+
+# Create a retriever backed by the on-disk index cache (no re-embedding on warm starts).
+# A cache miss streams pages -> chunks -> vectors -> index in windows of windowSize chunks.
+# With incremental=True an edited PDF only re-embeds the chunks that actually changed
+# (incremental indexes stay flat: HNSW can't delete vectors, so a non-flat indexType is rejected).
+# A non-flat indexType is built once and saved, so warm starts skip the IVF training / HNSW build.
+def create_cached_retriever(pdfPath, indexDir=DEFAULT_INDEX_DIR, incremental=False, windowSize=DEFAULT_WINDOW_SIZE,
+                            indexType="flat", nprobe=None, efSearch=None, retrievalMode="vector"):
+    if incremental and (indexType != "flat" or nprobe is not None or efSearch is not None):
+        raise ValueError(f"incremental=True keeps a flat index; indexType={indexType!r}, nprobe and efSearch "
+                         "need incremental=False")
+    embeddings = CachedEmbeddings(OpenAIEmbeddings())
+    if incremental:
+        vectorstore, stats = sync_vectorstore(pdfPath, embeddings, loadDocs=load_and_chunk_policy, indexDir=indexDir)
+        print(f"Index sync: {stats['added']} added, {stats['removed']} removed, {stats['reused']} reused")
+    else:
+        def build_index(splitDocs, embeddings):
+            vectorstore = stream_into_faiss(splitDocs, embeddings, windowSize=windowSize)
+            return to_ann_vectorstore(vectorstore, indexType)
+        vectorstore = load_or_build_vectorstore(pdfPath, embeddings, loadDocs=stream_policy_chunks, indexDir=indexDir,
+                                                buildVectorstore=build_index,
+                                                indexSettings={"index_type": indexType} if indexType != "flat" else None)
+        set_search_params(vectorstore.index, nprobe=nprobe, efSearch=efSearch)
+    retriever = create_hybrid_retriever(vectorstore, mode=retrievalMode, k=4)
     return retriever
 
 # Build the RAG chatbot chain using LangGraph
@@ -39,16 +105,27 @@ Question: {question}
 Answer as if you are the HR:
 """
 
-def build_langgraph_chain(retriever, openaiApiKey):
-    llm = OpenAI(api_key=openaiApiKey)
+# Each node has a sync and an async-native version: chain.invoke() runs the sync ones,
+# chain.ainvoke()/abatch() await the retriever and LLM directly on the event loop (no thread per question).
+# Pass llm to swap the OpenAI model (e.g. a stub LLM for benchmarks).
+# Retrieved chunks are merged by page offsets, de-duplicated and packed into contextTokenBudget tokens.
+def build_langgraph_chain(retriever, openaiApiKey, llm=None, contextTokenBudget=DEFAULT_CONTEXT_TOKEN_BUDGET):
+    # streaming=True lets stream_turn print the answer token by token; invoke() still returns the full text.
+    llm = llm or OpenAI(api_key=openaiApiKey, streaming=True)
     prompt = PromptTemplate.from_template(promptTemplate)
     llmChain = prompt | llm
     
     def retrieve_context(state):
         question = state["question"]
         docs = retriever.invoke(question)
-        context = "\n".join([doc.page_content for doc in docs])
-        return {"context": context, "question": question}
+        context, contextStats = pack_context(docs, tokenBudget=contextTokenBudget)
+        return {"context": context, "question": question, "context_stats": contextStats}
+
+    async def aretrieve_context(state):
+        question = state["question"]
+        docs = await retriever.ainvoke(question)
+        context, contextStats = pack_context(docs, tokenBudget=contextTokenBudget)
+        return {"context": context, "question": question, "context_stats": contextStats}
 
     def generate_answer(state):
         context = state["context"]
@@ -56,30 +133,43 @@ def build_langgraph_chain(retriever, openaiApiKey):
         answer = llmChain.invoke({"context": context, "question": question})
         return {"answer": answer}
 
+    async def agenerate_answer(state):
+        context = state["context"]
+        question = state["question"]
+        answer = await llmChain.ainvoke({"context": context, "question": question})
+        return {"answer": answer}
+
     from typing import TypedDict
 
     class RagState(TypedDict):
         question: str
         context: str
+        context_stats: dict
         answer: str
 
     workflow = StateGraph(RagState)
-    workflow.add_node("retrieve_context", retrieve_context)
-    workflow.add_node("generate_answer", generate_answer)
+    workflow.add_node("retrieve_context", RunnableLambda(retrieve_context, afunc=aretrieve_context))
+    workflow.add_node("generate_answer", RunnableLambda(generate_answer, afunc=agenerate_answer))
     workflow.add_edge("retrieve_context", "generate_answer")
     workflow.add_edge("generate_answer", END)
     workflow.set_entry_point("retrieve_context")
     return workflow.compile()
 
+# A single PDF, a directory of PDFs or a glob such as "policies/**/*.pdf"
+defaultPdfPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "langchain", "Labs", "Lab3", "company_policy.pdf")
+
 # Main function to run the chatbot
 def main():
-    pdfPath = "C:\\Users\\Lenovo\\genaicoding\\langchain\\Labs\\Lab3\\company_policy.pdf"
-    splitDocs = load_and_chunk_policy(pdfPath)
-    retriever = create_retriever(splitDocs)
-    chain = build_langgraph_chain(retriever, openaiApiKey)
+    pdfPath = os.getenv("POLICY_PDF_PATH", defaultPdfPath)
+    retriever = create_cached_retriever(pdfPath, incremental=True)
+    # Repeated (or reworded) questions are answered from the cache until the index changes.
+    answerCache = AnswerCache(retriever.vectorstore.embedding_function)
+    chain = with_answer_cache(build_langgraph_chain(retriever, openaiApiKey), answerCache,
+                              index_version(retriever.vectorstore))
     question = "What is WFH Policy?"
-    result = chain.invoke({"question": question})
-    print("Bot:", result["answer"])
+    result, timings = stream_turn(chain, {"question": question})
+    print(f"Latency: {format_timings(timings)}")
+    print("Answer cache:", answerCache.stats())
 
 if __name__ == "__main__":
     main()
@@ -94,3 +184,12 @@ def test_langgraph_chain():
     result = chain.invoke({"question": question})
     assert isinstance(result["answer"], str)
     print("Test passed! Bot answered:", result["answer"])
+
+
+def test_incremental_index_must_be_flat():
+    """ANN settings are not silently dropped on the incremental path."""
+    try:
+        create_cached_retriever(defaultPdfPath, incremental=True, indexType="hnsw")
+        raise AssertionError("ValueError expected")
+    except ValueError as e:
+        assert "incremental=False" in str(e)
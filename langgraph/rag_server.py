@@ -0,0 +1,229 @@
+"""
+Local HTTP service around the LangGraph RAG graph.
+
+    python rag_server.py                 # serve on http://127.0.0.1:8010
+    python rag_server.py --benchmark     # throughput vs a stub LLM, no API key needed
+
+    curl -X POST localhost:8010/ask -d '{"question": "What is WFH Policy?"}'
+
+Every request is handled with chain.ainvoke on the server's single event loop, so the
+graph's async-native nodes await the retriever and the LLM instead of parking a thread
+per question. maxInFlight bounds concurrent graph runs; anything that still falls back
+to run_in_executor shares one pool of maxThreads threads. A body that is not a JSON
+object with a string "question" gets a 400; a question the chain fails on gets a
+logged 500 with a JSON error body. Questions are independent: there is no conversation
+state between requests.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from langchain_core.language_models.llms import LLM
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8010
+DEFAULT_MAX_IN_FLIGHT = 512
+DEFAULT_MAX_THREADS = 8
+
+
+def create_app(chain, maxInFlight=DEFAULT_MAX_IN_FLIGHT, maxThreads=DEFAULT_MAX_THREADS):
+    """Starlette app with POST /ask ({"question"}) and GET /health."""
+    semaphore = asyncio.Semaphore(maxInFlight)
+    counters = {"in_flight": 0, "served": 0}
+
+    async def ask(request):
+        try:
+            body = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return JSONResponse({"error": "body must be JSON"}, status_code=400)
+        if not isinstance(body, dict) or not isinstance(body.get("question"), str) or not body["question"].strip():
+            return JSONResponse({"error": "question is required"}, status_code=400)
+        question = body["question"].strip()
+        startTime = time.perf_counter()
+        async with semaphore:
+            counters["in_flight"] += 1
+            try:
+                result = await chain.ainvoke({"question": question})
+            except Exception:
+                logger.exception("Could not answer %r", question)
+                return JSONResponse({"error": "could not answer the question"}, status_code=500)
+            finally:
+                counters["in_flight"] -= 1
+        counters["served"] += 1
+        return JSONResponse({
+            "answer": result["answer"],
+            "latency_ms": round((time.perf_counter() - startTime) * 1000, 1),
+        })
+
+    async def health(request):
+        return JSONResponse({"status": "ok", **counters, "threads": threading.active_count()})
+
+    @asynccontextmanager
+    async def lifespan(app):
+        executor = ThreadPoolExecutor(max_workers=maxThreads, thread_name_prefix="rag-server")
+        asyncio.get_running_loop().set_default_executor(executor)
+        yield
+        executor.shutdown(wait=False)
+
+    return Starlette(routes=[Route("/ask", ask, methods=["POST"]), Route("/health", health)], lifespan=lifespan)
+
+
+class StubLLM(LLM):
+    """LLM that answers after a fixed delay, standing in for the OpenAI round-trip."""
+
+    delaySeconds: float = 0.2
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.delaySeconds)
+        return "Stub answer."
+
+    async def _acall(self, prompt, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.delaySeconds)
+        return "Stub answer."
+
+
+def build_stub_chain(delaySeconds=0.2):
+    """The real graph over the repo's policy PDF, with a stub LLM and lexical retrieval (no network)."""
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from hybrid_retriever import create_hybrid_retriever
+    from rag_langgraph import build_langgraph_chain, defaultPdfPath, load_and_chunk_policy
+
+    vectorstore = FAISS.from_documents(load_and_chunk_policy(defaultPdfPath), DeterministicFakeEmbedding(size=64))
+    retriever = create_hybrid_retriever(vectorstore, mode="lexical")
+    return build_langgraph_chain(retriever, None, llm=StubLLM(delaySeconds=delaySeconds))
+
+
+async def _measure(run, questionCount, concurrency):
+    """Run questionCount questions, concurrency at a time; return (questions/s, peak thread count)."""
+    peakThreads = threading.active_count()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(number):
+        nonlocal peakThreads
+        async with semaphore:
+            await run(f"What is the WFH policy? ({number})")
+            peakThreads = max(peakThreads, threading.active_count())
+
+    startTime = time.perf_counter()
+    await asyncio.gather(*(one(number) for number in range(questionCount)))
+    return questionCount / (time.perf_counter() - startTime), peakThreads
+
+
+async def benchmark(questionCount=1000, concurrency=200, delaySeconds=0.2):
+    """Compare to_thread(chain.invoke), native chain.ainvoke and the HTTP app, all on one loop."""
+    import httpx
+
+    chain = build_stub_chain(delaySeconds)
+    rows = []
+
+    async def threaded(question):
+        await asyncio.to_thread(chain.invoke, {"question": question})
+
+    async def native(question):
+        await chain.ainvoke({"question": question})
+
+    rows.append(("asyncio.to_thread(chain.invoke)", *await _measure(threaded, questionCount, concurrency)))
+    rows.append(("chain.ainvoke", *await _measure(native, questionCount, concurrency)))
+
+    app = create_app(chain)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://rag") as client:
+            async def http(question):
+                response = await client.post("/ask", json={"question": question})
+                response.raise_for_status()
+
+            rows.append(("POST /ask (ASGI, in-process)", *await _measure(http, questionCount, concurrency)))
+    return rows
+
+
+def test_ask_endpoint_serves_concurrent_questions_without_extra_threads():
+    """200 concurrent questions finish in a few LLM delays, with no thread per question."""
+    import httpx
+
+    chain = build_stub_chain(delaySeconds=0.05)
+
+    async def scenario():
+        app = create_app(chain)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://rag") as client:
+                for badBody in ({}, [], {"question": 42}, {"question": "  "}):
+                    assert (await client.post("/ask", json=badBody)).status_code == 400
+                assert (await client.post("/ask", content=b"{not json")).status_code == 400
+                threadsBefore = threading.active_count()
+                startTime = time.perf_counter()
+                responses = await asyncio.gather(*(
+                    client.post("/ask", json={"question": f"What is the WFH policy? ({n})"})
+                    for n in range(200)))
+                elapsed = time.perf_counter() - startTime
+                assert threading.active_count() - threadsBefore <= DEFAULT_MAX_THREADS
+                return responses, elapsed
+
+    responses, elapsed = asyncio.run(scenario())
+    assert all(response.status_code == 200 for response in responses)
+    assert all(response.json()["answer"] == "Stub answer." for response in responses)
+    assert elapsed < 200 * 0.05 / 4
+
+
+def test_chain_failure_is_a_json_500():
+    import httpx
+    from langchain_core.runnables import RunnableLambda
+
+    def fail(inputs):
+        raise RuntimeError("LLM quota exceeded")
+
+    async def scenario():
+        app = create_app(RunnableLambda(fail))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://rag") as client:
+            failed = await client.post("/ask", json={"question": "What is the WFH policy?"})
+            health = await client.get("/health")
+            return failed, health
+
+    failed, health = asyncio.run(scenario())
+    assert failed.status_code == 500 and failed.json() == {"error": "could not answer the question"}
+    assert health.json()["in_flight"] == 0 and health.json()["served"] == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the LangGraph RAG graph over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument("--benchmark", action="store_true", help="measure throughput against a stub LLM and exit")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(f"{'mode':<34} {'questions/s':>12} {'peak threads':>13}")
+        for mode, throughput, peakThreads in asyncio.run(benchmark()):
+            print(f"{mode:<34} {throughput:>12.0f} {peakThreads:>13}")
+        return
+
+    import uvicorn
+    from answer_cache import AnswerCache, index_version, with_answer_cache
+    from rag_langgraph import build_langgraph_chain, create_cached_retriever, defaultPdfPath, openaiApiKey
+
+    retriever = create_cached_retriever(os.getenv("POLICY_PDF_PATH", defaultPdfPath), incremental=True)
+    chain = with_answer_cache(build_langgraph_chain(retriever, openaiApiKey),
+                              AnswerCache(retriever.vectorstore.embedding_function), index_version(retriever.vectorstore))
+    uvicorn.run(create_app(chain, maxInFlight=args.max_in_flight), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
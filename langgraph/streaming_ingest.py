@@ -0,0 +1,277 @@
+"""
+Streaming, bounded-memory ingestion: pages -> chunks -> vectors -> FAISS.
+
+The eager path (loader.load(), split_documents, from_documents) holds every page, every
+chunk and every embedding as Python objects at the same time. Here each stage is a
+generator: pages are read lazily, each page is split as it arrives, chunks are grouped
+into windows of windowSize, and each window is embedded and appended to the index with
+add_embeddings. While a window is being embedded, the next one is read and split in a
+worker thread, so parsing overlaps the embedding calls. At most two windows are in memory
+at a time. Peak working memory is therefore set by windowSize; only the FAISS index and
+docstore themselves grow with the corpus.
+
+astream_into_faiss runs the whole pipeline in one event loop, so it can be awaited from
+Jupyter or a server; stream_into_faiss is the synchronous wrapper for scripts.
+
+Run this file directly to write text PDFs of growing size and measure the peak RSS of
+the eager (PyPDFLoader + from_documents) and streaming paths on them. Peak RSS needs the
+Unix-only resource module and is reported as n/a elsewhere.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import tempfile
+import time
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from batch_embedder import DEFAULT_MAX_CONCURRENCY, build_faiss_async
+from fast_splitter import FastRecursiveCharacterTextSplitter
+from pdf_ingest import iter_pdf_pages
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_SIZE = 256
+MEASURE_TIMEOUT_SECONDS = 3600
+
+
+def iter_chunks(pages, chunkSize=500, chunkOverlap=50):
+    """Split pages one at a time, yielding chunks as soon as their page is read."""
+    textSplitter = FastRecursiveCharacterTextSplitter(chunk_size=chunkSize, chunk_overlap=chunkOverlap)
+    for page in pages:
+        yield from textSplitter.split_documents([page])
+
+
+def iter_windows(items, windowSize=DEFAULT_WINDOW_SIZE):
+    """Group an iterable into lists of at most windowSize items."""
+    iterator = iter(items)
+    while True:
+        window = list(itertools.islice(iterator, windowSize))
+        if not window:
+            return
+        yield window
+
+
+def stream_pdf_chunks(pdfPath, chunkSize=500, chunkOverlap=50):
+    """Lazy chunk stream for a PDF, directory or glob (same signature as the eager loaders)."""
+    return iter_chunks(iter_pdf_pages(pdfPath), chunkSize, chunkOverlap)
+
+
+async def astream_into_faiss(chunks, embeddings, windowSize=DEFAULT_WINDOW_SIZE,
+                             maxConcurrency=DEFAULT_MAX_CONCURRENCY):
+    """
+    Embed a chunk stream window by window and append each window to one FAISS index.
+
+    Within a window the batches are embedded concurrently (see batch_embedder); the next
+    window is pulled from the (blocking) chunk stream in a thread meanwhile.
+    """
+    windows = iter_windows(chunks, windowSize)
+    vectorstore = None
+    embeddedChunks = 0
+    startTime = time.perf_counter()
+    window = await asyncio.to_thread(next, windows, None)
+    while window is not None:
+        nextWindow = asyncio.create_task(asyncio.to_thread(next, windows, None))
+        try:
+            vectorstore, _ = await build_faiss_async(window, embeddings, maxConcurrency=maxConcurrency,
+                                                     vectorstore=vectorstore, onProgress=lambda report: None)
+        except BaseException:
+            await asyncio.gather(nextWindow, return_exceptions=True)  # don't leave the reader thread running
+            raise
+        embeddedChunks += len(window)
+        logger.info("Indexed %d chunks (%.1f chunks/s)", embeddedChunks,
+                    embeddedChunks / (time.perf_counter() - startTime))
+        window = await nextWindow
+    if vectorstore is None:
+        raise ValueError("No chunks to index")
+    return vectorstore
+
+
+def stream_into_faiss(chunks, embeddings, windowSize=DEFAULT_WINDOW_SIZE, maxConcurrency=DEFAULT_MAX_CONCURRENCY):
+    """
+    Synchronous astream_into_faiss; a drop-in buildVectorstore for load_or_build_vectorstore
+    that also accepts generators. From async code, await astream_into_faiss instead.
+    """
+    return asyncio.run(astream_into_faiss(chunks, embeddings, windowSize, maxConcurrency))
+
+
+def synthetic_pages(pageCount, seed=0):
+    """Deterministic fake pages (~3 KB of text each) for memory measurements."""
+    rng = random.Random(seed)
+    words = ["policy", "leave", "employee", "manager", "approval", "remote", "office", "travel",
+             "days", "annual", "request", "company", "section", "benefit", "holiday", "hours"]
+    for pageNumber in range(pageCount):
+        paragraphs = ["\n".join(" ".join(rng.choice(words) for _ in range(12)) for _ in range(4)) for _ in range(6)]
+        yield Document(page_content="\n\n".join(paragraphs), metadata={"source": "synthetic", "page": pageNumber})
+
+
+def write_text_pdf(path, pages):
+    """Write an uncompressed PDF with one Helvetica text page per Document (for measurements)."""
+    offsets = {}
+    pageNumbers = []
+    with open(path, "wb") as file:
+        file.write(b"%PDF-1.4\n")
+
+        def write_object(number, body):
+            offsets[number] = file.tell()
+            file.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+
+        write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        for index, page in enumerate(pages):
+            lines = page.page_content.replace("\\", "").replace("(", "").replace(")", "").splitlines()
+            content = b"BT /F1 9 Tf 11 TL 40 800 Td " + b" ".join(
+                b"(%s) Tj T*" % line.encode("latin-1", "replace") for line in lines) + b" ET"
+            pageNumber, contentNumber = 4 + 2 * index, 5 + 2 * index
+            write_object(contentNumber, b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+            write_object(pageNumber, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                                     b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % contentNumber)
+            pageNumbers.append(pageNumber)
+        kids = b" ".join(b"%d 0 R" % number for number in pageNumbers)
+        write_object(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(pageNumbers)))
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xrefOffset = file.tell()
+        objectCount = max(offsets) + 1
+        file.write(b"xref\n0 %d\n0000000000 65535 f \n" % objectCount)
+        file.write(b"".join(b"%010d 00000 n \n" % offsets[number] for number in range(1, objectCount)))
+        file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (objectCount, xrefOffset))
+
+
+def peak_rss_mib():
+    """Peak RSS of this process in MiB, or "n/a" without the Unix-only resource module (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return "n/a"
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    peakRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peakRss //= 1024
+    return peakRss / 1024
+
+
+def _peak_rss_worker(mode, pdfPath, windowSize, resultQueue):
+    from langchain_community.document_loaders import PyPDFLoader
+
+    embeddings = DeterministicFakeEmbedding(size=1536)
+    if mode == "eager":
+        docs = PyPDFLoader(pdfPath).load()
+        splitDocs = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50).split_documents(docs)
+        vectorstore = FAISS.from_documents(splitDocs, embeddings)
+    else:
+        vectorstore = stream_into_faiss(stream_pdf_chunks(pdfPath), embeddings, windowSize=windowSize)
+    resultQueue.put((vectorstore.index.ntotal, peak_rss_mib()))
+
+
+def measure_peak_rss(mode, pdfPath, windowSize=DEFAULT_WINDOW_SIZE, timeoutSeconds=MEASURE_TIMEOUT_SECONDS,
+                     worker=_peak_rss_worker):
+    """
+    Ingest pdfPath in a fresh process and return (chunks indexed, peak RSS in MiB or "n/a").
+
+    Raises RuntimeError if the worker dies without a result (OOM kill, import error) and
+    TimeoutError if it runs longer than timeoutSeconds.
+    """
+    context = multiprocessing.get_context("spawn")
+    resultQueue = context.Queue()
+    process = context.Process(target=worker, args=(mode, pdfPath, windowSize, resultQueue))
+    process.start()
+    deadline = time.monotonic() + timeoutSeconds
+    try:
+        while True:
+            try:
+                return resultQueue.get(timeout=1.0)
+            except queue.Empty:
+                pass
+            if not process.is_alive():
+                try:  # it may have put its result just before exiting
+                    return resultQueue.get(timeout=1.0)
+                except queue.Empty:
+                    raise RuntimeError(f"{mode} ingestion of {pdfPath} exited with code {process.exitcode} "
+                                       f"without a result")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{mode} ingestion of {pdfPath} took longer than {timeoutSeconds}s")
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+
+def test_stream_into_faiss_matches_eager_index():
+    """Windowed streaming builds the same vectors and docstore contents as the eager path."""
+    import numpy as np
+
+    pages = list(synthetic_pages(12))
+    embeddings = DeterministicFakeEmbedding(size=32)
+    eagerDocs = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50).split_documents(pages)
+    eager = FAISS.from_documents(eagerDocs, embeddings)
+
+    streamed = stream_into_faiss(iter_chunks(iter(pages)), embeddings, windowSize=7)
+    assert streamed.index.ntotal == eager.index.ntotal == len(eagerDocs)
+    assert np.array_equal(streamed.index.reconstruct_n(0, len(eagerDocs)), eager.index.reconstruct_n(0, len(eagerDocs)))
+    streamedTexts = [streamed.docstore.search(streamed.index_to_docstore_id[n]).page_content for n in range(len(eagerDocs))]
+    assert streamedTexts == [doc.page_content for doc in eagerDocs]
+
+
+def test_iter_windows_is_lazy():
+    """Windows are pulled from the source on demand, never all at once."""
+    pulled = []
+
+    def source():
+        for n in range(10):
+            pulled.append(n)
+            yield n
+
+    windows = iter_windows(source(), windowSize=4)
+    assert next(windows) == [0, 1, 2, 3]
+    assert pulled == [0, 1, 2, 3]
+
+
+def test_astream_into_faiss_runs_inside_a_running_loop(tmp_path):
+    """The async pipeline can be awaited (Jupyter, rag_server), including from a written PDF."""
+    pdfPath = str(tmp_path / "corpus.pdf")
+    write_text_pdf(pdfPath, synthetic_pages(5))
+    embeddings = DeterministicFakeEmbedding(size=16)
+
+    async def ingest():
+        return await astream_into_faiss(stream_pdf_chunks(pdfPath), embeddings, windowSize=8)
+
+    vectorstore = asyncio.run(ingest())
+    chunks = list(stream_pdf_chunks(pdfPath))
+    assert vectorstore.index.ntotal == len(chunks) > 8
+    assert "policy" in chunks[0].page_content or "leave" in chunks[0].page_content
+
+
+def _dying_worker(mode, pdfPath, windowSize, resultQueue):
+    os._exit(137)  # what an OOM kill looks like to the parent
+
+
+def test_measure_peak_rss_raises_when_the_worker_dies():
+    try:
+        measure_peak_rss("eager", "missing.pdf", worker=_dying_worker)
+        raise AssertionError("RuntimeError expected")
+    except RuntimeError as e:
+        assert "exited with code 137" in str(e)
+
+
+def _format_mib(value):
+    return value if isinstance(value, str) else f"{value:.0f}"
+
+
+if __name__ == "__main__":
+    print(f"{'pages':>7} {'PDF MiB':>8} {'chunks':>8} {'eager MiB':>10} {'streaming MiB':>14}")
+    with tempfile.TemporaryDirectory() as tempDir:
+        for pageCount in (1000, 4000, 8000):
+            pdfPath = os.path.join(tempDir, f"corpus_{pageCount}.pdf")
+            write_text_pdf(pdfPath, synthetic_pages(pageCount))
+            chunkCount, eagerMib = measure_peak_rss("eager", pdfPath)
+            _, streamingMib = measure_peak_rss("streaming", pdfPath)
+            print(f"{pageCount:>7} {os.path.getsize(pdfPath) / 2**20:>8.0f} {chunkCount:>8} "
+                  f"{_format_mib(eagerMib):>10} {_format_mib(streamingMib):>14}")
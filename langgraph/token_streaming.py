@@ -0,0 +1,165 @@
+"""
+Token streaming for the interactive chat loops.
+
+stream_turn / astream_turn run one chat turn (RetrievalQA, the LangGraph RAG graph or an
+AgentExecutor) with a callback handler that prints every LLM token the moment it is
+generated, then return the usual result plus the turn's timings:
+
+    {"ttft_ms": time to first token, "total_ms": whole turn}
+
+The LLM has to be created with streaming=True, otherwise LangChain only hands over the
+completion once it is finished (the answer is then printed in one piece and ttft_ms is
+None). Tokens from LLM calls made inside a tool (e.g. the RetrievalQA behind a
+resume_search tool) are not printed, so an agent only streams its final answer.
+"""
+
+import logging
+import sys
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.fake import FakeListLLM
+
+logger = logging.getLogger(__name__)
+
+
+class TokenStreamHandler(BaseCallbackHandler):
+    """Forward LLM tokens to onToken, skipping LLM calls nested inside tool runs."""
+
+    # Call us directly from async runs too, so tokens are printed in order.
+    run_inline = True
+
+    def __init__(self, onToken, skipToolTokens=True):
+        self.onToken = onToken
+        self.skipToolTokens = skipToolTokens
+        self._parents = {}
+        self._toolRuns = set()
+        self.firstTokenAt = None
+        self.tokenCount = 0
+
+    def _track(self, runId, parentRunId):
+        self._parents[runId] = parentRunId
+
+    def _inside_tool(self, runId):
+        while runId is not None:
+            if runId in self._toolRuns:
+                return True
+            runId = self._parents.get(runId)
+        return False
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self._track(run_id, parent_run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._track(run_id, parent_run_id)
+        self._toolRuns.add(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._track(run_id, parent_run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._track(run_id, parent_run_id)
+
+    def on_llm_new_token(self, token, *, run_id, parent_run_id=None, **kwargs):
+        # Tool-call chunks from chat models arrive with empty text.
+        if not token or (self.skipToolTokens and self._inside_tool(run_id)):
+            return
+        if self.firstTokenAt is None:
+            self.firstTokenAt = time.perf_counter()
+        self.tokenCount += 1
+        self.onToken(token)
+
+
+def _printer(prefix, out):
+    def print_token(token):
+        # The prefix waits for the first token so tool debug output doesn't land after "Bot: ".
+        if prefix and not printed:
+            out.write(prefix)
+            printed.append(True)
+        out.write(token)
+        out.flush()
+    printed = []
+    return print_token
+
+
+def _start_turn(prefix, out, config):
+    handler = TokenStreamHandler(_printer(prefix, out))
+    return handler, dict(config or {}, callbacks=[handler])
+
+
+def _finish_turn(result, handler, startTime, answerKey, prefix, out):
+    totalMs = (time.perf_counter() - startTime) * 1000
+    if handler.tokenCount == 0:
+        # Nothing streamed (cache hit, or a non-streaming LLM): print the answer in one go.
+        out.write(prefix + str(result.get(answerKey, result) if isinstance(result, dict) else result))
+    out.write("\n")
+    out.flush()
+    timings = {
+        "ttft_ms": (handler.firstTokenAt - startTime) * 1000 if handler.firstTokenAt else None,
+        "total_ms": totalMs,
+        "tokens": handler.tokenCount,
+    }
+    logger.info("Turn latency: first token %s ms, total %.0f ms, %d tokens",
+                "-" if timings["ttft_ms"] is None else f"{timings['ttft_ms']:.0f}", totalMs, handler.tokenCount)
+    return result, timings
+
+
+def stream_turn(runnable, inputs, answerKey="answer", prefix="Bot: ", out=None, config=None):
+    """Invoke runnable, printing tokens as they arrive; return (result, timings)."""
+    out = out or sys.stdout
+    startTime = time.perf_counter()
+    handler, config = _start_turn(prefix, out, config)
+    result = runnable.invoke(inputs, config=config)
+    return _finish_turn(result, handler, startTime, answerKey, prefix, out)
+
+
+async def astream_turn(runnable, inputs, answerKey="answer", prefix="Bot: ", out=None, config=None):
+    """Async stream_turn for notebook chat loops (runs on the notebook's event loop)."""
+    out = out or sys.stdout
+    startTime = time.perf_counter()
+    handler, config = _start_turn(prefix, out, config)
+    result = await runnable.ainvoke(inputs, config=config)
+    return _finish_turn(result, handler, startTime, answerKey, prefix, out)
+
+
+def format_timings(timings):
+    ttft = "-" if timings["ttft_ms"] is None else f"{timings['ttft_ms']:.0f} ms"
+    return f"first token {ttft}, total {timings['total_ms']:.0f} ms"
+
+
+class _StreamingFakeLLM(FakeListLLM):
+    """FakeListLLM that reports its answer word by word, like OpenAI(streaming=True)."""
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        response = super()._call(prompt, stop, run_manager, **kwargs)
+        for position, word in enumerate(response.split(" ")):
+            if run_manager:
+                run_manager.on_llm_new_token(word if position == 0 else " " + word)
+        return response
+
+
+def test_stream_turn_prints_tokens_and_skips_tool_llms():
+    """LLM tokens stream in order; the same LLM called from inside a tool stays quiet."""
+    import asyncio
+    import io
+    from langchain_core.prompts import PromptTemplate
+    from langchain_core.tools import tool
+
+    llm = _StreamingFakeLLM(responses=["WFH is allowed twice a week."])
+    chain = PromptTemplate.from_template("{question}") | llm
+
+    out = io.StringIO()
+    result, timings = stream_turn(chain, {"question": "What is WFH policy?"}, out=out)
+    assert out.getvalue() == "Bot: WFH is allowed twice a week.\n"
+    assert result == "WFH is allowed twice a week."
+    assert timings["tokens"] > 1 and timings["ttft_ms"] <= timings["total_ms"]
+
+    @tool
+    def policy_lookup(question: str) -> str:
+        """Look up policy text."""
+        return llm.invoke(question)
+
+    out = io.StringIO()
+    asyncResult, asyncTimings = asyncio.run(astream_turn(policy_lookup, {"question": "leave"}, out=out))
+    assert out.getvalue() == f"Bot: {asyncResult}\n"
+    assert asyncTimings["tokens"] == 0 and asyncTimings["ttft_ms"] is None